@@ -0,0 +1,160 @@
+"""
+In-process TTL + LRU cache for search responses
+"""
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+def normalize_query(query: str) -> str:
+    """
+    Case- and whitespace-insensitive form of a query used for cache keys
+    """
+    return " ".join(query.lower().split())
+
+
+class ResultCache:
+    """
+    Bounded mapping with per-entry expiry.
+
+    Entries are evicted least-recently-used first whenever either the entry
+    count or the total byte size goes over its limit. Expired entries are
+    dropped lazily when they are looked up, unless they are still within
+    `stale_ttl` of expiring: those are kept for get_stale, so the last good
+    value can be served while a fresh one is fetched.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        max_bytes: int = 32 * 1024 * 1024,
+        ttl: float = 600.0,
+        stale_ttl: float = 0.0,
+        sizeof: Callable[[Any], int] = lambda value: 1,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.sizeof = sizeof
+        self.clock = clock
+        # key -> (value, size, expires_at)
+        self._entries: "OrderedDict[Hashable, Tuple[Any, int, float]]" = OrderedDict()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.stale_hits = 0
+
+    @classmethod
+    def from_env(cls, **kwargs) -> "ResultCache":
+        return cls(
+            max_entries=int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "1024")),
+            max_bytes=int(os.getenv("SEARCH_CACHE_MAX_BYTES", str(32 * 1024 * 1024))),
+            ttl=float(os.getenv("SEARCH_CACHE_TTL", "600")),
+            stale_ttl=float(os.getenv("SEARCH_CACHE_STALE_TTL", "3600")),
+            **kwargs,
+        )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        entry = self._entries.get(key)
+        return entry is not None and entry[2] > self.clock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        value, size, expires_at = entry
+        now = self.clock()
+        if expires_at <= now:
+            if expires_at + self.stale_ttl <= now:
+                self._remove(key)
+                self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def expires_in(self, key: Hashable) -> Optional[float]:
+        """
+        Seconds until the entry for a key expires (negative once it has),
+        or None if there is no entry
+        """
+        entry = self._entries.get(key)
+        return None if entry is None else entry[2] - self.clock()
+
+    def peek(self, key: Hashable) -> Optional[Any]:
+        """
+        Value for a key, expired or not, without counting a lookup or
+        refreshing its recency
+        """
+        entry = self._entries.get(key)
+        return None if entry is None else entry[0]
+
+    def get_stale(self, key: Hashable) -> Optional[Any]:
+        """
+        Value for a key whether fresh or expired within `stale_ttl`
+        """
+        entry = self._entries.get(key)
+        if entry is None or entry[2] + self.stale_ttl <= self.clock():
+            return None
+        self._entries.move_to_end(key)
+        self.stale_hits += 1
+        return entry[0]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        size = self.sizeof(value)
+        if size > self.max_bytes:
+            # Never worth evicting the whole cache for one oversized entry
+            return
+
+        if key in self._entries:
+            self._remove(key)
+
+        expires_at = self.clock() + (self.ttl if ttl is None else ttl)
+        self._entries[key] = (value, size, expires_at)
+        self.current_bytes += size
+
+        while len(self._entries) > self.max_entries or self.current_bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def delete(self, key: Hashable) -> None:
+        if key in self._entries:
+            self._remove(key)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.current_bytes = 0
+
+    def _remove(self, key: Hashable) -> None:
+        _, size, _ = self._entries.pop(key)
+        self.current_bytes -= size
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "stale_ttl": self.stale_ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "stale_hits": self.stale_hits,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
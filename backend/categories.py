@@ -0,0 +1,245 @@
+"""
+The category catalogue and precomputed first pages of its categories.
+
+Most visitors start from one of the category buttons, so every category's
+first page of filtered results is fetched ahead of time and served from
+memory. A background scheduler refreshes one category at a time, spaced
+evenly across the refresh interval, so refresh load on the upstream is
+flat rather than bursty or following traffic spikes. A refreshed snapshot
+replaces the old one in a single reference swap, so readers never see a
+partial update, and a failed refresh keeps serving the previous snapshot
+until it is too old.
+
+With several worker processes sharing a directory, only the worker holding
+the leader lock refreshes; it writes each snapshot to a file there, and
+the other workers load the files as they change. If the leader exits,
+another worker takes the lock over on its next poll.
+"""
+import asyncio
+import json
+import os
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from workers import FileLock, state_directory
+
+# The categories shown on the home page: id, label, icon and the query run
+CATEGORIES = [
+    {"id": "chatbot", "name": "Chatbot", "icon": "🤖", "query": "AI chatbot assistant conversation"},
+    {"id": "code", "name": "Code Assistant", "icon": "💻", "query": "AI code assistant programming development"},
+    {"id": "content", "name": "Content Creation", "icon": "📝", "query": "AI content creation writing generator"},
+    {"id": "education", "name": "Education", "icon": "🎓", "query": "AI education learning tutorial platform"},
+    {"id": "generative", "name": "Generative AI", "icon": "✨", "query": "generative AI model LLM GPT"},
+    {"id": "healthcare", "name": "Healthcare", "icon": "🏥", "query": "AI healthcare medical diagnosis"},
+    {"id": "image", "name": "Image Generation", "icon": "🎨", "query": "AI image generation art DALL-E Midjourney"},
+    {"id": "music", "name": "Music", "icon": "🎵", "query": "AI music generation audio sound"},
+    {"id": "productivity", "name": "Productivity", "icon": "⚡", "query": "AI productivity automation workflow tools"},
+    {"id": "research", "name": "Research", "icon": "🔬", "query": "AI research papers academic science"},
+    {"id": "video", "name": "Video Generation", "icon": "🎬", "query": "AI video generation editing deepfake"},
+]
+
+# refresh(category) -> the snapshot to serve for it
+Refresh = Callable[[Dict[str, str]], Awaitable[Any]]
+
+
+def load_categories(path: Optional[str]) -> List[Dict[str, str]]:
+    """
+    The catalogue from a JSON file of {id, name, icon, query} objects, or
+    the built-in one
+    """
+    if not path:
+        return list(CATEGORIES)
+    with open(path) as f:
+        categories = json.load(f)
+    for category in categories:
+        missing = {"id", "name", "query"} - set(category)
+        if missing:
+            raise ValueError(f"Category {category} is missing {sorted(missing)}")
+        category.setdefault("icon", "")
+    return categories
+
+
+class CategoryCatalogue:
+    def __init__(
+        self,
+        categories: List[Dict[str, str]],
+        refresh: Refresh,
+        interval: float = 600.0,
+        max_age: float = 3600.0,
+        jitter: float = 0.1,
+        clock: Callable[[], float] = time.monotonic,
+        shared_directory: str = "",
+        dump: Callable[[Any], Any] = lambda snapshot: snapshot,
+        load: Callable[[Any], Any] = lambda payload: payload,
+        poll_interval: float = 5.0,
+    ):
+        self.categories = categories
+        self._by_id = {category["id"]: category for category in categories}
+        self.refresh = refresh
+        self.interval = interval
+        self.max_age = max_age
+        self.jitter = jitter
+        self.clock = clock
+        # category id -> (snapshot, refreshed at); replaced, never mutated
+        self._snapshots: Dict[str, Tuple[Any, float]] = {}
+        self._scheduler: Optional["asyncio.Task[None]"] = None
+        # Snapshot files shared between workers, converted with dump/load
+        self.shared_directory = shared_directory
+        self.dump = dump
+        self.load = load
+        self.poll_interval = poll_interval
+        self.leader = FileLock(os.path.join(shared_directory, "leader.lock")) if shared_directory else None
+        self._loaded: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.failures = 0
+
+    @classmethod
+    def from_env(cls, refresh: Refresh, **kwargs) -> "CategoryCatalogue":
+        return cls(
+            load_categories(os.getenv("CATEGORIES_FILE")),
+            refresh,
+            interval=float(os.getenv("CATEGORY_REFRESH_INTERVAL", "600")),
+            max_age=float(os.getenv("CATEGORY_SNAPSHOT_MAX_AGE", "3600")),
+            shared_directory=state_directory("categories"),
+            **kwargs,
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.interval > 0
+
+    def get(self, category_id: str) -> Optional[Dict[str, str]]:
+        return self._by_id.get(category_id)
+
+    def snapshot(self, category_id: str) -> Optional[Tuple[Any, float]]:
+        """
+        The category's snapshot and its age in seconds, or None if it has
+        none younger than `max_age`
+        """
+        entry = self._snapshots.get(category_id)
+        age = None if entry is None else self.clock() - entry[1]
+        if age is None or age > self.max_age:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[0], age
+
+    async def start(self) -> None:
+        if not self.enabled or not self._by_id:
+            return
+        if self.shared_directory:
+            os.makedirs(self.shared_directory, exist_ok=True)
+            self.load_shared()
+            self._scheduler = asyncio.ensure_future(self._follow_leader())
+        else:
+            self._scheduler = asyncio.ensure_future(self._refresh_periodically())
+
+    async def close(self) -> None:
+        if self._scheduler is not None:
+            self._scheduler.cancel()
+            self._scheduler = None
+        if self.leader is not None:
+            self.leader.release()
+
+    def _swap_in(self, category_id: str, snapshot: Any, refreshed_at: float) -> None:
+        self._snapshots = {**self._snapshots, category_id: (snapshot, refreshed_at)}
+
+    def _shared_path(self, category_id: str) -> str:
+        return os.path.join(self.shared_directory, f"{category_id}.json")
+
+    def _publish(self, category_id: str, snapshot: Any) -> None:
+        path = self._shared_path(category_id)
+        with open(path + ".tmp", "w") as f:
+            json.dump({"refreshed_at": time.time(), "snapshot": self.dump(snapshot)}, f)
+        os.replace(path + ".tmp", path)
+        self._loaded[category_id] = os.stat(path).st_mtime_ns
+
+    def load_shared(self) -> int:
+        """
+        Swap in every snapshot file written since it was last loaded
+        """
+        loaded = 0
+        for category_id in self._by_id:
+            path = self._shared_path(category_id)
+            try:
+                modified = os.stat(path).st_mtime_ns
+                if self._loaded.get(category_id) == modified:
+                    continue
+                with open(path) as f:
+                    payload = json.load(f)
+                snapshot = self.load(payload["snapshot"])
+            except FileNotFoundError:
+                continue
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                print(f"Category snapshot load error for {category_id}: {e}")
+                continue
+            # Wall-clock age carried over to this process's clock
+            age = max(0.0, time.time() - payload["refreshed_at"])
+            self._swap_in(category_id, snapshot, self.clock() - age)
+            self._loaded[category_id] = modified
+            loaded += 1
+        return loaded
+
+    async def _follow_leader(self) -> None:
+        while not self.leader.try_acquire():
+            await asyncio.sleep(self.poll_interval)
+            self.load_shared()
+        # Leader from here on: load what the previous leader left, then
+        # refresh only what is missing or due
+        self.load_shared()
+        await self._refresh_periodically()
+
+    async def refresh_category(self, category: Dict[str, str]) -> bool:
+        """
+        Fetch a new snapshot of `category` and swap it in; on failure the
+        previous snapshot stays in place
+        """
+        try:
+            snapshot = await self.refresh(category)
+        except Exception as e:
+            self.failures += 1
+            print(f"Category refresh error for {category['id']}: {e}")
+            return False
+        self._swap_in(category["id"], snapshot, self.clock())
+        self.refreshes += 1
+        if self.shared_directory:
+            try:
+                self._publish(category["id"], snapshot)
+            except OSError as e:
+                print(f"Category snapshot write error for {category['id']}: {e}")
+        return True
+
+    def _due(self, category: Dict[str, str]) -> bool:
+        entry = self._snapshots.get(category["id"])
+        return entry is None or self.clock() - entry[1] >= self.interval
+
+    async def _refresh_periodically(self) -> None:
+        # Warm every category without a recent snapshot, one after another,
+        # then refresh them round-robin so each is refreshed once per interval
+        for category in self.categories:
+            if self._due(category):
+                await self.refresh_category(category)
+        spacing = self.interval / len(self.categories)
+        while True:
+            for category in self.categories:
+                await asyncio.sleep(spacing * random.uniform(1 - self.jitter, 1 + self.jitter))
+                await self.refresh_category(category)
+
+    def stats(self) -> Dict[str, Any]:
+        now = self.clock()
+        ages = [now - refreshed_at for _, refreshed_at in self._snapshots.values()]
+        return {
+            "enabled": self.enabled,
+            "categories": len(self.categories),
+            "snapshots": len(self._snapshots),
+            "oldest_snapshot_age": max(ages) if ages else None,
+            "refresh_interval": self.interval,
+            "leader": self.leader.held if self.leader is not None else True,
+            "hits": self.hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+            "failures": self.failures,
+        }
@@ -0,0 +1,154 @@
+"""
+Near-duplicate collapsing for search results.
+
+Two results are the same page when their links share a canonical URL
+(providers.canonical_url). Mirrors, syndicated copies and reposts have
+different URLs but almost the same title and snippet, so each result's
+text is also fingerprinted with a 64-bit SimHash over its words and word
+pairs: texts that differ in a few words get fingerprints that differ in
+a few bits, and two fingerprints within `distance` bits of each other are
+taken to be copies of one page.
+
+FingerprintIndex finds a stored fingerprint within the distance without
+comparing against all of them. Fingerprints are split into distance + 1
+bands, and two fingerprints that differ in at most `distance` bits agree
+exactly on at least one band, so a lookup is one dict probe per band.
+The index is bounded and evicts its oldest fingerprints first; it works
+on keys and fingerprints alone, so the same index serves a per-query
+cursor and an offline pass over the stored corpus.
+"""
+import hashlib
+import re
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+# Texts shorter than this say too little to tell two pages apart, and are
+# only collapsed by URL
+MIN_WORDS = 8
+
+# Word hashes kept between calls; the vocabulary of results is small
+MAX_MEMO_WORDS = 100_000
+
+# Odd multiplier that makes a word pair's hash depend on the order of its words
+_PAIR = np.uint64(0x9E3779B97F4A7C15)
+_word_hashes: Dict[str, int] = {}
+
+
+def _word_hash(word: str) -> int:
+    hashed = _word_hashes.get(word)
+    if hashed is None:
+        if len(_word_hashes) >= MAX_MEMO_WORDS:
+            _word_hashes.clear()
+        digest = hashlib.blake2b(word.encode(), digest_size=8).digest()
+        hashed = _word_hashes[word] = int.from_bytes(digest, "little")
+    return hashed
+
+
+def simhash(text: str) -> Optional[int]:
+    """
+    64-bit SimHash of the words and adjacent word pairs of `text`, or None
+    when it has fewer than MIN_WORDS words
+    """
+    words = _WORD.findall(text.lower())
+    if len(words) < MIN_WORDS:
+        return None
+    words = np.fromiter(map(_word_hash, words), dtype=np.uint64, count=len(words))
+    features = np.concatenate((words, (words[:-1] * _PAIR) ^ words[1:]))
+    # Each feature votes its hash's bits up (1) or down (0); a fingerprint
+    # bit is set where the ups win
+    bits = np.unpackbits(features.astype("<u8").view(np.uint8), bitorder="little")
+    ups = bits.reshape(-1, 64).sum(axis=0, dtype=np.int64)
+    bits = np.packbits(ups * 2 > len(features), bitorder="little")
+    return int.from_bytes(bits.tobytes(), "little")
+
+
+def result_fingerprint(title: str, snippet: str) -> Optional[int]:
+    return simhash(f"{title} {snippet}")
+
+
+class FingerprintIndex:
+    """
+    Up to `max_entries` fingerprints, each with the key of the result it
+    came from; once full, adding one evicts the oldest
+    """
+
+    def __init__(self, max_entries: int = 10_000, distance: int = 6):
+        self.max_entries = max(1, max_entries)
+        self.distance = distance
+        count = distance + 1
+        width = 64 // count
+        # (shift, mask) of each band; the last one takes the leftover bits
+        self._bands: List[Tuple[int, int]] = [
+            (i * width, (1 << (width if i < count - 1 else 64 - i * width)) - 1)
+            for i in range(count)
+        ]
+        self._tables: List[Dict[int, List[int]]] = [{} for _ in range(count)]
+        self._keys: "OrderedDict[int, Hashable]" = OrderedDict()
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def find(self, fingerprint: int) -> Optional[Hashable]:
+        """
+        Key of a stored fingerprint within the distance, or None
+        """
+        for table, (shift, mask) in zip(self._tables, self._bands):
+            for candidate in table.get((fingerprint >> shift) & mask, ()):
+                if (candidate ^ fingerprint).bit_count() <= self.distance:
+                    return self._keys[candidate]
+        return None
+
+    def add(self, fingerprint: int, key: Hashable) -> None:
+        if fingerprint in self._keys:
+            return
+        if len(self._keys) >= self.max_entries:
+            evicted, _ = self._keys.popitem(last=False)
+            for table, (shift, mask) in zip(self._tables, self._bands):
+                band = (evicted >> shift) & mask
+                bucket = table[band]
+                bucket.remove(evicted)
+                if not bucket:
+                    del table[band]
+            self.evictions += 1
+        self._keys[fingerprint] = key
+        for table, (shift, mask) in zip(self._tables, self._bands):
+            table.setdefault((fingerprint >> shift) & mask, []).append(fingerprint)
+
+
+class DuplicateFilter:
+    """
+    Keys and fingerprints of the results kept so far, each bounded to the
+    most recent `max_entries`
+    """
+
+    def __init__(self, max_entries: int = 10_000, distance: Optional[int] = 6):
+        self.max_entries = max(1, max_entries)
+        self._keys: "OrderedDict[Hashable, None]" = OrderedDict()
+        self.fingerprints = (
+            FingerprintIndex(max_entries, distance) if distance is not None else None
+        )
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def check(self, key: Hashable, fingerprint: Optional[int] = None) -> Optional[str]:
+        """
+        "url" if a result with `key` was kept before, "near" if one with a
+        fingerprint within the distance was, otherwise None, and the
+        result is kept
+        """
+        if key in self._keys:
+            return "url"
+        if fingerprint is not None and self.fingerprints is not None:
+            if self.fingerprints.find(fingerprint) is not None:
+                return "near"
+            self.fingerprints.add(fingerprint, key)
+        if len(self._keys) >= self.max_entries:
+            self._keys.popitem(last=False)
+        self._keys[key] = None
+        return None
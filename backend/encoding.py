@@ -0,0 +1,214 @@
+"""
+Compressed, conditional JSON bodies for search responses.
+
+A search response body is the page of results, which only changes along
+with the cached response, followed by `search_time` and the echoed
+`query`, which change on every request. The page is serialized and
+compressed once, when its response is cached, into an EncodedPage. Each
+request then serializes only the short tail and appends it to the stored
+prefix as an uncompressed continuation of the same gzip or brotli
+stream, so a cache hit costs microseconds of encoding rather than a full
+serialization and compression of the page.
+
+Compression is negotiated from Accept-Encoding (brotli when the optional
+`brotli` package is installed, and gzip) and skipped for bodies under a
+size threshold. Responses carry a weak ETag over the page and query, and
+a request whose If-None-Match matches it gets a 304 with no body.
+"""
+import hashlib
+import os
+import struct
+import zlib
+from typing import Dict, List, Mapping, Optional
+
+from fastapi.responses import Response
+
+from metrics import response_bytes, responses_encoded
+
+try:
+    import brotli
+except ImportError:  # optional: without it only gzip is offered
+    brotli = None
+
+# gzip member header: deflate, no flags, no mtime, unknown OS
+GZIP_HEADER = b"\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff"
+# Longest run of bytes one deflate stored block or brotli metablock holds here
+MAX_BLOCK = 0xFFFF
+
+
+def _deflate_stored(data: bytes) -> bytes:
+    """
+    `data` as byte-aligned stored deflate blocks, the last one final
+    """
+    blocks = []
+    for start in range(0, len(data), MAX_BLOCK):
+        chunk = data[start:start + MAX_BLOCK]
+        final = 1 if start + MAX_BLOCK >= len(data) else 0
+        blocks.append(struct.pack("<BHH", final, len(chunk), len(chunk) ^ 0xFFFF) + chunk)
+    return b"".join(blocks) or b"\x01\x00\x00\xff\xff"
+
+
+def _brotli_uncompressed(data: bytes) -> bytes:
+    """
+    `data` as uncompressed brotli metablocks, then the empty last metablock
+    """
+    blocks = []
+    for start in range(0, len(data), MAX_BLOCK):
+        chunk = data[start:start + MAX_BLOCK]
+        # ISLAST=0, MNIBBLES=4, MLEN-1 in 16 bits, ISUNCOMPRESSED=1, then
+        # padding to the byte boundary
+        header = ((len(chunk) - 1) << 3) | (1 << 19)
+        blocks.append(header.to_bytes(3, "little") + chunk)
+    # ISLAST=1, ISLASTEMPTY=1
+    blocks.append(b"\x03")
+    return b"".join(blocks)
+
+
+class EncodedPage:
+    """
+    The part of a response body shared by every request for it, in each
+    encoding on offer, plus a digest for its ETag
+    """
+
+    __slots__ = ("prefix", "digest", "gzip", "gzip_crc", "brotli")
+
+    def __init__(self, prefix: bytes, gzip_level: int = 6, brotli_quality: Optional[int] = 5):
+        self.prefix = prefix
+        self.digest = hashlib.blake2b(prefix, digest_size=8).hexdigest()
+        # Raw deflate, flushed to a byte boundary but not finished, so the
+        # tail can follow as more blocks of the same stream
+        compressor = zlib.compressobj(gzip_level, zlib.DEFLATED, -zlib.MAX_WBITS)
+        self.gzip = compressor.compress(prefix) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        self.gzip_crc = zlib.crc32(prefix)
+        self.brotli = None
+        if brotli is not None and brotli_quality is not None:
+            compressor = brotli.Compressor(quality=brotli_quality)
+            self.brotli = compressor.process(prefix) + compressor.flush()
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.prefix) + len(self.gzip) + len(self.brotli or b"")
+
+    def body(self, tail: bytes, encoding: Optional[str]) -> bytes:
+        if encoding == "gzip":
+            size = (len(self.prefix) + len(tail)) & 0xFFFFFFFF
+            trailer = struct.pack("<II", zlib.crc32(tail, self.gzip_crc), size)
+            return GZIP_HEADER + self.gzip + _deflate_stored(tail) + trailer
+        if encoding == "br":
+            return self.brotli + _brotli_uncompressed(tail)
+        return self.prefix + tail
+
+
+def _opaque_tags(header: str) -> List[str]:
+    # Weak comparison: W/"x" and "x" match
+    return [tag.strip().removeprefix("W/") for tag in header.split(",")]
+
+
+class ResponseEncoder:
+    def __init__(
+        self,
+        min_size: int = 1024,
+        encodings: Optional[List[str]] = None,
+        gzip_level: int = 6,
+        brotli_quality: int = 5,
+    ):
+        self.min_size = min_size
+        available = ["br", "gzip"] if brotli is not None else ["gzip"]
+        # Server preference among encodings the client accepts equally
+        self.encodings = [e for e in (encodings or available) if e in available]
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        # Accept-Encoding header -> chosen encoding; browsers send a handful
+        self._negotiated: Dict[str, Optional[str]] = {}
+        self.sent: Dict[str, int] = {}
+        self.not_modified = 0
+
+    @classmethod
+    def from_env(cls) -> "ResponseEncoder":
+        encodings = os.getenv("COMPRESSION_ENCODINGS", "br,gzip")
+        return cls(
+            min_size=int(os.getenv("COMPRESSION_MIN_SIZE", "1024")),
+            encodings=[e.strip() for e in encodings.split(",") if e.strip()],
+            gzip_level=int(os.getenv("COMPRESSION_GZIP_LEVEL", "6")),
+            brotli_quality=int(os.getenv("COMPRESSION_BROTLI_QUALITY", "5")),
+        )
+
+    def page(self, prefix: bytes) -> EncodedPage:
+        return EncodedPage(
+            prefix, self.gzip_level, self.brotli_quality if "br" in self.encodings else None
+        )
+
+    def negotiate(self, accept_encoding: str) -> Optional[str]:
+        """
+        The offered encoding with the highest q-value in `accept_encoding`,
+        or None to send the body as is
+        """
+        if accept_encoding in self._negotiated:
+            return self._negotiated[accept_encoding]
+        accepted = {}
+        for item in accept_encoding.lower().split(","):
+            name, _, params = item.partition(";")
+            quality = 1.0
+            params = params.strip()
+            if params.startswith("q="):
+                try:
+                    quality = float(params[2:])
+                except ValueError:
+                    quality = 0.0
+            accepted[name.strip()] = quality
+        chosen, best = None, 0.0
+        for encoding in self.encodings:
+            quality = accepted.get(encoding, accepted.get("*", 0.0))
+            if quality > best:
+                chosen, best = encoding, quality
+        if len(self._negotiated) >= 256:
+            self._negotiated.clear()
+        self._negotiated[accept_encoding] = chosen
+        return chosen
+
+    def respond(
+        self,
+        page: EncodedPage,
+        tail: bytes,
+        variant: str,
+        request_headers: Mapping[str, str],
+        headers: Optional[Dict[str, str]] = None,
+    ) -> Response:
+        """
+        The response for `page` followed by `tail`: a 304 if the client
+        already has it, otherwise the body in the negotiated encoding.
+        The ETag covers the page and `variant`, the part of the tail that
+        is not per-request noise.
+        """
+        etag = f'W/"{page.digest}-{zlib.crc32(variant.encode()):08x}"'
+        headers = {**(headers or {}), "ETag": etag, "Vary": "Accept-Encoding"}
+
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match and (if_none_match.strip() == "*" or
+                              etag[2:] in _opaque_tags(if_none_match)):
+            self.not_modified += 1
+            responses_encoded.inc(encoding="not_modified")
+            return Response(status_code=304, headers=headers)
+
+        size = len(page.prefix) + len(tail)
+        encoding = None
+        if size >= self.min_size:
+            encoding = self.negotiate(request_headers.get("accept-encoding", ""))
+        body = page.body(tail, encoding)
+        if encoding is not None:
+            headers["Content-Encoding"] = encoding
+
+        label = encoding or "identity"
+        self.sent[label] = self.sent.get(label, 0) + 1
+        responses_encoded.inc(encoding=label)
+        response_bytes.inc(size, kind="raw")
+        response_bytes.inc(len(body), kind="sent")
+        return Response(body, media_type="application/json", headers=headers)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "encodings": self.encodings,
+            "min_size": self.min_size,
+            "sent": dict(self.sent),
+            "not_modified": self.not_modified,
+        }
@@ -0,0 +1,361 @@
+"""
+Query and click logging.
+
+Searches are logged by the server as they are answered, and result clicks
+arrive from the frontend at /api/events. Recording an event only puts it
+on a bounded asyncio queue, so it costs a request microseconds; when the
+queue is full the event is dropped and counted instead of making the
+request wait. A background task drains the queue in batches, once
+`batch_size` events have collected or every `flush_interval` seconds, and
+writes them to MongoDB or to gzip-compressed JSONL files rotated by size
+and age.
+
+The log is what cache warming and suggestion ranking learn from beyond a
+single process's lifetime; read_events() reads the files back.
+"""
+import abc
+import asyncio
+import gzip
+import json
+import os
+import time
+import zlib
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional
+
+from lazy import LazyModule
+from metrics import events_dropped, events_logged
+
+# The driver is imported on first use, so servers without MONGO_URL never load it
+motor_asyncio = LazyModule("motor.motor_asyncio")
+pymongo = LazyModule("pymongo")
+
+Event = Dict[str, Any]
+
+
+class EventSink(abc.ABC):
+    """
+    Where batches of events end up
+    """
+
+    name = "none"
+
+    async def start(self) -> None:
+        pass
+
+    @abc.abstractmethod
+    async def write(self, events: List[Event]) -> None:
+        ...
+
+    async def close(self) -> None:
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {"sink": self.name}
+
+
+class JsonlFileSink(EventSink):
+    """
+    Events as JSON lines in gzip files, each batch appended as its own gzip
+    member, so a file reads back up to its last whole batch even if the
+    process dies mid-write. A file is closed after every batch; a new one
+    is started once the current one reaches `max_bytes` or `max_age`
+    seconds, and only the newest `max_files` are kept. Every process
+    writes files of its own.
+    """
+
+    name = "file"
+
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: int = 64 * 1024 * 1024,
+        max_age: float = 3600.0,
+        max_files: int = 168,
+        compresslevel: int = 6,
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.max_files = max_files
+        self.compresslevel = compresslevel
+        self.path: Optional[str] = None
+        self._opened_at = 0.0
+        self._size = 0
+        self.rotations = 0
+        self.bytes_written = 0
+
+    async def start(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _rotate(self) -> None:
+        now = time.time()
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.gmtime(now))
+        self.path = os.path.join(self.directory, f"events-{stamp}-{os.getpid()}.jsonl.gz")
+        self._opened_at = now
+        self._size = 0
+        self.rotations += 1
+        files = sorted(name for name in os.listdir(self.directory) if name.endswith(".jsonl.gz"))
+        for name in files[:max(len(files) - self.max_files + 1, 0)]:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                # Another worker removed it first
+                pass
+
+    def _append(self, data: bytes) -> None:
+        if (self.path is None or self._size >= self.max_bytes
+                or time.time() - self._opened_at >= self.max_age):
+            self._rotate()
+        member = gzip.compress(data, compresslevel=self.compresslevel)
+        with open(self.path, "ab") as f:
+            f.write(member)
+        self._size += len(member)
+        self.bytes_written += len(member)
+
+    async def write(self, events: List[Event]) -> None:
+        data = "".join(json.dumps(event, separators=(",", ":")) + "\n" for event in events)
+        await asyncio.to_thread(self._append, data.encode())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sink": self.name,
+            "directory": self.directory,
+            "file": self.path and os.path.basename(self.path),
+            "rotations": self.rotations,
+            "bytes_written": self.bytes_written,
+        }
+
+
+class MongoEventSink(EventSink):
+    """
+    One document per event, with `at` as a date under a TTL index so Mongo
+    expires events after `ttl` seconds
+    """
+
+    name = "mongo"
+
+    def __init__(self, url: str, collection: str = "events", ttl: float = 30 * 86400.0,
+                 timeout: float = 2.0):
+        self.url = url
+        self.collection_name = collection
+        self.ttl = ttl
+        self.timeout = timeout
+        self._client = None
+        self._collection = None
+
+    @property
+    def collection(self):
+        if self._collection is None:
+            timeout_ms = int(self.timeout * 1000)
+            self._client = motor_asyncio.AsyncIOMotorClient(
+                self.url,
+                serverSelectionTimeoutMS=timeout_ms,
+                connectTimeoutMS=timeout_ms,
+                socketTimeoutMS=timeout_ms,
+                tz_aware=True,
+            )
+            database = self._client.get_default_database(default="app_db")
+            self._collection = database[self.collection_name]
+        return self._collection
+
+    async def start(self) -> None:
+        try:
+            await self.collection.create_index("at", expireAfterSeconds=int(self.ttl), name="expiry")
+            await self.collection.create_index(
+                [("type", pymongo.ASCENDING), ("query", pymongo.ASCENDING)], name="type_query"
+            )
+        except pymongo.errors.PyMongoError as e:
+            print(f"Event log index setup failed: {str(e)}")
+
+    async def write(self, events: List[Event]) -> None:
+        documents = [
+            {**event, "at": datetime.fromtimestamp(event["at"], timezone.utc)} for event in events
+        ]
+        await self.collection.insert_many(documents, ordered=False)
+
+    async def close(self) -> None:
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+            self._collection = None
+
+
+class EventLog:
+    """
+    Bounded queue of events in front of a sink, drained by a background
+    task; without a sink, recording is a no-op
+    """
+
+    def __init__(
+        self,
+        sink: Optional[EventSink],
+        max_queue: int = 10_000,
+        batch_size: int = 500,
+        flush_interval: float = 5.0,
+    ):
+        self.sink = sink
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "asyncio.Queue[Event]" = asyncio.Queue(max_queue)
+        self._wake = asyncio.Event()
+        self._task: Optional["asyncio.Task[None]"] = None
+        self._closing = False
+        self.recorded = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+
+    @classmethod
+    def from_env(cls) -> "EventLog":
+        """
+        EVENT_LOG is "file" (the default, under EVENT_LOG_DIR), "mongo"
+        (needs MONGO_URL) or "off"
+        """
+        kind = os.getenv("EVENT_LOG", "file")
+        default_directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "events")
+        sink: Optional[EventSink] = None
+        if kind == "mongo" and os.getenv("MONGO_URL"):
+            sink = MongoEventSink(
+                os.environ["MONGO_URL"],
+                collection=os.getenv("EVENT_LOG_COLLECTION", "events"),
+                ttl=float(os.getenv("EVENT_LOG_TTL", str(30 * 86400))),
+                timeout=float(os.getenv("MONGO_TIMEOUT", "2")),
+            )
+        elif kind in ("file", "mongo") and os.getenv("EVENT_LOG_DIR", default_directory):
+            sink = JsonlFileSink(
+                os.getenv("EVENT_LOG_DIR", default_directory),
+                max_bytes=int(os.getenv("EVENT_LOG_FILE_MAX_BYTES", str(64 * 1024 * 1024))),
+                max_age=float(os.getenv("EVENT_LOG_FILE_MAX_AGE", "3600")),
+                max_files=int(os.getenv("EVENT_LOG_MAX_FILES", "168")),
+            )
+        return cls(
+            sink,
+            max_queue=int(os.getenv("EVENT_LOG_MAX_QUEUE", "10000")),
+            batch_size=int(os.getenv("EVENT_LOG_BATCH_SIZE", "500")),
+            flush_interval=float(os.getenv("EVENT_LOG_FLUSH_INTERVAL", "5")),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.sink is not None
+
+    def record(self, kind: str, **fields: Any) -> bool:
+        """
+        Queue an event of type `kind`; False if it was dropped
+        """
+        if self.sink is None:
+            return False
+        try:
+            self._queue.put_nowait({"type": kind, "at": time.time(), **fields})
+        except asyncio.QueueFull:
+            self.dropped += 1
+            events_dropped.inc(reason="queue_full")
+            return False
+        self.recorded += 1
+        if self._queue.qsize() >= self.batch_size:
+            self._wake.set()
+        return True
+
+    async def start(self) -> None:
+        if self.sink is None:
+            return
+        await self.sink.start()
+        self._closing = False
+        self._task = asyncio.ensure_future(self._run())
+
+    async def close(self) -> None:
+        """
+        Write what is still queued, then close the sink
+        """
+        if self._task is not None:
+            self._closing = True
+            self._wake.set()
+            await self._task
+            self._task = None
+        if self.sink is not None:
+            await self.sink.close()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+            if self._closing:
+                return
+
+    async def flush(self) -> None:
+        """
+        Write everything queued so far, `batch_size` events at a time
+        """
+        while not self._queue.empty():
+            batch = [self._queue.get_nowait()
+                     for _ in range(min(self.batch_size, self._queue.qsize()))]
+            try:
+                await self.sink.write(batch)
+            except Exception as e:
+                # The batch is lost; the log never holds requests up to retry
+                self.failed += len(batch)
+                events_dropped.inc(len(batch), reason="write_failed")
+                print(f"Event log write of {len(batch)} events failed: {str(e)}")
+            else:
+                self.written += len(batch)
+                self.batches += 1
+                # Counted here rather than per event, off the request path
+                for kind, count in Counter(event["type"] for event in batch).items():
+                    events_logged.inc(count, type=kind)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **(self.sink.stats() if self.sink is not None else {"sink": None}),
+            "queued": self._queue.qsize(),
+            "max_queue": self.max_queue,
+            "recorded": self.recorded,
+            "dropped": self.dropped,
+            "written": self.written,
+            "failed": self.failed,
+            "batches": self.batches,
+        }
+
+
+def read_events(directory: str, since: float = 0.0) -> Iterator[Event]:
+    """
+    Every event in the JSONL files under `directory`, oldest file first,
+    from wall-clock time `since` on. A line that is not a JSON object with
+    a numeric "at" is skipped, and a batch cut short by a crash or a
+    corrupt stretch of a file ends that file; either is logged rather than
+    raised, since the log is read at startup.
+    """
+    names = sorted(name for name in os.listdir(directory) if name.endswith(".jsonl.gz"))
+    for name in names:
+        path = os.path.join(directory, name)
+        try:
+            if os.path.getmtime(path) < since:
+                # Last written before `since`, so every event in it is older
+                continue
+            # Lines are decoded one by one, so a bad byte costs only its line
+            with gzip.open(path, "rb") as f:
+                for number, line in enumerate(f, start=1):
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        event = None
+                    at = event.get("at") if isinstance(event, dict) else None
+                    if not isinstance(at, (int, float)) or isinstance(at, bool):
+                        print(f"Event log: skipping a malformed line {number} of {name}")
+                        continue
+                    if at >= since:
+                        yield event
+        except FileNotFoundError:
+            # Rotated away while we listed the directory
+            continue
+        except (EOFError, OSError, zlib.error) as e:
+            # Truncated or corrupt compressed data
+            print(f"Event log: stopped reading {name}: {str(e)}")
+            continue
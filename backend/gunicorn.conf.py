@@ -0,0 +1,33 @@
+"""
+Gunicorn settings for the production profile started by entrypoint.sh:
+one Uvicorn worker per CPU (uvloop and httptools are picked up when
+installed), sharing caches and metrics through WORKER_STATE_DIR.
+
+    gunicorn -c gunicorn.conf.py server:app
+"""
+import os
+
+from workers import prepare_worker_state, worker_count
+
+# Runs when this file is read, before preload_app imports the app, so the
+# app's module-level setup already sees WORKER_STATE_DIR
+prepare_worker_state()
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8001')}"
+workers = worker_count()
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Import the app once in the master and fork workers from it: workers start
+# without repeating the imports (which would otherwise run concurrently,
+# contending for the CPU during a scale-up) and share the loaded modules'
+# memory. Sockets, pools and locks are only opened in the startup hooks,
+# after the fork.
+preload_app = True
+
+# Idle keep-alive connections stay open longer than nginx keeps them in its
+# upstream pool, so nginx never reuses one the backend is closing
+keepalive = 75
+
+# Seconds a worker gets to finish in-flight requests on shutdown or restart
+graceful_timeout = 20
+timeout = 60
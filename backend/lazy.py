@@ -0,0 +1,35 @@
+"""
+Deferred imports for optional subsystems.
+
+A dependency that only some deployments use (the Mongo driver, when no
+MONGO_URL is set) is bound to a LazyModule instead of being imported at
+the top of the module. It is imported on first attribute access, so a
+server that never uses it does not pay for loading it at startup.
+"""
+import importlib
+from types import ModuleType
+from typing import Any, Optional
+
+
+class LazyModule:
+    """
+    Stand-in for the module `name`, imported the first time one of its
+    attributes is looked up
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._module: Optional[ModuleType] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    def __getattr__(self, attribute: str) -> Any:
+        if self._module is None:
+            self._module = importlib.import_module(self.name)
+        return getattr(self._module, attribute)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self.loaded else "not loaded"
+        return f"<lazy module {self.name!r} ({state})>"
@@ -0,0 +1,794 @@
+"""
+Local full-text index of the AI results served so far.
+
+Every result that passes the AI filter is added to an embedded inverted
+index, so a query can be answered from results seen before: instantly, or
+while the upstream is unavailable. Documents are scored with BM25.
+
+New documents collect in an in-memory buffer that is flushed to an
+immutable on-disk segment every `flush_every` documents (and
+periodically). Segments are memory-mapped and read in place through NumPy
+views, so opening an index costs nothing per document. Once
+`merge_factor` segments of similar size pile up they are merged into one
+in a background thread, which keeps the number of segments a query visits
+logarithmic in the corpus size.
+
+Each posting stores its BM25 term-frequency factor (its "impact",
+normalized by the segment's average document length) next to the raw
+term frequency, so a query only multiplies impacts by the term's IDF.
+
+Segments have a single writer. Each worker process claims its own shard
+directory under the index directory and writes only there, and searches
+the other shards' segments read-only, picking up their manifests as they
+change; segment files are immutable, so reading them needs no locking.
+"""
+import asyncio
+import hashlib
+import json
+import math
+import mmap
+import os
+import re
+import struct
+import time
+from collections import Counter
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from providers import canonical_url
+from workers import FileLock, claim_slot
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+# BM25 term-frequency saturation and length normalization
+K1 = 1.2
+B = 0.75
+
+# Segment file: MAGIC, a little-endian uint32 header length, a JSON header,
+# then these sections in order, each starting on an 8-byte boundary. The
+# header gives every section's offset from the end of the header and its
+# element count.
+MAGIC = b"AIXSEG01"
+_SECTIONS = (
+    ("term_offsets", "<u8"),  # terms + 1 offsets into term_blob
+    ("term_blob", "u1"),      # sorted UTF-8 terms, concatenated
+    ("term_prefixes", "<u8"), # first 8 bytes of each term, big-endian, zero-padded
+    ("term_max_impacts", "<f2"),  # highest impact in each term's postings
+    ("post_offsets", "<u8"),  # terms + 1 offsets into the posting arrays
+    ("post_docs", "<u4"),     # ascending doc numbers per term
+    ("post_tfs", "<u2"),      # term frequency, parallel to post_docs
+    ("post_impacts", "<f2"),  # BM25 term-frequency factor, parallel to post_docs
+    ("doc_lengths", "<u4"),   # tokens per document
+    ("doc_offsets", "<u8"),   # docs + 1 offsets into doc_blob
+    ("doc_blob", "u1"),       # one JSON object per document, concatenated
+    ("url_hashes", "<u8"),    # sorted canonical URL hashes, for dedupe
+)
+
+MANIFEST = "manifest.json"
+
+# Seconds between checks of the other shards' manifests
+PEER_REFRESH_INTERVAL = 1.0
+
+# (doc numbers, impacts, highest impact) of one term in one segment
+Posting = Tuple[np.ndarray, np.ndarray, float]
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(text.lower())
+
+
+def document_terms(doc: Dict[str, Any]) -> Counter:
+    # Title terms count twice: a match there says more than one in the snippet
+    return Counter(tokenize(doc.get("title", "")) * 2 + tokenize(doc.get("snippet", "")))
+
+
+def url_hash(link: str) -> int:
+    digest = hashlib.blake2b(canonical_url(link).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+def _prefix_key(term: bytes) -> int:
+    # Terms never contain NUL, so zero padding keeps the keys in term order
+    return int.from_bytes(term[:8].ljust(8, b"\0"), "big")
+
+
+def _term_arrays(encoded: List[bytes]) -> Dict[str, np.ndarray]:
+    return {
+        "term_offsets": _offsets(len(term) for term in encoded),
+        "term_blob": np.frombuffer(b"".join(encoded), dtype=np.uint8),
+        "term_prefixes": np.fromiter((_prefix_key(term) for term in encoded),
+                                     dtype=np.uint64, count=len(encoded)),
+    }
+
+
+def bm25_impacts(tfs: np.ndarray, lengths: np.ndarray, avgdl: float) -> np.ndarray:
+    """
+    tf * (k1 + 1) / (tf + k1 * (1 - b + b * dl / avgdl)) per posting
+    """
+    tfs = tfs.astype(np.float32)
+    return (tfs * (K1 + 1) / (tfs + K1 * (1 - B + B * lengths / avgdl))).astype(np.float16)
+
+
+def _with_impacts(arrays: Dict[str, np.ndarray], total_length: int) -> Dict[str, np.ndarray]:
+    doc_lengths = arrays["doc_lengths"]
+    avgdl = total_length / max(len(doc_lengths), 1)
+    impacts = bm25_impacts(arrays["post_tfs"], doc_lengths[arrays["post_docs"]], avgdl)
+    starts = arrays["post_offsets"][:-1].astype(np.int64)
+    arrays["post_impacts"] = impacts
+    arrays["term_max_impacts"] = (
+        np.maximum.reduceat(impacts, starts) if len(starts) else np.zeros(0, dtype=np.float16)
+    )
+    return arrays
+
+
+def _offsets(lengths: Iterable[int]) -> np.ndarray:
+    lengths = np.fromiter(lengths, dtype=np.uint64)
+    return np.concatenate(([0], np.cumsum(lengths, dtype=np.uint64))).astype(np.uint64)
+
+
+def write_segment(path: str, arrays: Dict[str, np.ndarray], total_length: int) -> None:
+    """
+    Write a segment file atomically (to a temporary name, then renamed)
+    """
+    arrays = _with_impacts(arrays, total_length)
+    sections = {}
+    offset = 0
+    for name, dtype in _SECTIONS:
+        arrays[name] = np.ascontiguousarray(arrays[name], dtype=dtype)
+        sections[name] = [offset, len(arrays[name])]
+        offset = _align(offset + arrays[name].nbytes)
+    header = json.dumps({
+        "docs": len(arrays["doc_lengths"]),
+        "terms": len(arrays["term_offsets"]) - 1,
+        "total_length": int(total_length),
+        "sections": sections,
+    }).encode()
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC + struct.pack("<I", len(header)) + header)
+        f.write(b"\0" * (_align(f.tell()) - f.tell()))
+        for name, _ in _SECTIONS:
+            data = arrays[name]
+            f.write(memoryview(data).cast("B"))
+            f.write(b"\0" * (_align(data.nbytes) - data.nbytes))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class Segment:
+    """
+    Read-only view of one memory-mapped segment file
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.name = os.path.basename(path)
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not an index segment")
+        (length,) = struct.unpack_from("<I", self._mmap, len(MAGIC))
+        start = len(MAGIC) + 4
+        header = json.loads(self._mmap[start:start + length])
+        base = _align(start + length)
+
+        self.doc_count = header["docs"]
+        self.term_count = header["terms"]
+        self.total_length = header["total_length"]
+        self._bases = {}
+        for name, dtype in _SECTIONS:
+            offset, count = header["sections"][name]
+            self._bases[name] = base + offset
+            setattr(self, name, np.frombuffer(self._mmap, dtype=dtype, count=count,
+                                              offset=base + offset))
+
+    def __len__(self) -> int:
+        return self.doc_count
+
+    def _term(self, i: int) -> bytes:
+        base = self._bases["term_blob"]
+        return self._mmap[base + int(self.term_offsets[i]):base + int(self.term_offsets[i + 1])]
+
+    def lookup(self, term: str, avgdl: float) -> Optional[Posting]:
+        """
+        Postings of a term. The 8-byte prefix keys narrow the sorted
+        dictionary down to the few terms sharing a prefix, which are then
+        compared in full. Impacts were normalized when the segment was
+        written, so `avgdl` is not needed here.
+        """
+        key = term.encode()
+        prefix = np.uint64(_prefix_key(key))
+        lo = int(np.searchsorted(self.term_prefixes, prefix, side="left"))
+        hi = int(np.searchsorted(self.term_prefixes, prefix, side="right"))
+        while lo < hi and self._term(lo) != key:
+            lo += 1
+        if lo == hi:
+            return None
+        start, end = int(self.post_offsets[lo]), int(self.post_offsets[lo + 1])
+        return (self.post_docs[start:end], self.post_impacts[start:end],
+                float(self.term_max_impacts[lo]))
+
+    def terms(self) -> List[str]:
+        blob = self.term_blob.tobytes()
+        offsets = self.term_offsets.tolist()
+        return [blob[a:b].decode() for a, b in zip(offsets, offsets[1:])]
+
+    def document(self, doc: int) -> Dict[str, Any]:
+        base = self._bases["doc_blob"]
+        return json.loads(self._mmap[base + int(self.doc_offsets[doc]):
+                                     base + int(self.doc_offsets[doc + 1])])
+
+    def contains(self, hashes: np.ndarray) -> np.ndarray:
+        """
+        Which of the (uint64) URL hashes are in this segment
+        """
+        positions = np.searchsorted(self.url_hashes, hashes)
+        found = positions < len(self.url_hashes)
+        found[found] = self.url_hashes[positions[found]] == hashes[found]
+        return found
+
+    def close(self) -> None:
+        for name, _ in _SECTIONS:
+            setattr(self, name, None)
+        try:
+            self._mmap.close()
+        except BufferError:
+            # A caller still holds a view; the map is released with it
+            pass
+
+
+class _Buffer:
+    """
+    Documents added since the last flush, searchable in memory
+    """
+
+    def __init__(self):
+        self.docs: List[Dict[str, Any]] = []
+        self.hashes: Dict[int, int] = {}
+        self.lengths: List[int] = []
+        self.postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        self.total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    @property
+    def doc_count(self) -> int:
+        return len(self.docs)
+
+    def add(self, doc: Dict[str, Any], hashed: int, terms: Counter) -> None:
+        number = len(self.docs)
+        self.docs.append(doc)
+        self.hashes[hashed] = number
+        length = sum(terms.values())
+        self.lengths.append(length)
+        self.total_length += length
+        postings = self.postings
+        for term, tf in terms.items():
+            posting = postings.get(term)
+            if posting is None:
+                posting = postings[term] = ([], [])
+            posting[0].append(number)
+            posting[1].append(tf)
+
+    def lookup(self, term: str, avgdl: float) -> Optional[Posting]:
+        posting = self.postings.get(term)
+        if posting is None:
+            return None
+        docs = np.array(posting[0], dtype=np.uint32)
+        lengths = np.array(self.lengths, dtype=np.float32)[docs]
+        impacts = bm25_impacts(np.array(posting[1]), lengths, avgdl)
+        return docs, impacts, float(impacts.max())
+
+    def document(self, doc: int) -> Dict[str, Any]:
+        return self.docs[doc]
+
+    def contains(self, hashes: np.ndarray) -> np.ndarray:
+        return np.fromiter((int(h) in self.hashes for h in hashes), dtype=bool, count=len(hashes))
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        terms = sorted(self.postings)
+        blobs = [json.dumps(doc).encode() for doc in self.docs]
+        postings = [self.postings[term] for term in terms]
+        post_docs: List[int] = []
+        post_tfs: List[int] = []
+        for docs, tfs in postings:
+            post_docs.extend(docs)
+            post_tfs.extend(tfs)
+        return {
+            **_term_arrays([term.encode() for term in terms]),
+            "post_offsets": _offsets(len(docs) for docs, _ in postings),
+            "post_docs": np.array(post_docs, dtype=np.uint32),
+            "post_tfs": np.minimum(post_tfs, 0xFFFF).astype(np.uint16),
+            "doc_lengths": np.array(self.lengths, dtype=np.uint32),
+            "doc_offsets": _offsets(len(blob) for blob in blobs),
+            "doc_blob": np.frombuffer(b"".join(blobs), dtype=np.uint8),
+            "url_hashes": np.sort(np.fromiter(self.hashes, dtype=np.uint64)),
+        }
+
+
+def merge_segments(segments: Sequence[Segment], path: str) -> Segment:
+    """
+    Write the union of `segments` as one segment; documents are renumbered
+    by concatenation, so postings stay in ascending document order
+    """
+    term_lists = [segment.terms() for segment in segments]
+    union = sorted(set().union(*term_lists))
+    term_ids = {term: i for i, term in enumerate(union)}
+
+    term_parts, doc_parts, tf_parts = [], [], []
+    blob_parts, blob_offsets = [], []
+    base = 0
+    blob_base = 0
+    for segment, terms in zip(segments, term_lists):
+        mapping = np.fromiter((term_ids[term] for term in terms), dtype=np.uint32, count=len(terms))
+        term_parts.append(np.repeat(mapping, np.diff(segment.post_offsets).astype(np.int64)))
+        doc_parts.append(segment.post_docs + np.uint32(base))
+        tf_parts.append(segment.post_tfs)
+        blob_parts.append(segment.doc_blob)
+        blob_offsets.append(segment.doc_offsets[:-1] + np.uint64(blob_base))
+        base += segment.doc_count
+        blob_base += len(segment.doc_blob)
+
+    term_of_posting = np.concatenate(term_parts)
+    # Stable, so each term's documents keep their (ascending) order
+    order = np.argsort(term_of_posting, kind="stable")
+    arrays = {
+        **_term_arrays([term.encode() for term in union]),
+        "post_offsets": np.concatenate((
+            [0], np.cumsum(np.bincount(term_of_posting, minlength=len(union)))
+        )).astype(np.uint64),
+        "post_docs": np.concatenate(doc_parts)[order],
+        "post_tfs": np.concatenate(tf_parts)[order],
+        "doc_lengths": np.concatenate([segment.doc_lengths for segment in segments]),
+        "doc_offsets": np.concatenate(blob_offsets + [np.array([blob_base], dtype=np.uint64)]),
+        "doc_blob": np.concatenate(blob_parts),
+        "url_hashes": np.sort(np.concatenate([segment.url_hashes for segment in segments])),
+    }
+    write_segment(path, arrays, sum(segment.total_length for segment in segments))
+    return Segment(path)
+
+
+class LocalIndex:
+    """
+    BM25 full-text index over results served before, one document per
+    canonical URL (a URL already indexed is not added again)
+    """
+
+    def __init__(
+        self,
+        directory: str = "",
+        flush_every: int = 1000,
+        flush_interval: float = 30.0,
+        merge_factor: int = 8,
+    ):
+        self.root = directory
+        # This process's shard, claimed when the index is opened
+        self.directory = directory
+        self.shard: Optional[int] = None
+        self._shard_lock: Optional[FileLock] = None
+        # Other shards' directories -> (manifest mtime, their segments)
+        self._peers: Dict[str, Tuple[int, List[Segment]]] = {}
+        self._peers_checked = -math.inf
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.merge_factor = merge_factor
+        self.segments: List[Segment] = []
+        self._buffer = _Buffer()
+        self._flushing: List[_Buffer] = []
+        self._maintenance = asyncio.Lock()
+        self._next_id = 1
+        self._opened = False
+        self._flush_task: Optional["asyncio.Task[None]"] = None
+        self._periodic: Optional["asyncio.Task[None]"] = None
+        self.added = 0
+        self.duplicates = 0
+        self.flushes = 0
+        self.merges = 0
+        self.searches = 0
+
+    @classmethod
+    def from_env(cls) -> "LocalIndex":
+        default_directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "local_index")
+        return cls(
+            directory=os.getenv("LOCAL_INDEX_DIR", default_directory),
+            flush_every=int(os.getenv("LOCAL_INDEX_FLUSH_EVERY", "1000")),
+            flush_interval=float(os.getenv("LOCAL_INDEX_FLUSH_INTERVAL", "30")),
+            merge_factor=int(os.getenv("LOCAL_INDEX_MERGE_FACTOR", "8")),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.root)
+
+    def __len__(self) -> int:
+        return sum(source.doc_count for source in self._sources())
+
+    def _sources(self) -> List[Any]:
+        return self._peer_segments() + self.segments + self._flushing + [self._buffer]
+
+    def _peer_segments(self) -> List[Segment]:
+        if self._opened and time.monotonic() - self._peers_checked >= PEER_REFRESH_INTERVAL:
+            self._peers_checked = time.monotonic()
+            self._refresh_peers()
+        return [segment for _, segments in self._peers.values() for segment in segments]
+
+    def _refresh_peers(self) -> None:
+        """
+        Map the segments other shards' manifests list now, keeping the ones
+        already mapped and closing those merged away
+        """
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if not name.startswith("shard-") or path == self.directory or not os.path.isdir(path):
+                continue
+            modified, segments = self._peers.get(path, (0, []))
+            try:
+                manifest_modified = os.stat(os.path.join(path, MANIFEST)).st_mtime_ns
+                if manifest_modified == modified:
+                    continue
+                with open(os.path.join(path, MANIFEST)) as f:
+                    names = json.load(f)["segments"]
+                current = {segment.name: segment for segment in segments}
+                updated = [current.get(n) or Segment(os.path.join(path, n)) for n in names]
+            except (OSError, ValueError, KeyError) as e:
+                # Mid-merge or not written yet; the next check retries
+                if not isinstance(e, FileNotFoundError):
+                    print(f"Local index shard {name} skipped: {e}")
+                continue
+            for segment in segments:
+                if segment not in updated:
+                    segment.close()
+            self._peers[path] = (manifest_modified, updated)
+
+    def open(self) -> None:
+        """
+        Claim a shard, map the segments listed in its manifest and remove
+        any files left behind by an interrupted flush or merge
+        """
+        if self._shard_lock is None:
+            self.shard, self._shard_lock = claim_slot(self.root, "shard")
+            self.directory = os.path.join(self.root, f"shard-{self.shard}")
+        if not os.path.exists(self.directory) and os.path.exists(os.path.join(self.root, MANIFEST)):
+            # An index written before sharding becomes the first shard claimed
+            os.makedirs(self.directory)
+            for name in sorted(os.listdir(self.root), key=lambda name: name == MANIFEST):
+                if name.startswith("seg-") or name == MANIFEST:
+                    os.replace(os.path.join(self.root, name), os.path.join(self.directory, name))
+        os.makedirs(self.directory, exist_ok=True)
+        manifest_path = os.path.join(self.directory, MANIFEST)
+        names: List[str] = []
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+            names = manifest["segments"]
+            self._next_id = manifest["next_id"]
+        self.segments = [Segment(os.path.join(self.directory, name)) for name in names]
+        for name in os.listdir(self.directory):
+            if name.startswith("seg-") and name not in names:
+                os.remove(os.path.join(self.directory, name))
+        self._opened = True
+
+    async def start(self) -> None:
+        if not self.enabled:
+            return
+        self.open()
+        self._periodic = asyncio.ensure_future(self._flush_periodically())
+
+    async def close(self) -> None:
+        if self._periodic is not None:
+            self._periodic.cancel()
+            self._periodic = None
+        if not self._opened:
+            return
+        await self.flush()
+        for segment in self.segments + self._peer_segments():
+            segment.close()
+        self.segments = []
+        self._peers = {}
+        self._shard_lock.release()
+        self._shard_lock = None
+        self._opened = False
+
+    def _write_manifest(self) -> None:
+        path = os.path.join(self.directory, MANIFEST)
+        with open(path + ".tmp", "w") as f:
+            json.dump({"segments": [s.name for s in self.segments], "next_id": self._next_id}, f)
+        os.replace(path + ".tmp", path)
+
+    def _segment_path(self) -> str:
+        name = f"seg-{self._next_id:08d}.idx"
+        self._next_id += 1
+        return os.path.join(self.directory, name)
+
+    def _seen(self, hashes: np.ndarray) -> np.ndarray:
+        seen = np.zeros(len(hashes), dtype=bool)
+        for source in self._sources():
+            seen |= source.contains(hashes)
+        return seen
+
+    def contains(self, link: str) -> bool:
+        return bool(self._seen(np.array([url_hash(link)], dtype=np.uint64))[0])
+
+    def add(self, docs: Iterable[Dict[str, Any]]) -> int:
+        """
+        Index documents (title, link, snippet, displayed_link) not seen before
+        """
+        docs = list(docs)
+        if not self.enabled or not docs:
+            return 0
+        hashes = np.array([url_hash(doc["link"]) for doc in docs], dtype=np.uint64)
+        added = 0
+        for doc, hashed, seen in zip(docs, hashes.tolist(), self._seen(hashes)):
+            # The buffer is checked again for repeats within this batch
+            if seen or hashed in self._buffer.hashes:
+                self.duplicates += 1
+                continue
+            self._buffer.add(doc, hashed, document_terms(doc))
+            added += 1
+        self.added += added
+
+        if len(self._buffer) >= self.flush_every and (
+            self._flush_task is None or self._flush_task.done()
+        ):
+            self._flush_task = asyncio.ensure_future(self.flush())
+            self._flush_task.add_done_callback(_report_maintenance_failure)
+        return added
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Local index flush error: {e}")
+
+    async def flush(self) -> None:
+        """
+        Write the buffer out as a new segment, then merge if that tipped a
+        size tier over `merge_factor` segments
+        """
+        async with self._maintenance:
+            if not len(self._buffer):
+                return
+            if not self._opened:
+                self.open()
+            buffer = self._buffer
+            self._buffer = _Buffer()
+            self._flushing.append(buffer)
+            try:
+                path = self._segment_path()
+                arrays = buffer.arrays()
+                await asyncio.to_thread(write_segment, path, arrays, buffer.total_length)
+                self.segments = self.segments + [Segment(path)]
+                self._write_manifest()
+            except BaseException:
+                # Keep the documents searchable and retry with the next flush
+                for doc, hashed in zip(buffer.docs, buffer.hashes):
+                    self._buffer.add(doc, hashed, document_terms(doc))
+                raise
+            finally:
+                self._flushing.remove(buffer)
+            self.flushes += 1
+            await self._merge_tiers()
+
+    def _tier(self, segment: Segment) -> int:
+        return int(math.log(max(segment.doc_count / self.flush_every, 1.0), self.merge_factor))
+
+    async def _merge_tiers(self) -> None:
+        while True:
+            tiers: Dict[int, List[Segment]] = {}
+            for segment in self.segments:
+                tiers.setdefault(self._tier(segment), []).append(segment)
+            group = next(
+                (members[:self.merge_factor] for _, members in sorted(tiers.items())
+                 if len(members) >= self.merge_factor),
+                None,
+            )
+            if group is None:
+                return
+
+            merged = await asyncio.to_thread(merge_segments, group, self._segment_path())
+            self.segments = [s for s in self.segments if s not in group] + [merged]
+            self._write_manifest()
+            for segment in group:
+                segment.close()
+                os.remove(segment.path)
+            self.merges += 1
+
+    def search(self, query: str, k: int = 10, offset: int = 0) -> List[Dict[str, Any]]:
+        """
+        Documents `offset` to `offset + k` ranked by BM25 against the query
+        """
+        terms = set(tokenize(query))
+        sources = self._sources()
+        doc_count = sum(source.doc_count for source in sources)
+        if not self.enabled or not terms or not doc_count:
+            return []
+        self.searches += 1
+
+        avgdl = sum(source.total_length for source in sources) / doc_count
+        postings = [{term: source.lookup(term, avgdl) for term in terms} for source in sources]
+        idf = {}
+        for term in terms:
+            df = sum(len(found[term][0]) for found in postings if found[term] is not None)
+            idf[term] = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+
+        needed = offset + k
+        if not self._peers:
+            hits = self._ranked(sources, postings, idf, needed)
+            return [source.document(doc) for _, source, doc in hits[offset:needed]]
+
+        # Two shards can index the same URL before seeing each other's copy,
+        # so the cut is made over distinct URLs: rank more hits by as many
+        # as turned out to be copies until `needed` distinct ones are found
+        # or every match has been ranked
+        fetch = needed
+        while True:
+            hits = self._ranked(sources, postings, idf, fetch)
+            documents: Dict[int, Dict[str, Any]] = {}
+            for _, source, doc in hits:
+                document = source.document(doc)
+                documents.setdefault(url_hash(document["link"]), document)
+            if len(documents) >= needed or len(hits) < fetch:
+                return list(documents.values())[offset:needed]
+            fetch += needed - len(documents)
+
+    def _ranked(self, sources: List[Any], postings: List[Dict[str, Optional[Posting]]],
+                idf: Dict[str, float], needed: int) -> List[Tuple[float, Any, int]]:
+        """
+        The `needed` best (score, source, doc) hits over every source,
+        best first
+        """
+        hits = []
+        threshold = 0.0
+        # Largest sources first, so the best scores found so far can rule
+        # out most of the smaller ones early
+        order = sorted(range(len(sources)), key=lambda i: -sources[i].doc_count)
+        for i in order:
+            matched = [(idf[term], posting) for term, posting in postings[i].items()
+                       if posting is not None]
+            if not matched:
+                continue
+            hits.extend(
+                (score, sources[i], doc)
+                for score, doc in self._top_docs(sources[i], matched, needed, threshold)
+            )
+            if len(hits) >= needed:
+                hits.sort(key=lambda hit: -hit[0])
+                del hits[needed:]
+                threshold = hits[-1][0]
+        hits.sort(key=lambda hit: -hit[0])
+        return hits
+
+    def _top_docs(self, source, matched: List[Tuple[float, Posting]], needed: int,
+                  threshold: float = 0.0) -> List[Tuple[float, int]]:
+        """
+        The `needed` best-scoring documents of one source, among those
+        scoring above `threshold` (the needed-th best score seen so far).
+
+        Terms are scored from the highest upper bound (IDF times the term's
+        highest impact) down. Once the bounds of the terms left add up to
+        no more than the current `needed`-th best score, no unseen document
+        can make the cut, so the remaining (usually very common) terms are
+        only looked up for the candidates that still could, instead of
+        scattered over their whole posting lists (MaxScore).
+        """
+        matched.sort(key=lambda item: -item[0] * item[1][2])
+        bounds = [weight * highest for weight, (_, _, highest) in matched]
+        remaining = [sum(bounds[i:]) for i in range(len(bounds))]
+        if remaining[0] <= threshold:
+            return []
+
+        if len(matched) == 1:
+            weight, (docs, impacts, _) = matched[0]
+            best = np.argpartition(impacts, -needed)[-needed:] if len(docs) > needed else slice(None)
+            return [(float(impact) * weight, int(doc))
+                    for doc, impact in zip(docs[best].tolist(), impacts[best].tolist())]
+
+        scores = np.zeros(source.doc_count, dtype=np.float32)
+        i = 0
+        while i < len(matched):
+            weight, (docs, impacts, _) = matched[i]
+            scores[docs] += np.multiply(impacts, weight, dtype=np.float32)
+            i += 1
+            # The needed-th best score among this term's documents is a
+            # lower bound on the needed-th best overall; skip computing it
+            # while even the best possible score could not end the loop
+            if (i < len(matched) and len(docs) >= needed
+                    and remaining[i] <= sum(bounds[:i])):
+                threshold = max(threshold, np.partition(scores[docs], -needed)[-needed])
+                if remaining[i] <= threshold:
+                    break
+
+        candidates = None
+        if i < len(matched):
+            candidates = np.concatenate([docs for _, (docs, _, _) in matched[:i]])
+            candidates = _distinct(candidates[scores[candidates] + remaining[i] > threshold])
+            # Looking candidates up one by one only pays off when there are
+            # far fewer of them than postings left to scatter
+            if len(candidates) * 4 >= sum(len(docs) for _, (docs, _, _) in matched[i:]):
+                candidates = None
+
+        if candidates is not None:
+            for weight, (docs, impacts, _) in matched[i:]:
+                positions = np.searchsorted(docs, candidates)
+                found = positions < len(docs)
+                found[found] = docs[positions[found]] == candidates[found]
+                scores[candidates[found]] += np.multiply(
+                    impacts[positions[found]], weight, dtype=np.float32
+                )
+        else:
+            for weight, (docs, impacts, _) in matched[i:]:
+                scores[docs] += np.multiply(impacts, weight, dtype=np.float32)
+            if sum(len(docs) for _, (docs, _, _) in matched) * 8 < source.doc_count:
+                candidates = _distinct(np.concatenate([docs for _, (docs, _, _) in matched]))
+            else:
+                candidates = np.flatnonzero(scores)
+        # The threshold may be the needed-th best score itself, so ties stay
+        candidates = candidates[scores[candidates] >= threshold]
+
+        if len(candidates) > needed:
+            candidates = candidates[np.argpartition(-scores[candidates], needed - 1)[:needed]]
+        return [(float(scores[doc]), int(doc)) for doc in candidates]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "documents": len(self),
+            "segments": len(self.segments),
+            "shard": self.shard,
+            "peer_segments": len(self._peer_segments()),
+            "buffered": len(self._buffer),
+            "added": self.added,
+            "duplicates": self.duplicates,
+            "flushes": self.flushes,
+            "merges": self.merges,
+            "searches": self.searches,
+        }
+
+
+def stored_documents(root: str) -> Iterator[Dict[str, Any]]:
+    """
+    Every flushed document of the index under `root`, read from the
+    segments its shards' manifests list without claiming a shard, for
+    offline passes over the stored corpus
+    """
+    shards = sorted(name for name in os.listdir(root) if name.startswith("shard-"))
+    for directory in [root] + [os.path.join(root, name) for name in shards]:
+        manifest_path = os.path.join(directory, MANIFEST)
+        if not os.path.exists(manifest_path):
+            continue
+        with open(manifest_path) as f:
+            names = json.load(f)["segments"]
+        for name in names:
+            try:
+                segment = Segment(os.path.join(directory, name))
+            except FileNotFoundError:
+                # Merged away since the manifest was read
+                continue
+            try:
+                for doc in range(len(segment)):
+                    yield segment.document(doc)
+            finally:
+                segment.close()
+
+
+def _distinct(docs: np.ndarray) -> np.ndarray:
+    # Sorting beats np.unique's hashing for these small integer arrays
+    docs = np.sort(docs)
+    if len(docs):
+        docs = docs[np.append(True, docs[1:] != docs[:-1])]
+    return docs
+
+
+def _report_maintenance_failure(task: "asyncio.Task[None]") -> None:
+    if not task.cancelled() and task.exception() is not None:
+        print(f"Local index flush error: {task.exception()}")
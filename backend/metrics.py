@@ -0,0 +1,489 @@
+"""
+Prometheus-style metrics for the search pipeline.
+
+A minimal in-process registry of counters, gauges and histograms rendered
+in the Prometheus text exposition format at /api/metrics. Stage latencies
+are measured with time.perf_counter and recorded per stage: upstream
+fetch, JSON decode, filtering and serialization.
+
+With several worker processes, each one periodically writes its samples
+to a file in a shared directory and a scrape, whichever worker answers
+it, sums the files of every worker.
+"""
+import abc
+import asyncio
+import json
+import math
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from workers import FileLock, process_alive, state_directory
+
+# Seconds; spans a sub-millisecond filter pass up to a slow upstream call
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric(abc.ABC):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    @abc.abstractmethod
+    def samples(self) -> List[str]:
+        ...
+
+    @abc.abstractmethod
+    def state(self) -> list:
+        """
+        The metric's samples as JSON-serializable data
+        """
+
+    @abc.abstractmethod
+    def absorb(self, state: list) -> None:
+        """
+        Add the samples of another process's state() to this metric's
+        """
+
+    def blank(self) -> "_Metric":
+        return type(self)(self.name, self.documentation, self.labelnames)
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def state(self) -> list:
+        return [[list(key), value] for key, value in self._values.items()]
+
+    def absorb(self, state: list) -> None:
+        for key, value in state:
+            key = tuple(key)
+            self._values[key] = self._values.get(key, 0.0) + value
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in self._values.items()
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: str) -> None:
+        self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> (per-bucket counts, sum, count); counts are not cumulative
+        self._series: Dict[Tuple[str, ...], List] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        counts = series[0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        else:
+            counts[-1] += 1
+        series[1] += value
+        series[2] += 1
+
+    def blank(self) -> "Histogram":
+        return Histogram(self.name, self.documentation, self.labelnames, self.buckets)
+
+    def state(self) -> list:
+        return [[list(key), counts, total, count] for key, (counts, total, count) in self._series.items()]
+
+    def absorb(self, state: list) -> None:
+        for key, counts, total, count in state:
+            series = self._series.setdefault(tuple(key), [[0] * (len(self.buckets) + 1), 0.0, 0])
+            series[0] = [a + b for a, b in zip(series[0], counts)]
+            series[1] += total
+            series[2] += count
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """
+        Observe the wall time of the enclosed block
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self) -> List[str]:
+        lines = []
+        for key, (counts, total, count) in self._series.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames + ("le",), key + (_format_value(bound),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Duplicate metric {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+    def state(self) -> Dict[str, list]:
+        return {name: metric.state() for name, metric in self._metrics.items()}
+
+    def _merge(self, states: Sequence[Tuple[Dict[str, list], bool]]) -> Dict[str, _Metric]:
+        merged = {name: metric.blank() for name, metric in self._metrics.items()}
+        for state, alive in states:
+            for name, samples in state.items():
+                metric = merged.get(name)
+                if metric is not None and (alive or metric.kind != "gauge"):
+                    metric.absorb(samples)
+        return merged
+
+    def merge_states(self, states: Sequence[Tuple[Dict[str, list], bool]]) -> Dict[str, list]:
+        """
+        The sum of several processes' state(), as one state(); gauges of
+        processes no longer alive are left out
+        """
+        return {name: metric.state() for name, metric in self._merge(states).items()}
+
+    def render_merged(self, states: Sequence[Tuple[Dict[str, list], bool]]) -> str:
+        """
+        Render the sum of several processes' state(); gauges of processes
+        no longer alive are left out, counters and histograms are kept
+        """
+        merged = self._merge(states)
+        return "\n".join(metric.render() for metric in merged.values()) + "\n"
+
+
+class MultiProcessMetrics:
+    """
+    Metrics of every worker, exchanged through `<directory>/<pid>.json`
+    files; without a directory only this process's metrics are rendered.
+
+    The files of workers that have exited are folded into one tombstone
+    file, `exited.json`, holding their counters and histograms summed, so
+    totals stay monotonic across worker restarts while the directory
+    keeps one file per live worker. A new worker whose pid was reused
+    folds the old file before writing its own.
+    """
+
+    TOMBSTONE = "exited.json"
+
+    def __init__(self, registry: Registry, directory: str = "", interval: float = 5.0):
+        self.registry = registry
+        self.directory = directory
+        self.interval = interval
+        self._writer: Optional["asyncio.Task[None]"] = None
+
+    @classmethod
+    def from_env(cls, registry: Registry) -> "MultiProcessMetrics":
+        return cls(
+            registry,
+            directory=state_directory("metrics"),
+            interval=float(os.getenv("METRICS_WRITE_INTERVAL", "5")),
+        )
+
+    async def start(self) -> None:
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            with self._locked():
+                # Left by an exited process that had this pid
+                self._fold([f"{os.getpid()}.json"])
+            self.write()
+            self._writer = asyncio.ensure_future(self._write_periodically())
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            self._writer.cancel()
+            self._writer = None
+            self.write()
+
+    def write(self) -> None:
+        path = os.path.join(self.directory, f"{os.getpid()}.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump(self.registry.state(), f)
+        os.replace(path + ".tmp", path)
+
+    async def _write_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.write()
+            except OSError as e:
+                print(f"Metrics write error: {e}")
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        lock = FileLock(os.path.join(self.directory, "metrics.lock"))
+        lock.acquire()
+        try:
+            yield
+        finally:
+            lock.release()
+
+    def _read(self, name: str) -> Optional[Dict[str, list]]:
+        try:
+            with open(os.path.join(self.directory, name)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _fold(self, names: Sequence[str]) -> None:
+        """
+        Add the worker files `names` to the tombstone and remove them;
+        called with the lock held
+        """
+        states = [(state, False) for state in map(self._read, names) if state is not None]
+        if not states:
+            return
+        tombstone = self._read(self.TOMBSTONE)
+        if tombstone is not None:
+            states.append((tombstone, False))
+        path = os.path.join(self.directory, self.TOMBSTONE)
+        with open(path + ".tmp", "w") as f:
+            json.dump(self.registry.merge_states(states), f)
+        os.replace(path + ".tmp", path)
+        for name in names:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+
+    def render(self) -> str:
+        if not self.directory:
+            return self.registry.render()
+        # This worker's own samples are always current
+        self.write()
+        with self._locked():
+            workers = {}
+            for name in os.listdir(self.directory):
+                if name.endswith(".json") and name != self.TOMBSTONE:
+                    workers[name] = process_alive(int(name[:-len(".json")]))
+            self._fold([name for name, alive in workers.items() if not alive])
+            states = [(self._read(self.TOMBSTONE), False)]
+            states.extend((self._read(name), True) for name, alive in workers.items() if alive)
+        return self.registry.render_merged([
+            (state, alive) for state, alive in states if state is not None
+        ])
+
+
+REGISTRY = Registry()
+
+stage_seconds = REGISTRY.register(Histogram(
+    "search_stage_seconds",
+    "Time spent in each stage of the search pipeline",
+    ["stage"],
+))
+request_seconds = REGISTRY.register(Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by handler, until the response body is sent",
+    ["method", "handler", "status"],
+))
+requests_in_flight = REGISTRY.register(Gauge(
+    "http_requests_in_flight",
+    "HTTP requests currently being handled",
+))
+upstream_errors = REGISTRY.register(Counter(
+    "upstream_errors_total",
+    "Failed SerpAPI calls by kind",
+    ["kind"],
+))
+upstream_retries = REGISTRY.register(Counter(
+    "upstream_retries_total",
+    "SerpAPI attempts retried after a failure",
+))
+upstream_rejections = REGISTRY.register(Counter(
+    "upstream_circuit_rejections_total",
+    "SerpAPI calls failed fast because the circuit breaker was open",
+))
+upstream_quota_calls = REGISTRY.register(Counter(
+    "upstream_quota_calls_total",
+    "SerpAPI call attempts through the quota scheduler, by priority and whether "
+    "they went immediately, queued, or were shed",
+    ["priority", "outcome"],
+))
+rate_limited = REGISTRY.register(Counter(
+    "rate_limited_requests_total",
+    "Requests refused because the client ran out of its rate limit",
+    ["policy"],
+))
+provider_requests = REGISTRY.register(Counter(
+    "search_provider_requests_total",
+    "Federated search provider calls by outcome",
+    ["provider", "outcome"],
+))
+provider_seconds = REGISTRY.register(Histogram(
+    "search_provider_duration_seconds",
+    "Time until each federated search provider answered, failed or timed out",
+    ["provider"],
+))
+search_errors = REGISTRY.register(Counter(
+    "search_errors_total",
+    "Searches that failed and returned an error to the client",
+    ["endpoint"],
+))
+results_seen = REGISTRY.register(Counter(
+    "search_results_seen_total",
+    "Raw upstream results run through the AI filter",
+))
+results_filtered_out = REGISTRY.register(Counter(
+    "search_results_filtered_out_total",
+    "Raw upstream results rejected by the AI filter",
+))
+results_collapsed = REGISTRY.register(Counter(
+    "search_results_collapsed_total",
+    "AI results dropped as duplicates of one already on an earlier or the same page",
+    ["kind"],
+))
+cache_lookups = REGISTRY.register(Counter(
+    "search_cache_lookups_total",
+    "Search response lookups by cache tier and outcome",
+    ["tier", "result"],
+))
+responses_encoded = REGISTRY.register(Counter(
+    "search_responses_encoded_total",
+    "Search responses sent by content encoding, or answered 304 Not Modified",
+    ["encoding"],
+))
+response_bytes = REGISTRY.register(Counter(
+    "search_response_bytes_total",
+    "Search response body bytes before (raw) and after (sent) compression",
+    ["kind"],
+))
+events_logged = REGISTRY.register(Counter(
+    "events_logged_total",
+    "Query and click events written to the event log, by type",
+    ["type"],
+))
+events_dropped = REGISTRY.register(Counter(
+    "events_dropped_total",
+    "Events lost because the event log queue was full or a write failed",
+    ["reason"],
+))
+cache_warms = REGISTRY.register(Counter(
+    "search_cache_warms_total",
+    "Hot search cache entries refreshed before expiry from the store or upstream, "
+    "or left to expire over budget or after a failure",
+    ["result"],
+))
+
+requests_in_flight.set(0)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing every HTTP request through to its last body
+    chunk (so streamed responses are timed in full) and counting the
+    requests in flight
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        requests_in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            requests_in_flight.dec()
+            # The router records the matched endpoint in the scope
+            endpoint = scope.get("endpoint")
+            request_seconds.observe(
+                time.perf_counter() - started,
+                method=scope["method"],
+                handler=getattr(endpoint, "__name__", "none"),
+                status=str(status[0]),
+            )
@@ -0,0 +1,269 @@
+"""
+Pagination over filtered upstream results.
+
+SerpAPI pages are fetched without overlap and run through the AI filter;
+whatever passes is appended to a per-query cursor. A page of filtered
+results is served from the cursor once it holds enough of them, fetching
+more upstream pages (several at a time) only when it does not, and the
+next page is prefetched in the background while the current one is served.
+
+Each cursor collapses duplicates as results are appended: the same page
+under another URL form, and near-duplicate copies of a result already
+kept (dedup.py), so they do not take up slots on this or a later page.
+"""
+import asyncio
+import math
+import os
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from cache import ResultCache, normalize_query
+from dedup import DuplicateFilter
+from metrics import results_collapsed
+from ratelimit import background_priority
+
+# fetch_page(query, start) -> (filtered items, number of raw upstream
+# results, whether upstream has results past them)
+FetchPage = Callable[[str, int], Awaitable[Tuple[List[Any], int, bool]]]
+
+
+class QueryCursor:
+    """
+    Filtered results gathered so far for one query, and where to resume
+    """
+
+    def __init__(self, query: str, duplicates: DuplicateFilter):
+        self.query = query
+        self.results: List[Any] = []
+        self.duplicates = duplicates
+        self.next_start = 0
+        self.upstream_pages = 0
+        self.raw_results = 0
+        self.exhausted = False
+        self.lock = asyncio.Lock()
+        self.prefetch: Optional["asyncio.Task[None]"] = None
+        self._changed = asyncio.Event()
+
+    def notify(self) -> None:
+        """
+        Wake everything waiting for new results or exhaustion
+        """
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def changed(self) -> asyncio.Event:
+        return self._changed
+
+    @property
+    def pass_ratio(self) -> Optional[float]:
+        if not self.raw_results:
+            return None
+        return len(self.results) / self.raw_results
+
+
+class Paginator:
+    def __init__(
+        self,
+        fetch_page: FetchPage,
+        page_size: int = 10,
+        upstream_page_size: int = 20,
+        max_upstream_pages: int = 10,
+        max_parallel_fetches: int = 3,
+        cursor_ttl: float = 600.0,
+        max_cursors: int = 1024,
+        key: Callable[[Any], Any] = lambda item: item.link,
+        fingerprint: Optional[Callable[[Any], Optional[int]]] = None,
+        duplicate_distance: Optional[int] = 6,
+        query_key: Callable[[str], Any] = normalize_query,
+    ):
+        self.fetch_page = fetch_page
+        self.page_size = page_size
+        self.upstream_page_size = upstream_page_size
+        self.max_upstream_pages = max_upstream_pages
+        self.max_parallel_fetches = max_parallel_fetches
+        self.key = key
+        # Queries with the same key share a cursor
+        self.query_key = query_key
+        self.fingerprint = fingerprint
+        # None collapses by key only
+        self.duplicate_distance = duplicate_distance if fingerprint is not None else None
+        self.cursors = ResultCache(max_entries=max_cursors, ttl=cursor_ttl)
+        self.prefetches = 0
+        self.collapsed: Dict[str, int] = {"url": 0, "near": 0}
+
+    @classmethod
+    def from_env(cls, fetch_page: FetchPage, **kwargs) -> "Paginator":
+        return cls(
+            fetch_page,
+            max_upstream_pages=int(os.getenv("UPSTREAM_MAX_PAGES", "10")),
+            max_parallel_fetches=int(os.getenv("UPSTREAM_PARALLEL_FETCHES", "3")),
+            cursor_ttl=float(os.getenv("SEARCH_CURSOR_TTL", "600")),
+            duplicate_distance=_optional_int(os.getenv("DEDUP_DISTANCE", "6")),
+            **kwargs,
+        )
+
+    def cursor(self, query: str) -> QueryCursor:
+        key = self.query_key(query)
+        cursor = self.cursors.get(key)
+        if cursor is None:
+            # Bounded by what a cursor can ever fetch
+            duplicates = DuplicateFilter(
+                max_entries=self.max_upstream_pages * self.upstream_page_size,
+                distance=self.duplicate_distance,
+            )
+            cursor = QueryCursor(query, duplicates)
+            self.cursors.set(key, cursor)
+        return cursor
+
+    def forget(self, query: str) -> None:
+        """
+        Drop a query's cursor so its next page is fetched from scratch
+        """
+        self.cursors.delete(self.query_key(query))
+
+    async def get_page(self, query: str, page: int) -> List[Any]:
+        """
+        Filtered results for a 1-based page; short only once upstream runs out
+        """
+        if page < 1:
+            raise ValueError("page must be 1 or greater")
+
+        cursor = self.cursor(query)
+        start = (page - 1) * self.page_size
+        end = start + self.page_size
+        await self._fill(cursor, end)
+        self._prefetch(cursor, end + self.page_size)
+        return cursor.results[start:end]
+
+    def _plan(self, cursor: QueryCursor, needed: int) -> List[int]:
+        """
+        Upstream offsets to fetch next, sized by how many results per
+        upstream page have been passing the filter so far
+        """
+        missing = needed - len(cursor.results)
+        ratio = cursor.pass_ratio
+        per_page = max((ratio if ratio is not None else 0.5) * self.upstream_page_size, 1.0)
+        pages = min(
+            max(math.ceil(missing / per_page), 1),
+            self.max_parallel_fetches,
+            self.max_upstream_pages - cursor.upstream_pages,
+        )
+        return [
+            cursor.next_start + i * self.upstream_page_size for i in range(pages)
+        ]
+
+    async def iter_page(self, query: str, page: int) -> AsyncIterator[Any]:
+        """
+        Same results as get_page, yielded as soon as each one is available
+        """
+        if page < 1:
+            raise ValueError("page must be 1 or greater")
+
+        cursor = self.cursor(query)
+        start = (page - 1) * self.page_size
+        end = start + self.page_size
+        fill = asyncio.ensure_future(self._fill(cursor, end))
+        try:
+            sent = start
+            while True:
+                changed = cursor.changed()
+                while sent < min(end, len(cursor.results)):
+                    yield cursor.results[sent]
+                    sent += 1
+                if sent >= end:
+                    break
+                if fill.done():
+                    fill.result()
+                    if sent >= min(end, len(cursor.results)):
+                        break
+                    continue
+                await asyncio.wait(
+                    {fill, asyncio.ensure_future(changed.wait())},
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+        finally:
+            # An abandoned stream leaves the shared fill running for others
+            if fill.done() and not fill.cancelled():
+                fill.exception()
+        self._prefetch(cursor, end + self.page_size)
+
+    async def _fill(self, cursor: QueryCursor, needed: int) -> None:
+        async with cursor.lock:
+            try:
+                while len(cursor.results) < needed and not cursor.exhausted:
+                    await self._fill_round(cursor, needed)
+            finally:
+                cursor.notify()
+
+    async def _fill_round(self, cursor: QueryCursor, needed: int) -> None:
+        starts = self._plan(cursor, needed)
+        tasks = [
+            asyncio.ensure_future(self.fetch_page(cursor.query, start))
+            for start in starts
+        ]
+        try:
+            # Append in upstream order so ranking is preserved, each page
+            # as soon as the ones before it are in
+            for start, task in zip(starts, tasks):
+                items, raw_count, more = await task
+                cursor.upstream_pages += 1
+                cursor.raw_results += raw_count
+                cursor.next_start = start + self.upstream_page_size
+                for item in items:
+                    if not self._duplicate(cursor, item):
+                        cursor.results.append(item)
+                # Upstream pages often come back short mid-way, so only
+                # an empty page or the end of upstream paging ends the query
+                if not raw_count or not more:
+                    cursor.exhausted = True
+                    break
+                cursor.notify()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled():
+                    # Retrieve errors from pages that were never awaited
+                    task.exception()
+
+        if cursor.upstream_pages >= self.max_upstream_pages:
+            cursor.exhausted = True
+
+    def _duplicate(self, cursor: QueryCursor, item: Any) -> bool:
+        fingerprint = None
+        if cursor.duplicates.fingerprints is not None:
+            fingerprint = self.fingerprint(item)
+        kind = cursor.duplicates.check(self.key(item), fingerprint)
+        if kind is None:
+            return False
+        self.collapsed[kind] += 1
+        results_collapsed.inc(kind=kind)
+        return True
+
+    def _prefetch(self, cursor: QueryCursor, needed: int) -> None:
+        if cursor.exhausted or len(cursor.results) >= needed:
+            return
+        if cursor.prefetch is not None and not cursor.prefetch.done():
+            return
+
+        self.prefetches += 1
+        # Speculative, so its upstream calls yield to searches users wait on
+        cursor.prefetch = asyncio.ensure_future(background_priority(self._fill)(cursor, needed))
+        cursor.prefetch.add_done_callback(_report_prefetch_failure)
+
+    def stats(self):
+        return {
+            "cursors": len(self.cursors),
+            "prefetches": self.prefetches,
+            "duplicate_distance": self.duplicate_distance,
+            "collapsed": dict(self.collapsed),
+        }
+
+
+def _optional_int(value: str) -> Optional[int]:
+    # An empty setting turns the feature off
+    return int(value) if value.strip() else None
+
+
+def _report_prefetch_failure(task: "asyncio.Task[None]") -> None:
+    if not task.cancelled() and task.exception() is not None:
+        print(f"Prefetch error: {task.exception()}")
@@ -0,0 +1,454 @@
+"""
+Federated search across pluggable result providers.
+
+A query fans out concurrently to every configured provider, each under its
+own timeout. Providers that fail or miss their deadline are left out, so
+the response is built from whichever ones answered in time and the
+slowest provider never sets the response time. The ranked lists that come
+back are deduplicated by canonical URL and merged with reciprocal-rank
+fusion.
+"""
+import abc
+import asyncio
+import os
+import time
+import xml.etree.ElementTree as ET
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import httpx
+
+from metrics import provider_requests, provider_seconds
+from upstream import SerpAPIClient, UpstreamError
+
+# Raw result as every provider returns it: title, link, snippet, displayed_link
+RawResult = Dict[str, str]
+
+# A provider's results for one page window, and whether it has more after them
+ProviderPage = Tuple[List[RawResult], bool]
+
+# Conventional RRF constant; damps the weight of the very top ranks
+RRF_K = 60
+
+# Query parameters set by known ad and analytics trackers (besides utm_*).
+# Generic names like "ref" or "source" are kept: sites use them to pick
+# what the page shows (a branch, a tab), so they can tell pages apart
+TRACKING_PARAMS = frozenset({
+    "gclid", "gbraid", "wbraid", "dclid", "fbclid", "msclkid", "yclid", "twclid",
+    "ttclid", "li_fat_id", "igshid", "mc_cid", "mc_eid", "_hsenc", "_hsmi",
+    "mkt_tok", "_ga", "_gl", "ref_src",
+})
+
+# Host prefixes of mobile and AMP editions of a site
+EDITION_PREFIXES = ("www.", "m.", "mobile.", "amp.")
+
+# Path endings that serve the same page as the path without them
+EDITION_SUFFIXES = ("/amp", "/index.html", "/index.htm", "/index.php")
+
+# Offset and page-size parameter names per SerpAPI engine
+SERPAPI_PAGING = {
+    "google": ("start", "num"),
+    "google_scholar": ("start", "num"),
+    "bing": ("first", "count"),
+}
+
+
+def canonical_url(url: str) -> str:
+    """
+    Normalized form of a URL, equal for links that point at the same page:
+    lowercased scheme and host without "www." or a mobile or AMP prefix,
+    no fragment, no default port, no AMP or index-file ending, no trailing
+    slash, tracking parameters dropped and the rest sorted. A link that
+    does not parse (a bad port or IPv6 host) is only stripped.
+    """
+    try:
+        parts = urlsplit(url.strip())
+        port = parts.port
+    except ValueError:
+        return url.strip()
+    scheme = parts.scheme.lower()
+    if scheme == "http":
+        scheme = "https"
+    host = parts.hostname or ""
+    for prefix in EDITION_PREFIXES:
+        if host.startswith(prefix) and host.count(".") > 1:
+            host = host[len(prefix):]
+            break
+    if port and port not in (80, 443):
+        host = f"{host}:{port}"
+    query = ""
+    if parts.query:
+        query = urlencode(sorted(
+            (name, value)
+            for name, value in parse_qsl(parts.query, keep_blank_values=True)
+            if not name.startswith("utm_") and name not in TRACKING_PARAMS
+        ))
+    path = parts.path.rstrip("/")
+    for suffix in EDITION_SUFFIXES:
+        if path.lower().endswith(suffix):
+            path = path[:-len(suffix)].rstrip("/")
+            break
+    return urlunsplit((scheme, host, path, query, ""))
+
+
+class ProviderError(UpstreamError):
+    """
+    Raised when a provider cannot answer a query
+    """
+
+
+class SearchProvider(abc.ABC):
+    """
+    One source of ranked results.
+
+    Subclasses implement `search`, returning raw results in rank order for
+    the `num` results starting at the 0-based offset `start`, and whether
+    there are more results past them. A short page is not the last one by
+    itself: engines often return fewer than `num` results mid-way.
+    """
+
+    name = "provider"
+
+    def __init__(self, timeout: float = 10.0):
+        self.timeout = timeout
+
+    @abc.abstractmethod
+    async def search(self, query: str, start: int, num: int) -> ProviderPage:
+        ...
+
+    async def start(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+
+class SerpAPIProvider(SearchProvider):
+    """
+    A SerpAPI engine, called through the shared pooled SerpAPI client
+    """
+
+    def __init__(
+        self,
+        client: SerpAPIClient,
+        engine: str = "google",
+        rewrite_query: Callable[[str], str] = lambda query: query,
+        timeout: float = 10.0,
+    ):
+        super().__init__(timeout)
+        self.client = client
+        self.engine = engine
+        self.name = engine
+        # Web search engines take the query steered towards AI results
+        self.rewrite_query = rewrite_query
+
+    async def search(self, query: str, start: int, num: int) -> ProviderPage:
+        serpapi_key = os.getenv("SERPAPI_KEY")
+        if not serpapi_key:
+            raise ProviderError("SerpAPI key not configured")
+
+        offset_param, size_param = SERPAPI_PAGING.get(self.engine, ("start", "num"))
+        params = {
+            "engine": self.engine,
+            "q": self.rewrite_query(query),
+            size_param: num,
+            offset_param: start,
+            "api_key": serpapi_key,
+            "gl": "us",
+            "hl": "en"
+        }
+        results = await self.client.search(params)
+
+        if "error" in results:
+            raise ProviderError(f"Search API error: {results['error']}")
+        organic = [
+            {
+                "title": result.get("title", ""),
+                "link": result.get("link", ""),
+                "snippet": result.get("snippet", ""),
+                "displayed_link": result.get("displayed_link", result.get("link", "")),
+            }
+            for result in results.get("organic_results", [])
+        ]
+        # SerpAPI links the next page for as long as the engine has one
+        more = bool(organic) and "next" in (results.get("serpapi_pagination") or {})
+        return organic, more
+
+
+class HTTPProvider(SearchProvider):
+    """
+    Provider with its own pooled HTTP client for a public search API
+    """
+
+    def __init__(self, base_url: str, timeout: float = 10.0):
+        super().__init__(timeout)
+        self.base_url = base_url
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(timeout=self.timeout, headers=self.headers())
+        return self._client
+
+    def headers(self) -> Dict[str, str]:
+        return {}
+
+    async def get(self, params: Dict[str, Any]) -> httpx.Response:
+        try:
+            response = await self.client.get(self.base_url, params=params)
+        except httpx.HTTPError as e:
+            raise ProviderError(f"{self.name} request failed: {e}") from e
+        if response.status_code != 200:
+            raise ProviderError(f"{self.name} returned HTTP {response.status_code}")
+        return response
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+
+
+class GitHubProvider(HTTPProvider):
+    """
+    Repositories from the GitHub search API
+    """
+
+    name = "github"
+
+    def __init__(self, base_url: str = "https://api.github.com/search/repositories",
+                 token: Optional[str] = None, timeout: float = 10.0):
+        super().__init__(base_url, timeout)
+        self.token = token
+
+    def headers(self) -> Dict[str, str]:
+        headers = {"Accept": "application/vnd.github+json"}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        return headers
+
+    # The search API serves the first 1000 results of a query at most
+    MAX_RESULTS = 1000
+
+    async def search(self, query: str, start: int, num: int) -> ProviderPage:
+        # The API pages by page number, so `start` is rounded down to a page
+        page = start // num + 1
+        response = await self.get({"q": query, "per_page": num, "page": page})
+        payload = response.json()
+        items = payload.get("items", [])
+        total = min(payload.get("total_count", 0), self.MAX_RESULTS)
+        results = [
+            {
+                "title": item.get("full_name", ""),
+                "link": item.get("html_url", ""),
+                "snippet": item.get("description") or "",
+                "displayed_link": f"github.com/{item.get('full_name', '')}",
+            }
+            for item in items
+        ]
+        return results, bool(items) and page * num < total
+
+
+class ArxivProvider(HTTPProvider):
+    """
+    Papers from the arXiv export API (an Atom feed)
+    """
+
+    name = "arxiv"
+    ATOM = "{http://www.w3.org/2005/Atom}"
+    OPENSEARCH = "{http://a9.com/-/spec/opensearch/1.1/}"
+
+    def __init__(self, base_url: str = "https://export.arxiv.org/api/query",
+                 timeout: float = 10.0):
+        super().__init__(base_url, timeout)
+
+    async def search(self, query: str, start: int, num: int) -> ProviderPage:
+        response = await self.get({
+            "search_query": f"all:{query}",
+            "start": start,
+            "max_results": num,
+        })
+        try:
+            feed = ET.fromstring(response.content)
+        except ET.ParseError as e:
+            raise ProviderError(f"arxiv returned an unreadable feed: {e}") from e
+
+        results = []
+        for entry in feed.iter(f"{self.ATOM}entry"):
+            link = (entry.findtext(f"{self.ATOM}id") or "").strip()
+            results.append({
+                "title": " ".join((entry.findtext(f"{self.ATOM}title") or "").split()),
+                "link": link,
+                "snippet": " ".join((entry.findtext(f"{self.ATOM}summary") or "").split()),
+                "displayed_link": link.split("://", 1)[-1],
+            })
+        try:
+            total = int(feed.findtext(f"{self.OPENSEARCH}totalResults") or "")
+        except ValueError:
+            # No total in the feed: only a full page suggests there is more
+            return results, len(results) == num
+        return results, bool(results) and start + len(results) < total
+
+
+class LocalIndexProvider(SearchProvider):
+    """
+    Results served before, from the local full-text index
+    """
+
+    name = "local"
+
+    def __init__(self, index: Any, timeout: float = 10.0):
+        super().__init__(timeout)
+        self.index = index
+
+    async def search(self, query: str, start: int, num: int) -> ProviderPage:
+        hits = self.index.search(query, k=num, offset=start)
+        return hits, len(hits) == num
+
+
+def reciprocal_rank_fusion(
+    ranked_lists: Sequence[List[RawResult]], k: int = RRF_K
+) -> List[RawResult]:
+    """
+    Merge ranked lists into one, deduplicated by canonical URL.
+
+    A result scores the sum of 1 / (k + rank) over every list it appears
+    in, so results several providers agree on rise to the top. The copy
+    from the list ranking it highest is kept, with a missing snippet filled
+    in from the others. Ties keep the order of the lists.
+    """
+    merged: Dict[str, List[Any]] = {}
+    for list_index, results in enumerate(ranked_lists):
+        for rank, result in enumerate(results, start=1):
+            if not result.get("link"):
+                continue
+            key = canonical_url(result["link"])
+            score = 1.0 / (k + rank)
+            entry = merged.get(key)
+            if entry is None:
+                merged[key] = [score, (rank, list_index), dict(result)]
+                continue
+            entry[0] += score
+            if (rank, list_index) < entry[1]:
+                snippet = entry[2].get("snippet")
+                entry[1] = (rank, list_index)
+                entry[2] = dict(result)
+                if not entry[2].get("snippet") and snippet:
+                    entry[2]["snippet"] = snippet
+            elif not entry[2].get("snippet") and result.get("snippet"):
+                entry[2]["snippet"] = result["snippet"]
+
+    ordered = sorted(merged.values(), key=lambda entry: (-entry[0], entry[1]))
+    return [entry[2] for entry in ordered]
+
+
+class FederatedSearch:
+    """
+    Fans a query out to every provider and fuses what comes back in time
+    """
+
+    def __init__(self, providers: Sequence[SearchProvider], rrf_k: int = RRF_K):
+        if not providers:
+            raise ValueError("at least one search provider is required")
+        self.providers = list(providers)
+        self.rrf_k = rrf_k
+        self.searches = 0
+        self.partial = 0
+
+    @classmethod
+    def from_env(cls, serpapi_client: SerpAPIClient,
+                 rewrite_query: Callable[[str], str] = lambda query: query,
+                 local_index: Any = None) -> "FederatedSearch":
+        """
+        Providers named in SEARCH_PROVIDERS (comma-separated SerpAPI engines,
+        "github", "arxiv" or "local"), each timed out after
+        SEARCH_PROVIDER_TIMEOUT seconds unless SEARCH_PROVIDER_TIMEOUT_<NAME>
+        overrides it
+        """
+        default_timeout = float(os.getenv("SEARCH_PROVIDER_TIMEOUT", "10"))
+        providers = []
+        for name in os.getenv("SEARCH_PROVIDERS", "google").split(","):
+            name = name.strip().lower()
+            if not name:
+                continue
+            timeout = float(os.getenv(f"SEARCH_PROVIDER_TIMEOUT_{name.upper()}", default_timeout))
+            if name == "github":
+                providers.append(GitHubProvider(token=os.getenv("GITHUB_TOKEN"), timeout=timeout))
+            elif name == "arxiv":
+                providers.append(ArxivProvider(timeout=timeout))
+            elif name == "local":
+                if local_index is None:
+                    raise ValueError("the local search provider needs a local index")
+                providers.append(LocalIndexProvider(local_index, timeout=timeout))
+            else:
+                providers.append(SerpAPIProvider(
+                    serpapi_client, engine=name, rewrite_query=rewrite_query, timeout=timeout
+                ))
+        return cls(providers)
+
+    async def start(self) -> None:
+        for provider in self.providers:
+            await provider.start()
+
+    async def close(self) -> None:
+        for provider in self.providers:
+            await provider.close()
+
+    async def _call(self, provider: SearchProvider, query: str, start: int,
+                    num: int) -> ProviderPage:
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            results = await asyncio.wait_for(provider.search(query, start, num), provider.timeout)
+            outcome = "ok"
+            return results
+        except asyncio.TimeoutError:
+            outcome = "timeout"
+            raise UpstreamError(f"{provider.name} timed out after {provider.timeout:g}s")
+        finally:
+            provider_seconds.observe(time.perf_counter() - started, provider=provider.name)
+            provider_requests.inc(provider=provider.name, outcome=outcome)
+
+    async def search(self, query: str, start: int, num: int) -> Tuple[List[RawResult], int, bool]:
+        """
+        Fused results for one page window, the size of the longest list a
+        provider returned, and whether any provider that answered has more.
+
+        Raises the first provider's error only if no provider answered.
+        """
+        self.searches += 1
+        outcomes = await asyncio.gather(
+            *(self._call(provider, query, start, num) for provider in self.providers),
+            return_exceptions=True,
+        )
+
+        ranked_lists = []
+        more = False
+        errors = []
+        for provider, outcome in zip(self.providers, outcomes):
+            if isinstance(outcome, BaseException):
+                errors.append(outcome)
+                if len(self.providers) > 1:
+                    print(f"Provider {provider.name} left out: {outcome}")
+            else:
+                results, provider_more = outcome
+                ranked_lists.append(results)
+                more = more or provider_more
+
+        if not ranked_lists:
+            raise errors[0]
+        if errors:
+            self.partial += 1
+
+        if len(ranked_lists) == 1:
+            # Nothing to fuse with; keep the provider's order and duplicates
+            # go to the paginator's own dedupe
+            return ranked_lists[0], len(ranked_lists[0]), more
+        fused = reciprocal_rank_fusion(ranked_lists, self.rrf_k)
+        return fused, max(len(results) for results in ranked_lists), more
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "providers": {provider.name: {"timeout": provider.timeout} for provider in self.providers},
+            "searches": self.searches,
+            "partial": self.partial,
+        }
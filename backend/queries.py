@@ -0,0 +1,210 @@
+"""
+Query normalization and rewriting.
+
+A query is lowercased and split into tokens, repeated tokens are dropped
+and synonyms are replaced by one canonical form ("chat gpt", "gpt" and
+"chatgpt" all become "chatgpt"). Tokens are Unicode words, so "générative"
+stays whole, and keep what makes a search different: "c++" and "c#" are
+not "c", a quoted phrase is one token, and "-tensorflow" (an exclusion)
+is not "tensorflow". That gives two things:
+
+- the key the search cache, the result store and the pagination cursors
+  share: the canonical tokens sorted, so case, spacing, repetition, word
+  order and synonyms no longer split one search across several cache
+  entries and upstream calls
+- whether the query carries an AI term of its own. The text sent upstream
+  is the query as typed, only normalized for case and spacing, with the
+  AI steering suffix appended when it does not: the suffix adds nothing
+  to "openai api pricing" and crowds out the words that matter
+
+Rewrites are memoized in a bounded LRU, since the same queries repeat.
+"""
+import os
+import re
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional, Pattern, Tuple
+
+from cache import normalize_query
+from relevance import keyword_matcher
+
+# A quoted phrase, or a word keeping the joiners inside names like gpt-4,
+# node.js and site:openai.com and a trailing + or # (c++, c#); either may
+# be excluded with a leading -
+_TOKEN = re.compile(r'-?"[^"]*"|-?\w+(?:[-.:/]\w+)*[+#]*')
+
+# Phrase -> canonical form; phrases are matched on whole tokens, longest first
+SYNONYMS = {
+    "chatgpt": "chatgpt",
+    "chat gpt": "chatgpt",
+    "chat-gpt": "chatgpt",
+    "gpt": "chatgpt",
+    "open ai": "openai",
+    "a.i": "ai",
+    "artificial intelligence": "ai",
+    "ml": "machine learning",
+    "llms": "llm",
+    "large language model": "llm",
+    "large language models": "llm",
+    "genai": "generative ai",
+    "gen ai": "generative ai",
+    "dalle": "dall-e",
+    "dall e": "dall-e",
+    "mid journey": "midjourney",
+    "huggingface": "hugging face",
+    "stable-diffusion": "stable diffusion",
+}
+
+# "artificial intelligence" is an AI keyword, and is rewritten to "ai",
+# which is too short to be one
+AI_TOKENS = frozenset({"ai"})
+
+DEFAULT_SUFFIX = "AI artificial intelligence machine learning"
+
+
+class Rewrite(NamedTuple):
+    text: str
+    key: str
+    has_ai_terms: bool
+
+
+class QueryRewriter:
+    """
+    Rewrites of queries into canonical text and a shared key, memoized
+    for the `max_memo` most recently rewritten queries
+    """
+
+    def __init__(
+        self,
+        synonyms: Optional[Dict[str, str]] = None,
+        suffix: str = DEFAULT_SUFFIX,
+        max_memo: int = 10_000,
+    ):
+        synonyms = SYNONYMS if synonyms is None else synonyms
+        # Token tuple -> canonical tokens
+        self._synonyms: Dict[Tuple[str, ...], List[str]] = {
+            tuple(_TOKEN.findall(phrase)): _TOKEN.findall(canonical)
+            for phrase, canonical in synonyms.items()
+        }
+        self._longest = max((len(phrase) for phrase in self._synonyms), default=1)
+        self.suffix = suffix
+        self.max_memo = max(1, max_memo)
+        self._memo: "OrderedDict[str, Rewrite]" = OrderedDict()
+        # Keyword pattern id -> whole-token regex, compiled on first use
+        self._whole: Dict[int, Pattern] = {}
+        self.hits = 0
+        self.misses = 0
+        self.suffixed = 0
+
+    @classmethod
+    def from_env(cls) -> "QueryRewriter":
+        return cls(
+            suffix=os.getenv("QUERY_SUFFIX", DEFAULT_SUFFIX),
+            max_memo=int(os.getenv("QUERY_REWRITE_MEMO", "10000")),
+        )
+
+    def tokens(self, query: str) -> List[str]:
+        """
+        Canonical tokens of a query in order, each once. Synonyms apply
+        to plain words, not to quoted phrases or exclusions.
+        """
+        raw = [_phrase(token) if '"' in token else token for token in _TOKEN.findall(query.lower())]
+        raw = [token for token in raw if token]
+        canonical: List[str] = []
+        i = 0
+        while i < len(raw):
+            for length in range(min(self._longest, len(raw) - i), 0, -1):
+                replacement = self._synonyms.get(tuple(raw[i:i + length]))
+                if replacement is not None:
+                    canonical.extend(replacement)
+                    i += length
+                    break
+            else:
+                canonical.append(raw[i])
+                i += 1
+        return list(dict.fromkeys(canonical))
+
+    def _has_ai_terms(self, tokens: List[str]) -> bool:
+        """
+        Whether the query names an AI keyword as whole words. The keyword
+        matcher finds keywords inside tokens too ("gan" in "organic"),
+        which is right for result text but would drop the suffix from
+        plenty of queries that have nothing to do with AI. Excluded terms
+        do not count.
+        """
+        tokens = [token.strip('"') for token in tokens if not token.startswith("-")]
+        if AI_TOKENS.intersection(tokens):
+            return True
+        text = " ".join(tokens)
+        for pattern_id in keyword_matcher.matches(text):
+            whole = self._whole.get(pattern_id)
+            if whole is None:
+                pattern = re.escape(keyword_matcher.patterns[pattern_id])
+                whole = self._whole[pattern_id] = re.compile(
+                    rf"(?<!\w){pattern}s?(?!\w)"
+                )
+            if whole.search(text):
+                return True
+        return False
+
+    def rewrite(self, query: str) -> Rewrite:
+        rewrite = self._memo.get(query)
+        if rewrite is not None:
+            self._memo.move_to_end(query)
+            self.hits += 1
+            return rewrite
+
+        self.misses += 1
+        text = normalize_query(query)
+        tokens = self.tokens(query)
+        if tokens:
+            rewrite = Rewrite(text, " ".join(sorted(tokens)), self._has_ai_terms(tokens))
+        else:
+            # Nothing but punctuation: keep it as typed rather than share
+            # one empty key with every other such query
+            rewrite = Rewrite(text, text, False)
+
+        self._memo[query] = rewrite
+        if len(self._memo) > self.max_memo:
+            self._memo.popitem(last=False)
+        return rewrite
+
+    def key(self, query: str) -> str:
+        return self.rewrite(query).key
+
+    def upstream_query(self, query: str) -> str:
+        """
+        The query as sent to a web search engine: the user's own words,
+        not the canonical form the key is built from
+        """
+        rewrite = self.rewrite(query)
+        if rewrite.has_ai_terms or not self.suffix:
+            return rewrite.text
+        self.suffixed += 1
+        return f"{rewrite.text} {self.suffix}"
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "memo_entries": len(self._memo),
+            "max_memo": self.max_memo,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "suffixed": self.suffixed,
+        }
+
+
+def _phrase(token: str) -> str:
+    """
+    A quoted phrase with its words' spacing and punctuation normalized
+    """
+    prefix, _, inner = token.partition('"')
+    words = _TOKEN.findall(inner.rstrip('"'))
+    return f'{prefix}"{" ".join(words)}"' if words else ""
+
+
+query_rewriter = QueryRewriter.from_env()
+
+
+def search_cache_key(query: str, page: int) -> Tuple[str, int]:
+    return (query_rewriter.key(query), page)
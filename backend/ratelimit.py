@@ -0,0 +1,640 @@
+"""
+Per-client rate limits and the upstream quota scheduler.
+
+Searches can spend paid SerpAPI quota, so two limits apply:
+
+- ClientRateLimiter gives each client (a recognised API key, otherwise its
+  IP address) a token bucket per policy: searches, bulk searches,
+  suggestions and click events. A request that finds its bucket empty is
+  refused with RateLimitedError, carrying how long until a token is back.
+  Buckets are shared by every worker process through a memory-mapped
+  table under WORKER_STATE_DIR, so the limits hold per client however
+  many workers serve it, or by every instance through Mongo
+  (RATE_LIMIT_STORE=mongo), which falls back to the shared table while
+  it is failing. Without WORKER_STATE_DIR (a single process), or with
+  RATE_LIMIT_STORE=memory, each process keeps its own.
+
+- QuotaScheduler spaces all upstream calls to a global rate. Calls that
+  arrive faster queue by priority: interactive searches, which a user is
+  waiting on, go ahead of background refreshes. A call that would wait
+  longer than its priority allows, or finds the queue full, is shed with
+  QuotaExceededError. That is a CircuitOpenError, so callers fail over
+  exactly as they do for an open circuit. Under WORKER_STATE_DIR the
+  quota's bucket is in the shared table too, so UPSTREAM_QUOTA_RATE is
+  the rate of the whole server, not of each worker; each worker queues
+  its own calls for it.
+"""
+import asyncio
+import contextvars
+import functools
+import hashlib
+import heapq
+import itertools
+import mmap
+import os
+import struct
+import time
+from contextlib import contextmanager
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from lazy import LazyModule
+from metrics import rate_limited, upstream_quota_calls
+from resilience import CircuitOpenError
+from workers import FileLock, state_directory
+
+# The driver is imported on first use, as in store.py
+motor_asyncio = LazyModule("motor.motor_asyncio")
+pymongo = LazyModule("pymongo")
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+
+# Priority of the upstream calls made from the current task
+upstream_priority: contextvars.ContextVar[str] = contextvars.ContextVar(
+    "upstream_priority", default=INTERACTIVE
+)
+
+
+def background_priority(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Run a coroutine function's upstream calls, and those of tasks it
+    starts, at background priority
+    """
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        token = upstream_priority.set(BACKGROUND)
+        try:
+            return await fn(*args, **kwargs)
+        finally:
+            upstream_priority.reset(token)
+    return wrapper
+
+
+class RateLimitedError(Exception):
+    """
+    Raised when a client has used up its requests under a policy
+    """
+
+    def __init__(self, policy: str, retry_after: float):
+        super().__init__(f"Rate limit for {policy} exceeded, retry in {retry_after:.0f}s")
+        self.policy = policy
+        self.retry_after = retry_after
+
+
+class QuotaExceededError(CircuitOpenError):
+    """
+    Raised instead of queueing an upstream call past its wait limit
+    """
+
+    def __init__(self, retry_after: float):
+        super().__init__(retry_after)
+        self.args = (f"Upstream quota used up, retry in {retry_after:.0f}s",)
+
+
+def refill(tokens: float, elapsed: float, rate: float, burst: float) -> float:
+    return min(burst, tokens + max(0.0, elapsed) * rate)
+
+
+class MemoryBucketStore:
+    """
+    Token buckets in this process, forgetting the least recently used
+    client past `max_keys`
+    """
+
+    def __init__(self, max_keys: int = 100_000, clock: Callable[[], float] = time.monotonic):
+        self.max_keys = max_keys
+        self.clock = clock
+        # key -> (tokens, updated), least recently used first
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    async def start(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    async def take(self, key: str, rate: float, burst: float, cost: float = 1.0) -> Tuple[bool, float]:
+        """
+        Whether `key` may spend `cost` tokens now, and if not, the seconds
+        until it may
+        """
+        now = self.clock()
+        tokens, updated = self._buckets.pop(key, (burst, now))
+        tokens = refill(tokens, now - updated, rate, burst)
+        allowed = tokens >= cost
+        if allowed:
+            tokens -= cost
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return allowed, 0.0 if allowed else (cost - tokens) / rate
+
+    def stats(self) -> Dict[str, Any]:
+        return {"store": "memory", "clients": len(self._buckets)}
+
+
+class FileBucketStore:
+    """
+    Token buckets shared by the worker processes: a fixed table of (key
+    hash, tokens, updated) slots in a memory-mapped file, read and updated
+    under a file lock.
+
+    A key's bucket is in one of `probes` consecutive slots from its hash.
+    When none of them is its own or free, the one updated longest ago is
+    reused: an idle bucket has mostly refilled, so forgetting it changes
+    little.
+    """
+
+    SLOT = struct.Struct("<Qdd")
+
+    def __init__(self, directory: str, slots: int = 65536, probes: int = 8,
+                 clock: Callable[[], float] = time.time):
+        self.directory = directory
+        self.slots = max(1, slots)
+        self.probes = max(1, min(probes, self.slots))
+        # Wall-clock time, the one clock every process reads alike
+        self.clock = clock
+        self._mmap: Optional[mmap.mmap] = None
+        self.evictions = 0
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        # A new lock each time: an open file inherited across a fork would
+        # be one lock shared by parent and child
+        lock = FileLock(os.path.join(self.directory, "buckets.lock"))
+        lock.acquire()
+        try:
+            yield
+        finally:
+            lock.release()
+
+    def _table(self) -> mmap.mmap:
+        """
+        The shared table, created zeroed (every slot free) by the first
+        process to open it
+        """
+        if self._mmap is None:
+            size = self.slots * self.SLOT.size
+            fd = os.open(os.path.join(self.directory, "buckets"), os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                if os.fstat(fd).st_size != size:
+                    # New, or laid out for another slot count
+                    os.ftruncate(fd, 0)
+                    os.ftruncate(fd, size)
+                self._mmap = mmap.mmap(fd, size)
+            finally:
+                os.close(fd)
+        return self._mmap
+
+    async def start(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        with self._locked():
+            self._table()
+
+    async def close(self) -> None:
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def spend(self, key: str, rate: float, burst: float, cost: float = 1.0) -> Tuple[bool, float]:
+        """
+        Spend `cost` of `key`'s tokens if it has that many; whether it
+        did, and the tokens left. A cost of 0 reads the bucket.
+        """
+        hashed = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little") or 1
+        slot_size = self.SLOT.size
+        if self._mmap is None:
+            os.makedirs(self.directory, exist_ok=True)
+        with self._locked():
+            table = self._table()
+            now = self.clock()
+            found = None
+            oldest = None
+            for probe in range(self.probes):
+                offset = (hashed + probe) % self.slots * slot_size
+                owner, tokens, updated = self.SLOT.unpack_from(table, offset)
+                # Slots are never freed, so a free one ends the key's run
+                if owner in (hashed, 0):
+                    found = offset
+                    break
+                if oldest is None or updated < oldest[1]:
+                    oldest = (offset, updated)
+            if found is None:
+                found = oldest[0]
+                owner = 0
+                self.evictions += 1
+            if owner != hashed:
+                tokens, updated = burst, now
+            tokens = refill(tokens, now - updated, rate, burst)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self.SLOT.pack_into(table, found, hashed, tokens, now)
+        return allowed, tokens
+
+    async def take(self, key: str, rate: float, burst: float, cost: float = 1.0) -> Tuple[bool, float]:
+        allowed, tokens = self.spend(key, rate, burst, cost)
+        return allowed, 0.0 if allowed else (cost - tokens) / rate
+
+    def stats(self) -> Dict[str, Any]:
+        clients = 0
+        if self._mmap is not None:
+            with memoryview(self._mmap) as view, view.cast("Q") as words:
+                clients = sum(1 for owner in words[::3] if owner)
+        return {"store": "file", "clients": clients, "slots": self.slots,
+                "evictions": self.evictions}
+
+
+def shared_bucket_store() -> Optional[FileBucketStore]:
+    """
+    The bucket table under WORKER_STATE_DIR, or None when workers share no
+    state
+    """
+    directory = state_directory("rate_limits")
+    if not directory:
+        return None
+    return FileBucketStore(directory, slots=int(os.getenv("RATE_LIMIT_SHARED_SLOTS", "65536")))
+
+
+class MongoBucketStore:
+    """
+    Token buckets in a Mongo collection, one document per client and
+    policy, refilled and spent in a single atomic update. Documents expire
+    once their bucket would be full again.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        collection: str = "rate_limits",
+        timeout: float = 0.5,
+        retry_after: float = 30.0,
+        fallback: Any = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.url = url
+        self.collection_name = collection
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.fallback = fallback or MemoryBucketStore()
+        self.clock = clock
+        self._client = None
+        self._collection = None
+        self._suspended_until = 0.0
+        self.errors = 0
+
+    @property
+    def collection(self):
+        if self._collection is None:
+            timeout_ms = int(self.timeout * 1000)
+            self._client = motor_asyncio.AsyncIOMotorClient(
+                self.url,
+                maxPoolSize=20,
+                serverSelectionTimeoutMS=timeout_ms,
+                connectTimeoutMS=timeout_ms,
+                socketTimeoutMS=timeout_ms,
+            )
+            database = self._client.get_default_database(default="app_db")
+            self._collection = database[self.collection_name]
+        return self._collection
+
+    async def start(self) -> None:
+        await self.fallback.start()
+        try:
+            await self.collection.create_index("expires_at", expireAfterSeconds=0, name="expiry")
+        except pymongo.errors.PyMongoError as e:
+            self._failed(e)
+
+    async def close(self) -> None:
+        await self.fallback.close()
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+            self._collection = None
+
+    def _failed(self, error: Exception) -> None:
+        self.errors += 1
+        self._suspended_until = self.clock() + self.retry_after
+        print(f"Rate limit store failed, using local buckets for {self.retry_after:.0f}s: {str(error)}")
+
+    async def take(self, key: str, rate: float, burst: float, cost: float = 1.0) -> Tuple[bool, float]:
+        if self.clock() < self._suspended_until:
+            return await self.fallback.take(key, rate, burst, cost)
+
+        now = time.time()
+        elapsed = {"$subtract": [now, {"$ifNull": ["$updated", now]}]}
+        refilled = {"$min": [burst, {"$add": [
+            {"$ifNull": ["$tokens", burst]}, {"$multiply": [rate, {"$max": [0, elapsed]}]},
+        ]}]}
+        try:
+            bucket = await self.collection.find_one_and_update(
+                {"_id": key},
+                [
+                    {"$set": {"tokens": refilled, "updated": now}},
+                    {"$set": {"allowed": {"$gte": ["$tokens", cost]}}},
+                    {"$set": {
+                        "tokens": {"$cond": ["$allowed", {"$subtract": ["$tokens", cost]}, "$tokens"]},
+                        "expires_at": datetime.fromtimestamp(now + burst / rate, timezone.utc),
+                    }},
+                ],
+                projection={"tokens": 1, "allowed": 1},
+                upsert=True,
+                return_document=pymongo.ReturnDocument.AFTER,
+            )
+        except pymongo.errors.PyMongoError as e:
+            self._failed(e)
+            return await self.fallback.take(key, rate, burst, cost)
+
+        if bucket["allowed"]:
+            return True, 0.0
+        return False, (cost - bucket["tokens"]) / rate
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "store": "mongo",
+            "suspended": self.clock() < self._suspended_until,
+            "errors": self.errors,
+            "fallback_clients": self.fallback.stats()["clients"],
+        }
+
+
+class ClientRateLimiter:
+    """
+    A token bucket per client and policy; a policy is (tokens per second,
+    burst), and a rate of 0 leaves it unlimited
+    """
+
+    # A bulk request spends one "bulk" token per distinct search it holds,
+    # so its burst is the largest bulk request a client can send at once
+    POLICIES = {
+        "search": (2.0, 20.0),
+        "suggest": (10.0, 40.0),
+        "events": (5.0, 50.0),
+        "bulk": (2.0, 500.0),
+    }
+
+    def __init__(
+        self,
+        policies: Optional[Dict[str, Tuple[float, float]]] = None,
+        store: Any = None,
+        api_keys: Iterable[str] = (),
+        trusted_proxies: Iterable[str] = ("127.0.0.1", "::1"),
+    ):
+        self.policies = dict(self.POLICIES if policies is None else policies)
+        self.store = store or MemoryBucketStore()
+        self.api_keys = frozenset(api_keys)
+        self.trusted_proxies = frozenset(trusted_proxies)
+        # Requests carrying forwarding headers from a peer not trusted to set them
+        self.untrusted_forwards = 0
+        self.allowed: Dict[str, int] = {}
+        self.limited: Dict[str, int] = {}
+
+    @classmethod
+    def from_env(cls) -> "ClientRateLimiter":
+        """
+        RATE_LIMIT_<POLICY>_RATE and _BURST per policy, RATE_LIMIT_API_KEYS
+        (comma-separated keys clients may send in X-API-Key),
+        RATE_LIMIT_TRUSTED_PROXIES (peers whose X-Real-IP is believed) and
+        RATE_LIMIT_STORE ("mongo", or "memory" for per-process buckets even
+        when workers share WORKER_STATE_DIR)
+        """
+        policies = {
+            name: (
+                float(os.getenv(f"RATE_LIMIT_{name.upper()}_RATE", str(rate))),
+                float(os.getenv(f"RATE_LIMIT_{name.upper()}_BURST", str(burst))),
+            )
+            for name, (rate, burst) in cls.POLICIES.items()
+        }
+        kind = os.getenv("RATE_LIMIT_STORE", "")
+        store = None if kind == "memory" else shared_bucket_store()
+        if kind == "mongo" and os.getenv("MONGO_URL"):
+            store = MongoBucketStore(
+                os.environ["MONGO_URL"],
+                collection=os.getenv("RATE_LIMIT_COLLECTION", "rate_limits"),
+                fallback=store,
+            )
+        split = lambda value: [item.strip() for item in value.split(",") if item.strip()]  # noqa: E731
+        return cls(
+            policies,
+            store,
+            api_keys=split(os.getenv("RATE_LIMIT_API_KEYS", "")),
+            trusted_proxies=split(os.getenv("RATE_LIMIT_TRUSTED_PROXIES", "127.0.0.1,::1")),
+        )
+
+    async def start(self) -> None:
+        await self.store.start()
+
+    async def close(self) -> None:
+        await self.store.close()
+
+    def client_key(self, headers: Dict[str, str], peer: Optional[str]) -> str:
+        """
+        The recognised API key (hashed) a request carries, or else its
+        client's address: the peer's, or X-Real-IP from a trusted proxy
+        """
+        api_key = headers.get("x-api-key")
+        if api_key and api_key in self.api_keys:
+            return "key:" + hashlib.sha256(api_key.encode()).hexdigest()[:16]
+        address = peer or "unknown"
+        if address in self.trusted_proxies:
+            address = headers.get("x-real-ip", address).strip()
+        elif "x-real-ip" in headers or "x-forwarded-for" in headers:
+            self._untrusted_forward(address)
+        return "ip:" + address
+
+    def _untrusted_forward(self, peer: str) -> None:
+        # Behind a proxy that is not trusted every client shares the
+        # proxy's bucket; say so once rather than on every request
+        if not self.untrusted_forwards:
+            print(f"Rate limits: ignoring X-Real-IP/X-Forwarded-For from {peer}, which is not "
+                  f"in RATE_LIMIT_TRUSTED_PROXIES; clients behind it share one bucket")
+        self.untrusted_forwards += 1
+
+    async def check(self, policy: str, headers: Dict[str, str], peer: Optional[str],
+                    cost: float = 1.0) -> None:
+        """
+        Spend `cost` of the client's tokens under `policy`, or raise
+        RateLimitedError
+        """
+        rate, burst = self.policies.get(policy, (0.0, 0.0))
+        if rate <= 0:
+            return
+        key = f"{policy}:{self.client_key(headers, peer)}"
+        allowed, retry_after = await self.store.take(key, rate, burst, cost)
+        if allowed:
+            self.allowed[policy] = self.allowed.get(policy, 0) + 1
+            return
+        self.limited[policy] = self.limited.get(policy, 0) + 1
+        rate_limited.inc(policy=policy)
+        raise RateLimitedError(policy, retry_after)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "policies": {name: {"rate": rate, "burst": burst} for name, (rate, burst) in self.policies.items()},
+            "allowed": dict(self.allowed),
+            "limited": dict(self.limited),
+            "untrusted_forwards": self.untrusted_forwards,
+            **self.store.stats(),
+        }
+
+
+class QuotaScheduler:
+    """
+    Global token bucket for upstream calls, refilled at `rate` per second
+    up to `burst`, with a priority queue for the calls that find it empty.
+    With a `shared` bucket store the bucket is every worker's.
+    """
+
+    PRIORITIES = (INTERACTIVE, BACKGROUND)
+
+    def __init__(
+        self,
+        rate: float = 5.0,
+        burst: float = 20.0,
+        max_wait: Optional[Dict[str, float]] = None,
+        max_queue: int = 200,
+        clock: Callable[[], float] = time.monotonic,
+        shared: Optional[FileBucketStore] = None,
+    ):
+        self.rate = rate
+        self.burst = burst
+        # Longest a call may queue; background waits longer, but both stay
+        # under the upstream client's overall deadline
+        self.max_wait = max_wait or {INTERACTIVE: 2.0, BACKGROUND: 8.0}
+        self.max_queue = max_queue
+        self.clock = clock
+        self.shared = shared
+        self._tokens = burst
+        self._updated = clock()
+        # (priority rank, arrival, future): highest priority, then oldest first
+        self._waiting: List[Tuple[int, int, "asyncio.Future[None]"]] = []
+        self._arrivals = itertools.count()
+        self._dispatcher: Optional["asyncio.Task[None]"] = None
+        self.counts: Dict[str, Dict[str, int]] = {
+            priority: {"immediate": 0, "queued": 0, "shed": 0} for priority in self.PRIORITIES
+        }
+
+    @classmethod
+    def from_env(cls) -> "QuotaScheduler":
+        return cls(
+            rate=float(os.getenv("UPSTREAM_QUOTA_RATE", "5")),
+            burst=float(os.getenv("UPSTREAM_QUOTA_BURST", "20")),
+            max_wait={
+                INTERACTIVE: float(os.getenv("UPSTREAM_QUOTA_MAX_WAIT", "2")),
+                BACKGROUND: float(os.getenv("UPSTREAM_QUOTA_MAX_WAIT_BACKGROUND", "8")),
+            },
+            max_queue=int(os.getenv("UPSTREAM_QUOTA_MAX_QUEUE", "200")),
+            shared=shared_bucket_store(),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def _refill(self) -> None:
+        if self.shared is not None:
+            _, self._tokens = self.shared.spend("quota:upstream", self.rate, self.burst, 0.0)
+            return
+        now = self.clock()
+        self._tokens = refill(self._tokens, now - self._updated, self.rate, self.burst)
+        self._updated = now
+
+    def _take(self) -> bool:
+        """
+        Spend a token if there is one; either way _tokens is up to date
+        """
+        if self.shared is not None:
+            taken, self._tokens = self.shared.spend("quota:upstream", self.rate, self.burst)
+            return taken
+        self._refill()
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    def _count(self, priority: str, outcome: str) -> None:
+        self.counts[priority][outcome] += 1
+        upstream_quota_calls.inc(priority=priority, outcome=outcome)
+
+    def _shed(self, priority: str, retry_after: float) -> QuotaExceededError:
+        self._count(priority, "shed")
+        return QuotaExceededError(max(retry_after, 1.0))
+
+    async def acquire(self, priority: Optional[str] = None) -> None:
+        """
+        Wait for a share of the quota at `priority` (by default the
+        current task's), or raise QuotaExceededError
+        """
+        if not self.enabled:
+            return
+        priority = priority or upstream_priority.get()
+        rank = self.PRIORITIES.index(priority)
+        if not self._waiting and self._take():
+            self._count(priority, "immediate")
+            return
+        if self._waiting:
+            self._refill()
+
+        # Calls queued at the same or a higher priority are served first
+        ahead = sum(1 for r, _, future in self._waiting if r <= rank and not future.done())
+        expected_wait = (ahead + 1 - self._tokens) / self.rate
+        if expected_wait > self.max_wait[priority]:
+            raise self._shed(priority, expected_wait)
+        if len(self._waiting) >= self.max_queue:
+            # Make room by shedding the newest call of the lowest priority,
+            # if it ranks below this one
+            victim = max(self._waiting, key=lambda waiter: (waiter[0], waiter[1]))
+            if victim[0] <= rank:
+                raise self._shed(priority, expected_wait)
+            self._waiting.remove(victim)
+            heapq.heapify(self._waiting)
+            if not victim[2].done():
+                victim[2].set_exception(self._shed(self.PRIORITIES[victim[0]], self.burst / self.rate))
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiting, (rank, next(self._arrivals), future))
+        self._count(priority, "queued")
+        if self._dispatcher is None:
+            self._dispatcher = asyncio.ensure_future(self._dispatch())
+        try:
+            await asyncio.wait_for(future, self.max_wait[priority])
+        except asyncio.TimeoutError:
+            raise self._shed(priority, self.max_wait[priority]) from None
+
+    async def _dispatch(self) -> None:
+        try:
+            while self._waiting:
+                while self._waiting:
+                    future = self._waiting[0][2]
+                    if not future.done() and not self._take():
+                        break
+                    heapq.heappop(self._waiting)
+                    if not future.done():
+                        future.set_result(None)
+                if self._waiting:
+                    await asyncio.sleep(max(0.0, 1 - self._tokens) / self.rate)
+        finally:
+            self._dispatcher = None
+
+    async def close(self) -> None:
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            self._dispatcher = None
+        for _, _, future in self._waiting:
+            if not future.done():
+                future.cancel()
+        self._waiting = []
+        if self.shared is not None:
+            await self.shared.close()
+
+    def stats(self) -> Dict[str, Any]:
+        self._refill()
+        return {
+            "enabled": self.enabled,
+            "rate": self.rate,
+            "tokens": round(self._tokens, 2),
+            "waiting": sum(1 for _, _, future in self._waiting if not future.done()),
+            "calls": {priority: dict(counts) for priority, counts in self.counts.items()},
+        }
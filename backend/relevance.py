@@ -0,0 +1,311 @@
+"""
+AI relevance filtering for search results.
+
+The keyword list is compiled once at import time into a token index so a
+result's text is matched in a single pass no matter how many keywords there
+are, and AI domains are matched against the parsed hostname instead of being
+searched for anywhere in the URL.
+"""
+import re
+from typing import Dict, FrozenSet, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+# Comprehensive AI-related keywords for strict filtering
+AI_KEYWORDS = [
+    # Core AI terms
+    "artificial intelligence", "machine learning", "deep learning", "neural network",
+    "natural language processing", "computer vision", "robotics", "automation",
+
+    # AI Companies & Products
+    "openai", "anthropic", "claude", "chatgpt", "gpt", "gemini", "bard",
+    "midjourney", "stable diffusion", "dall-e", "runwayml", "replicate",
+    "hugging face", "transformers", "pytorch", "tensorflow", "keras",
+
+    # AI Tools & Platforms
+    "langchain", "vector database", "embedding", "llm", "large language model",
+    "generative ai", "ai assistant", "chatbot", "ai tool", "ai platform",
+    "ai api", "ai service", "ai model", "ai framework", "ai library",
+
+    # AI Applications
+    "ai writing", "ai image", "ai video", "ai code", "ai research",
+    "ai startup", "ai company", "ai news", "ai blog", "ai tutorial",
+    "prompt engineering", "fine-tuning", "rag", "retrieval augmented",
+
+    # Technical AI terms
+    "transformer", "attention mechanism", "diffusion model", "gan",
+    "reinforcement learning", "supervised learning", "unsupervised learning",
+    "gradient descent", "backpropagation", "convolutional", "recurrent"
+]
+
+# Terms strong enough that a single keyword match is accepted
+CORE_AI_TERMS = [
+    "artificial intelligence", "machine learning", "deep learning",
+    "neural network", "openai", "chatgpt", "claude", "gemini"
+]
+
+# AI-focused domains (known AI companies and platforms)
+AI_DOMAINS = [
+    "openai.com", "anthropic.com", "google.ai", "microsoft.com/ai",
+    "huggingface.co", "replicate.com", "runway.com", "midjourney.com",
+    "stability.ai", "cohere.ai", "ai21.com", "deepmind.com",
+    "nvidia.com/ai", "ibm.com/watson", "aws.amazon.com/machine-learning",
+    "azure.microsoft.com/cognitive-services", "cloud.google.com/ai",
+    "paperswithcode.com", "arxiv.org", "towards", "medium.com",
+    "github.com", "kaggle.com", "fast.ai", "deeplearning.ai"
+]
+
+# Entries of AI_DOMAINS that also host plenty of unrelated content, so a
+# match on them alone says little about a result
+GENERAL_DOMAINS = ["towards", "medium.com", "github.com"]
+
+# Scheme, authority and path of an absolute URL
+_URL_PARTS = re.compile(r"[a-zA-Z][a-zA-Z0-9+.-]*://([^/?#]*)([^?#]*)")
+
+
+class _TokenTable(dict):
+    """
+    Memo of per-token match data that fills itself in on a miss
+    """
+
+    def __init__(self, learn):
+        super().__init__()
+        self._learn = learn
+
+    def __missing__(self, token):
+        return self._learn(token)
+
+
+class KeywordMatcher:
+    """
+    Keyword and core-term lists compiled into a whitespace-token index.
+
+    A pattern without spaces occurs in a text exactly when it occurs inside
+    one of the text's space-separated tokens, and a multi-word pattern
+    "w1 w2 ... wk" occurs exactly when some token ends with w1, the next
+    tokens equal w2 ... w(k-1) and the one after starts with wk. What each
+    distinct token contributes is worked out once and memoized, so a text
+    is matched with one lookup per token instead of one substring scan per
+    keyword.
+
+    Each pattern is counted once per text, matching the old `keyword in text`
+    checks, including overlapping matches such as "gpt" inside "chatgpt".
+    """
+
+    def __init__(
+        self,
+        keywords: Iterable[str],
+        core_terms: Iterable[str],
+        max_memo_tokens: int = 200_000,
+    ):
+        keywords = list(dict.fromkeys(k.lower() for k in keywords if k))
+        core_terms = list(dict.fromkeys(t.lower() for t in core_terms if t))
+        self.patterns: List[str] = list(dict.fromkeys(keywords + core_terms))
+        keyword_set, core_set = set(keywords), set(core_terms)
+        self.keyword_ids: FrozenSet[int] = frozenset(
+            i for i, p in enumerate(self.patterns) if p in keyword_set
+        )
+        self.core_ids: FrozenSet[int] = frozenset(
+            i for i, p in enumerate(self.patterns) if p in core_set
+        )
+
+        # Single-token patterns, and multi-word ones split into
+        # (pattern id, first word, middle words, last word)
+        self._single: List[Tuple[int, str]] = []
+        self._multi: List[Tuple[int, str, List[str], str]] = []
+        for pattern_id, pattern in enumerate(self.patterns):
+            words = pattern.split(" ")
+            if len(words) == 1:
+                self._single.append((pattern_id, pattern))
+            else:
+                self._multi.append((pattern_id, words[0], words[1:-1], words[-1]))
+
+        self.max_memo_tokens = max_memo_tokens
+        # token -> (token, single-token pattern ids inside it, multi-word
+        # patterns whose first word it ends with), or None when the token
+        # contributes nothing; unseen tokens are analysed on first lookup
+        self._tokens = _TokenTable(self._learn)
+
+    def _learn(self, token: str):
+        if len(self._tokens) >= self.max_memo_tokens:
+            self._tokens.clear()
+
+        contained = frozenset(
+            pattern_id for pattern_id, pattern in self._single if pattern in token
+        )
+        heads = tuple(
+            (pattern_id, middle, last)
+            for pattern_id, first, middle, last in self._multi
+            if token.endswith(first)
+        )
+        info = (token, contained, heads) if contained or heads else None
+        self._tokens[token] = info
+        return info
+
+    def matches(self, text: str) -> FrozenSet[int]:
+        """
+        Ids of every pattern that occurs in `text` (already lowercased)
+        """
+        tokens = text.split(" ")
+        found: Set[int] = set()
+        anchored: Set[str] = set()
+        for token, contained, heads in filter(None, map(self._tokens.__getitem__, tokens)):
+            found |= contained
+            if heads and token not in anchored:
+                anchored.add(token)
+                self._match_heads(tokens, token, heads, found)
+        return frozenset(found)
+
+    @staticmethod
+    def _match_heads(tokens: List[str], token: str, heads, found: Set[int]) -> None:
+        """
+        Check multi-word patterns at every position where `token` occurs
+        """
+        n = len(tokens)
+        i = tokens.index(token)
+        while True:
+            for pattern_id, middle, last in heads:
+                end = i + len(middle) + 1
+                if (
+                    end < n
+                    and tokens[end].startswith(last)
+                    and (not middle or tokens[i + 1:end] == middle)
+                ):
+                    found.add(pattern_id)
+            try:
+                i = tokens.index(token, i + 1)
+            except ValueError:
+                return
+
+    def count(self, text: str) -> Tuple[int, int]:
+        """
+        (distinct keyword hits, distinct core-term hits) in one pass
+        """
+        found = self.matches(text)
+        return len(found & self.keyword_ids), len(found & self.core_ids)
+
+    def is_relevant(self, text: str) -> bool:
+        """
+        At least 2 keyword hits, or 1 keyword hit plus a core term
+        """
+        keyword_hits, core_hits = self.count(text)
+        return keyword_hits >= 2 or (keyword_hits >= 1 and core_hits >= 1)
+
+
+class DomainMatcher:
+    """
+    Hostname suffix lookup for AI_DOMAINS.
+
+    "github.com" matches github.com and any subdomain of it; entries with a
+    path ("microsoft.com/ai") also require the URL path to start with it;
+    bare words without a dot ("towards") match any hostname label that
+    starts with them, e.g. towardsdatascience.com.
+    """
+
+    def __init__(self, domains: Iterable[str], max_memo_hosts: int = 100_000):
+        self.hosts: Dict[str, List[str]] = {}
+        self.label_prefixes: List[str] = []
+        for entry in domains:
+            entry = entry.lower()
+            host, _, path = entry.partition("/")
+            if "." not in host:
+                self.label_prefixes.append(host)
+                continue
+            self.hosts.setdefault(host, []).append("/" + path if path else "")
+
+        self.max_memo_hosts = max_memo_hosts
+        self._verdicts: Dict[str, object] = {}
+
+    def _classify(self, hostname: str):
+        """
+        True/False when the hostname alone decides, otherwise the path
+        prefixes that would make it match
+        """
+        if any(
+            hostname.startswith(prefix) or f".{prefix}" in hostname
+            for prefix in self.label_prefixes
+        ):
+            return True
+
+        # Walk the hostname's suffixes: a.b.example.com, b.example.com, ...
+        path_prefixes: List[str] = []
+        suffix = hostname
+        while True:
+            path_prefixes.extend(self.hosts.get(suffix, ()))
+            dot = suffix.find(".")
+            if dot == -1:
+                break
+            suffix = suffix[dot + 1:]
+
+        if "" in path_prefixes:
+            return True
+        return tuple(path_prefixes) or False
+
+    def matches(self, link: str) -> bool:
+        parts = _URL_PARTS.match(link.strip())
+        if parts is None:
+            return False
+        authority, path = parts.groups()
+        hostname = authority.rpartition("@")[2].partition(":")[0].lower()
+        if not hostname:
+            return False
+
+        verdict = self._verdicts.get(hostname)
+        if verdict is None:
+            if len(self._verdicts) >= self.max_memo_hosts:
+                self._verdicts.clear()
+            verdict = self._verdicts[hostname] = self._classify(hostname)
+
+        if isinstance(verdict, bool):
+            return verdict
+        path = path.lower()
+        return any(path.startswith(p) for p in verdict)
+
+
+keyword_matcher = KeywordMatcher(AI_KEYWORDS, CORE_AI_TERMS)
+domain_matcher = DomainMatcher(AI_DOMAINS)
+
+
+def is_ai_related(title: str, snippet: str, link: str) -> bool:
+    """
+    Strict AI filtering function that checks if content is AI-related
+    """
+    # Check for AI-related domains first (high confidence)
+    if domain_matcher.matches(link):
+        return True
+
+    # Require at least 2 keyword matches for strict filtering
+    # or 1 match if it's a core AI term
+    return keyword_matcher.is_relevant(f"{title} {snippet}".lower())
+
+
+def score_batch(
+    items: Sequence[Tuple[str, str, str]],
+    matcher: Optional[KeywordMatcher] = None,
+    domains: Optional[DomainMatcher] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Score (title, snippet, link) tuples, for offline re-scoring of cached
+    and archived results.
+
+    Returns a boolean mask of AI-related items, the same verdicts as
+    is_ai_related, and the number of distinct AI keywords in each item's
+    title and snippet. Archives repeat the same results across queries
+    and pages, so each distinct text is matched once.
+    """
+    matcher = matcher or keyword_matcher
+    domains = domains or domain_matcher
+    n = len(items)
+    relevant = np.zeros(n, dtype=bool)
+    keyword_hits = np.zeros(n, dtype=np.int32)
+
+    counts: Dict[str, Tuple[int, int]] = {}
+    for i, (title, snippet, link) in enumerate(items):
+        text = f"{title} {snippet}".lower()
+        count = counts.get(text)
+        if count is None:
+            count = counts[text] = matcher.count(text)
+        keywords, core = count
+        keyword_hits[i] = keywords
+        relevant[i] = domains.matches(link) or keywords >= 2 or (keywords >= 1 and core >= 1)
+    return relevant, keyword_hits
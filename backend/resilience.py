@@ -0,0 +1,147 @@
+"""
+Failure handling for calls to an unreliable upstream.
+
+A retry budget caps retries to a fraction of recent traffic, so retries
+cannot multiply load on an upstream that is already struggling. A circuit
+breaker stops calling the upstream altogether after repeated failures and
+lets a single probe through once it has had time to recover.
+"""
+import random
+import time
+from typing import Any, Callable, Dict
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of calling an upstream the breaker considers unhealthy
+    """
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Upstream circuit is open, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class RetryBudget:
+    """
+    Token bucket funded by requests and spent by retries.
+
+    Every first attempt deposits `ratio` tokens and every retry withdraws
+    one, so retries stay under roughly `ratio` of request volume. A small
+    `min_per_second` allowance lets low-traffic periods still retry.
+    """
+
+    def __init__(
+        self,
+        ratio: float = 0.2,
+        min_per_second: float = 1.0,
+        max_tokens: float = 20.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max_tokens
+        self.clock = clock
+        self._tokens = max_tokens
+        self._updated = clock()
+        self.exhausted = 0
+
+    def _refill(self, amount: float = 0.0) -> None:
+        now = self.clock()
+        elapsed = now - self._updated
+        self._updated = now
+        self._tokens = min(self.max_tokens, self._tokens + elapsed * self.min_per_second + amount)
+
+    def deposit(self) -> None:
+        self._refill(self.ratio)
+
+    def withdraw(self) -> bool:
+        self._refill()
+        if self._tokens >= 1.0:
+            self._tokens -= 1.0
+            return True
+        self.exhausted += 1
+        return False
+
+    def stats(self) -> Dict[str, Any]:
+        self._refill()
+        return {"tokens": round(self._tokens, 2), "exhausted": self.exhausted}
+
+
+class CircuitBreaker:
+    """
+    Closed -> open after `failure_threshold` consecutive failures; open ->
+    half-open after `reset_timeout`, when one probe call is let through;
+    half-open -> closed on its success, or back to open on its failure.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self.rejected = 0
+        self.opened = 0
+
+    def before_call(self) -> None:
+        """
+        Raise CircuitOpenError unless a call may go through now
+        """
+        if self.state == self.CLOSED:
+            return
+
+        remaining = self._opened_at + self.reset_timeout - self.clock()
+        if self.state == self.OPEN and remaining <= 0:
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN and not self._probing:
+            self._probing = True
+            return
+
+        self.rejected += 1
+        raise CircuitOpenError(max(remaining, 1.0))
+
+    def record_success(self) -> None:
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.opened += 1
+            self.state = self.OPEN
+            self._opened_at = self.clock()
+        self._probing = False
+
+    def abandon(self) -> None:
+        """
+        The call let through was cancelled before it had an outcome
+        """
+        self._probing = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "opened": self.opened,
+            "rejected": self.rejected,
+        }
+
+
+def backoff_delay(attempt: int, base: float = 0.1, cap: float = 2.0) -> float:
+    """
+    Full-jitter exponential backoff before retry number `attempt` (1-based)
+    """
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
@@ -0,0 +1,360 @@
+"""
+Semantic relevance scoring for search results.
+
+A result's title and snippet are embedded as a term-frequency vector over
+a fixed vocabulary: the words, word pairs and character 4-grams of a set
+of AI prototype texts. The 4-grams catch inflected and unusual forms
+("LLMs", "transformer-based") that whole-word keywords miss. One extra
+dimension carries the weight of every term outside the vocabulary, so an
+off-topic text scores near zero rather than being judged only on the odd
+AI word it contains. A result's score is its best cosine similarity to
+any prototype.
+
+Each page is embedded and scored in one batch, and embeddings are cached
+by URL in a fixed-size float16 matrix, so results seen before cost a dict
+lookup. RelevanceStage combines the score with the keyword
+and domain rules of relevance.py.
+"""
+import os
+import re
+from itertools import chain
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from relevance import AI_DOMAINS, GENERAL_DOMAINS, DomainMatcher, _TokenTable, is_ai_related
+from relevance import keyword_matcher
+
+# Short descriptions of what counts as AI content, one topic each
+AI_PROTOTYPES = [
+    "artificial intelligence AI machine learning models and algorithms",
+    "deep learning neural networks training backpropagation gradient descent",
+    "large language models LLM GPT foundation models",
+    "ChatGPT OpenAI Claude Anthropic Gemini Bard AI assistant chatbot",
+    "generative AI image generation diffusion model Midjourney DALL-E Stable Diffusion text-to-image",
+    "AI code assistant Copilot programming code generation developer tools",
+    "AI writing assistant content generator text generation copywriting",
+    "natural language processing NLP transformers attention embeddings",
+    "computer vision object detection image recognition segmentation",
+    "reinforcement learning agents robotics autonomous systems",
+    "AI research papers arXiv machine learning benchmarks state of the art",
+    "AI tools platforms APIs and SDKs for developers",
+    "AI video generation editing deepfake synthetic media",
+    "AI music generation audio speech recognition voice synthesis",
+    "AI in healthcare medical imaging diagnosis drug discovery",
+    "AI education tutoring personalized learning platform courses",
+    "prompt engineering fine-tuning retrieval augmented generation RAG vector database",
+    "PyTorch TensorFlow Keras Hugging Face model training inference GPUs",
+    "AI productivity automation workflow agents",
+    "data science predictive analytics classification regression",
+    "convolutional recurrent networks GANs autoencoders",
+    "AI startups companies funding and industry news",
+    "AI safety alignment ethics regulation",
+    "Kaggle datasets model evaluation MLOps deployment",
+]
+
+# Words too common to say anything about a topic
+STOPWORDS = frozenset("""
+a an and are as at be by can do for from get has have how i if in into is it
+its just more most my new not of on or our out so than that the their then
+there these this to up us vs was we what when where which who why will with
+you your
+""".split())
+
+# Weight of a word's character 4-grams, shared between them
+GRAM_WEIGHT = 0.5
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def text_terms(text: str) -> List[str]:
+    """
+    Words and adjacent word pairs of a text, without stopwords
+    """
+    words = [word for word in _WORD.findall(text.lower()) if word not in STOPWORDS]
+    return words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+
+
+def _grams(term: str) -> List[str]:
+    if len(term) <= 4 or " " in term:
+        return []
+    padded = f"#{term}#"
+    return [padded[i:i + 4] for i in range(len(padded) - 3)]
+
+
+class PrototypeEmbedder:
+    """
+    Term-frequency embeddings over the vocabulary of a set of prototype
+    texts, plus one dimension for everything outside it
+    """
+
+    def __init__(self, prototypes: Sequence[str], max_memo_terms: int = 100_000):
+        self.vocabulary: Dict[str, int] = {}
+        for prototype in prototypes:
+            for term in text_terms(prototype):
+                for feature in [term] + _grams(term):
+                    self.vocabulary.setdefault(feature, len(self.vocabulary))
+        self.dim = len(self.vocabulary) + 1
+        self.max_memo_terms = max_memo_terms
+        # Every distinct term seen gets a row: its vocabulary features are
+        # feature_ids/feature_weights[starts[row]:starts[row] + counts[row]]
+        # and `outside` is the squared weight of the rest
+        self.starts = np.zeros(max_memo_terms, dtype=np.int64)
+        self.counts = np.zeros(max_memo_terms, dtype=np.int64)
+        self.outside = np.zeros(max_memo_terms, dtype=np.float64)
+        self.feature_ids = np.zeros(4 * max_memo_terms, dtype=np.int64)
+        self.feature_weights = np.zeros(4 * max_memo_terms, dtype=np.float64)
+        self._features_used = 0
+        self._generation = 0
+        self._terms = _TokenTable(self._learn)
+        self.prototypes = self.embed(prototypes)
+
+    def _learn(self, term: str) -> int:
+        if len(self._terms) >= self.max_memo_terms:
+            self._terms.clear()
+            self._features_used = 0
+            self._generation += 1
+
+        grams = _grams(term)
+        features = [(term, 1.0)] + [(gram, GRAM_WEIGHT / len(grams)) for gram in grams]
+        ids = [self.vocabulary[f] for f, _ in features if f in self.vocabulary]
+        used = self._features_used
+        if used + len(ids) > len(self.feature_ids):
+            self.feature_ids = np.resize(self.feature_ids, 2 * len(self.feature_ids))
+            self.feature_weights = np.resize(self.feature_weights, 2 * len(self.feature_weights))
+        self.feature_ids[used:used + len(ids)] = ids
+        self.feature_weights[used:used + len(ids)] = [w for f, w in features if f in self.vocabulary]
+        self._features_used = used + len(ids)
+
+        row = len(self._terms)
+        self.starts[row] = used
+        self.counts[row] = len(ids)
+        self.outside[row] = sum(w * w for f, w in features if f not in self.vocabulary)
+        self._terms[term] = row
+        return row
+
+    def _term_rows(self, terms: List[str]) -> np.ndarray:
+        generation = self._generation
+        rows = np.fromiter(map(self._terms.__getitem__, terms), dtype=np.int64, count=len(terms))
+        if self._generation != generation:
+            # The memo filled up and was cleared partway through
+            rows = np.fromiter(map(self._terms.__getitem__, terms), dtype=np.int64, count=len(terms))
+        return rows
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """
+        Unit-length float32 embeddings, one row per text
+        """
+        n = len(texts)
+        term_lists = [text_terms(text) for text in texts]
+        lengths = np.fromiter(map(len, term_lists), dtype=np.int64, count=n)
+        rows = self._term_rows(list(chain.from_iterable(term_lists)))
+        docs = np.repeat(np.arange(n, dtype=np.int64), lengths)
+
+        # Expand each term occurrence into its (text, feature, weight) cells
+        counts = self.counts[rows]
+        total = int(counts.sum())
+        offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        features = np.repeat(self.starts[rows], counts) + offsets
+        cells = np.repeat(docs, counts) * self.dim + self.feature_ids[features]
+        vectors = np.bincount(cells, weights=self.feature_weights[features], minlength=n * self.dim)
+        vectors = vectors.reshape(n, self.dim).astype(np.float32)
+        vectors[:, -1] = np.sqrt(np.bincount(docs, weights=self.outside[rows], minlength=n))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def score(self, vectors: np.ndarray) -> np.ndarray:
+        """
+        Best cosine similarity of each embedding to any prototype
+        """
+        if not len(vectors):
+            return np.zeros(0, dtype=np.float32)
+        return (vectors @ self.prototypes.T).max(axis=1)
+
+
+class VectorCache:
+    """
+    Embeddings by key in a preallocated float16 matrix; once full, new
+    entries overwrite the oldest
+    """
+
+    def __init__(self, dim: int, capacity: int = 10_000):
+        self.capacity = max(1, capacity)
+        self.vectors = np.zeros((self.capacity, dim), dtype=np.float16)
+        self.rows: Dict[str, int] = {}
+        self.owners: List[Optional[str]] = [None] * self.capacity
+        self.next_row = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def find(self, keys: Sequence[str]) -> List[int]:
+        """
+        Row of each key, -1 where it is not cached
+        """
+        rows = [self.rows.get(key, -1) for key in keys]
+        missing = rows.count(-1)
+        self.misses += missing
+        self.hits += len(rows) - missing
+        return rows
+
+    def put(self, keys: Sequence[str], vectors: np.ndarray) -> None:
+        """
+        Store distinct keys' vectors, evicting the oldest entries once full
+        """
+        rows = []
+        for key in keys:
+            row = self.rows.get(key)
+            if row is None:
+                row = self.next_row
+                self.next_row = (row + 1) % self.capacity
+                evicted = self.owners[row]
+                if evicted is not None:
+                    del self.rows[evicted]
+                self.owners[row] = key
+                self.rows[key] = row
+            rows.append(row)
+        self.vectors[rows] = vectors
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self.rows),
+            "capacity": self.capacity,
+            "bytes": self.vectors.nbytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+class SemanticScorer:
+    def __init__(self, embedder: PrototypeEmbedder, cache: VectorCache):
+        self.embedder = embedder
+        self.cache = cache
+
+    def score(self, results: Sequence[Dict[str, str]]) -> np.ndarray:
+        """
+        Semantic score of each result's title and snippet, embedding only
+        the ones whose URL is not cached
+        """
+        keys = [result.get("link", "") for result in results]
+        rows = self.cache.find(keys)
+        vectors = np.empty((len(results), self.embedder.dim), dtype=np.float32)
+
+        missing = [i for i, row in enumerate(rows) if row < 0]
+        cached = [i for i, row in enumerate(rows) if row >= 0]
+        if cached:
+            vectors[cached] = self.cache.vectors[[rows[i] for i in cached]]
+        if missing:
+            embedded = self.embedder.embed([
+                f"{results[i].get('title', '')} {results[i].get('snippet', '')}" for i in missing
+            ])
+            vectors[missing] = embedded
+            # A URL can come back twice in a page; cache it once
+            fresh = dict(zip((keys[i] for i in missing), embedded))
+            self.cache.put(list(fresh), np.array(list(fresh.values())))
+        return self.embedder.score(vectors)
+
+
+def prototype_scorer(cache_size: int = 10_000) -> SemanticScorer:
+    """
+    A scorer against AI_PROTOTYPES with a vector cache of `cache_size` URLs
+    """
+    embedder = PrototypeEmbedder(AI_PROTOTYPES)
+    return SemanticScorer(embedder, VectorCache(embedder.dim, capacity=cache_size))
+
+
+class RelevanceStage:
+    """
+    Accepts or rejects a page of results.
+
+    "keywords" is is_ai_related on its own. "semantic" accepts a result
+    when its score reaches `threshold`. "hybrid" also accepts results on
+    an AI company's domain, and results the keyword rules accept that
+    score at least `keyword_floor`; general hosting domains (GitHub,
+    Medium) no longer pass on the domain alone.
+    """
+
+    MODES = ("keywords", "semantic", "hybrid")
+
+    def __init__(
+        self,
+        mode: str = "hybrid",
+        scorer: Optional[SemanticScorer] = None,
+        threshold: float = 0.06,
+        keyword_floor: float = 0.03,
+    ):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown relevance mode {mode!r}, expected one of {self.MODES}")
+        if scorer is None and mode != "keywords":
+            scorer = prototype_scorer()
+        self.mode = mode
+        self.scorer = scorer
+        self.threshold = threshold
+        self.keyword_floor = keyword_floor
+        self.ai_domains = DomainMatcher([d for d in AI_DOMAINS if d not in GENERAL_DOMAINS])
+        self.accepted: Dict[str, int] = {"domain": 0, "semantic": 0, "keywords": 0}
+        self.rejected = 0
+
+    @classmethod
+    def from_env(cls) -> "RelevanceStage":
+        mode = os.getenv("RELEVANCE_MODE", "hybrid")
+        scorer = None
+        if mode != "keywords":
+            scorer = prototype_scorer(int(os.getenv("RELEVANCE_VECTOR_CACHE_SIZE", "10000")))
+        return cls(
+            mode,
+            scorer,
+            threshold=float(os.getenv("RELEVANCE_THRESHOLD", "0.06")),
+            keyword_floor=float(os.getenv("RELEVANCE_KEYWORD_FLOOR", "0.03")),
+        )
+
+    def select(self, results: Sequence[Dict[str, str]]) -> List[bool]:
+        """
+        Whether each result (a dict with title, snippet and link) is AI-related
+        """
+        if self.mode == "keywords":
+            verdicts = [
+                is_ai_related(r.get("title", ""), r.get("snippet", ""), r.get("link", ""))
+                for r in results
+            ]
+            self.accepted["keywords"] += sum(verdicts)
+            self.rejected += len(verdicts) - sum(verdicts)
+            return verdicts
+
+        scores = self.scorer.score(results).tolist() if results else []
+        verdicts = []
+        for result, score in zip(results, scores):
+            reason = self._reason(result, score)
+            if reason is None:
+                self.rejected += 1
+            else:
+                self.accepted[reason] += 1
+            verdicts.append(reason is not None)
+        return verdicts
+
+    def _reason(self, result: Dict[str, str], score: float) -> Optional[str]:
+        if score >= self.threshold:
+            return "semantic"
+        if self.mode == "semantic":
+            return None
+        if self.ai_domains.matches(result.get("link", "")):
+            return "domain"
+        if score >= self.keyword_floor and keyword_matcher.is_relevant(
+            f"{result.get('title', '')} {result.get('snippet', '')}".lower()
+        ):
+            return "keywords"
+        return None
+
+    def stats(self) -> Dict[str, object]:
+        stats: Dict[str, object] = {
+            "mode": self.mode,
+            "threshold": self.threshold,
+            "accepted": dict(self.accepted),
+            "rejected": self.rejected,
+        }
+        if self.scorer is not None:
+            stats["vector_cache"] = self.scorer.cache.stats()
+        return stats
@@ -1,13 +1,35 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from serpapi import GoogleSearch
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
 import os
 from dotenv import load_dotenv
-import re
-from typing import List, Optional
+import json
+import math
+import time
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 import asyncio
-import httpx
+from collections import Counter
+from upstream import SerpAPIClient, UpstreamError
+from resilience import CircuitOpenError
+from providers import FederatedSearch, canonical_url
+from dedup import result_fingerprint
+from local_index import LocalIndex
+from cache import ResultCache, normalize_query
+from queries import query_rewriter, search_cache_key
+from store import MongoResultStore
+from singleflight import SingleFlight
+from semantic import RelevanceStage
+from pagination import Paginator
+from suggestions import SuggestionIndex, load_seed_queries
+from categories import CategoryCatalogue
+from encoding import EncodedPage, ResponseEncoder
+from events import EventLog, JsonlFileSink, read_events
+from ratelimit import ClientRateLimiter, RateLimitedError, background_priority
+from warming import CacheWarmer
+from workers import prepare_worker_state, worker_count
+from metrics import CONTENT_TYPE_LATEST, REGISTRY, MetricsMiddleware, MultiProcessMetrics
+from metrics import cache_lookups, results_filtered_out, results_seen, search_errors, stage_seconds
 
 load_dotenv()
 
@@ -22,9 +44,97 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request latency and in-flight requests, exported at /api/metrics
+app.add_middleware(MetricsMiddleware)
+
+# Metrics summed over every worker process when they share WORKER_STATE_DIR
+worker_metrics = MultiProcessMetrics.from_env(REGISTRY)
+
+@app.on_event("startup")
+async def start_worker_metrics():
+    await worker_metrics.start()
+
+@app.on_event("shutdown")
+async def close_worker_metrics():
+    await worker_metrics.close()
+
+# Set once every startup hook has run, cleared when shutdown begins
+ready = False
+
+@app.on_event("shutdown")
+async def mark_not_ready():
+    global ready
+    ready = False
+
+# Per-client token buckets for searches and suggestions (RATE_LIMIT_*)
+rate_limiter = ClientRateLimiter.from_env()
+
+@app.on_event("startup")
+async def start_rate_limiter():
+    await rate_limiter.start()
+
+@app.on_event("shutdown")
+async def close_rate_limiter():
+    await rate_limiter.close()
+
+async def enforce_rate_limit(http_request: Request, policy: str, cost: float = 1) -> None:
+    """
+    Spend `cost` of the client's requests under `policy`, or refuse with 429
+    """
+    peer = http_request.client.host if http_request.client else None
+    try:
+        await rate_limiter.check(policy, http_request.headers, peer, cost)
+    except RateLimitedError as e:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many requests, please retry shortly",
+            headers={"Retry-After": str(math.ceil(e.retry_after))}
+        )
+
+# Shared upstream client, pooled across all requests; its quota scheduler
+# (UPSTREAM_QUOTA_*) spaces calls and puts user searches ahead of refreshes
+serpapi_client = SerpAPIClient.from_env()
+
+@app.on_event("startup")
+async def start_upstream_client():
+    await serpapi_client.start()
+
+@app.on_event("shutdown")
+async def close_upstream_client():
+    await serpapi_client.close()
+
+# Full-text index of every AI result served, answering from results seen
+# before while the upstream is unavailable (or first, with LOCAL_INDEX_SERVE=first)
+local_index = LocalIndex.from_env()
+LOCAL_INDEX_SERVE = os.getenv("LOCAL_INDEX_SERVE", "fallback")
+
+@app.on_event("startup")
+async def start_local_index():
+    await local_index.start()
+
+@app.on_event("shutdown")
+async def close_local_index():
+    await local_index.close()
+
+# Search providers every query fans out to (SEARCH_PROVIDERS, default Google);
+# SerpAPI engines get the query rewritten, and steered towards AI results
+# unless it names an AI term already
+federated_search = FederatedSearch.from_env(
+    serpapi_client, rewrite_query=query_rewriter.upstream_query,
+    local_index=local_index
+)
+
+@app.on_event("startup")
+async def start_search_providers():
+    await federated_search.start()
+
+@app.on_event("shutdown")
+async def close_search_providers():
+    await federated_search.close()
+
 class SearchRequest(BaseModel):
     query: str
-    page: Optional[int] = 1
+    page: int = Field(default=1, ge=1)
 
 class SearchResult(BaseModel):
     title: str
@@ -38,177 +148,719 @@ class SearchResponse(BaseModel):
     total_results: int
     search_time: float
     query: str
+    # The body up to search_time, encoded once (see encoded_page); never
+    # model_copy a response with different results, the copy would share it
+    _encoded: Optional[EncodedPage] = None
 
-# Comprehensive AI-related keywords for strict filtering
-AI_KEYWORDS = [
-    # Core AI terms
-    "artificial intelligence", "machine learning", "deep learning", "neural network",
-    "natural language processing", "computer vision", "robotics", "automation",
-    
-    # AI Companies & Products
-    "openai", "anthropic", "claude", "chatgpt", "gpt", "gemini", "bard",
-    "midjourney", "stable diffusion", "dall-e", "runwayml", "replicate",
-    "hugging face", "transformers", "pytorch", "tensorflow", "keras",
-    
-    # AI Tools & Platforms
-    "langchain", "vector database", "embedding", "llm", "large language model",
-    "generative ai", "ai assistant", "chatbot", "ai tool", "ai platform",
-    "ai api", "ai service", "ai model", "ai framework", "ai library",
-    
-    # AI Applications
-    "ai writing", "ai image", "ai video", "ai code", "ai research",
-    "ai startup", "ai company", "ai news", "ai blog", "ai tutorial",
-    "prompt engineering", "fine-tuning", "rag", "retrieval augmented",
-    
-    # Technical AI terms
-    "transformer", "attention mechanism", "diffusion model", "gan", 
-    "reinforcement learning", "supervised learning", "unsupervised learning",
-    "gradient descent", "backpropagation", "convolutional", "recurrent"
-]
-
-# AI-focused domains (known AI companies and platforms)
-AI_DOMAINS = [
-    "openai.com", "anthropic.com", "google.ai", "microsoft.com/ai",
-    "huggingface.co", "replicate.com", "runway.com", "midjourney.com",
-    "stability.ai", "cohere.ai", "ai21.com", "deepmind.com",
-    "nvidia.com/ai", "ibm.com/watson", "aws.amazon.com/machine-learning",
-    "azure.microsoft.com/cognitive-services", "cloud.google.com/ai",
-    "paperswithcode.com", "arxiv.org", "towards", "medium.com",
-    "github.com", "kaggle.com", "fast.ai", "deeplearning.ai"
-]
-
-def is_ai_related(title: str, snippet: str, link: str) -> bool:
-    """
-    Strict AI filtering function that checks if content is AI-related
-    """
-    # Combine title and snippet for analysis
-    text_content = f"{title} {snippet}".lower()
-    domain = link.lower()
-    
-    # Check for AI-related domains first (high confidence)
-    for ai_domain in AI_DOMAINS:
-        if ai_domain in domain:
-            return True
-    
-    # Check for AI keywords in content
-    keyword_matches = 0
-    for keyword in AI_KEYWORDS:
-        if keyword in text_content:
-            keyword_matches += 1
-            
-    # Require at least 2 keyword matches for strict filtering
-    # or 1 match if it's a core AI term
-    core_ai_terms = ["artificial intelligence", "machine learning", "deep learning", 
-                     "neural network", "openai", "chatgpt", "claude", "gemini"]
-    
-    has_core_term = any(term in text_content for term in core_ai_terms)
-    
-    return keyword_matches >= 2 or (keyword_matches >= 1 and has_core_term)
+# Ranked suggestions, learned from the queries that are actually served and
+# keyed like the search cache
+suggestion_index = SuggestionIndex.from_env(key=query_rewriter.key)
+
+@app.on_event("startup")
+async def build_suggestion_index():
+    queries = load_seed_queries(os.getenv("SUGGESTIONS_SEED_FILE"))
+    # Queries served before a restart are in the event log
+    if isinstance(event_log.sink, JsonlFileSink):
+        queries += await asyncio.to_thread(logged_suggestion_queries, event_log.sink.directory,
+                                           suggestion_index.half_life)
+    suggestion_index.build(queries)
+
+# Searches served and results clicked (EVENT_LOG), queued without waiting
+# and written in batches in the background
+event_log = EventLog.from_env()
+
+@app.on_event("startup")
+async def start_event_log():
+    await event_log.start()
+
+@app.on_event("shutdown")
+async def close_event_log():
+    await event_log.close()
+
+class ClickEvent(BaseModel):
+    query: str = Field(max_length=512)
+    link: str = Field(max_length=2048)
+    position: Optional[int] = None
+    page: Optional[int] = 1
+
+def log_search(request: SearchRequest, results: int, search_time: float, endpoint: str) -> None:
+    event_log.record(
+        "search",
+        query=normalize_query(request.query),
+        page=request.page,
+        results=results,
+        ms=round(search_time * 1000, 1),
+        endpoint=endpoint
+    )
+
+# AI relevance filter for upstream results (RELEVANCE_MODE, default hybrid
+# semantic scoring plus the keyword and domain rules)
+relevance_stage = RelevanceStage.from_env()
+
+# Filtered results served per page, and raw results requested per upstream call
+RESULTS_PER_PAGE = 10
+UPSTREAM_PAGE_SIZE = 20
+
+# Compressed, conditional response bodies (COMPRESSION_*)
+response_encoder = ResponseEncoder.from_env()
+
+def encoded_page(response: SearchResponse) -> EncodedPage:
+    """
+    Everything in the response body but search_time and query, which
+    differ per request, serialized and compressed on first use
+    """
+    if response._encoded is None:
+        body = response.model_dump_json(include={"results", "total_results"})
+        response._encoded = response_encoder.page(body[:-1].encode() + b",")
+    return response._encoded
+
+def send_response(response: SearchResponse, search_time: float, query: str,
+                  http_request: Request, headers: Optional[dict] = None) -> Response:
+    """
+    `response` as sent for this request, with its own search time and query
+    """
+    with stage_seconds.time(stage="serialization"):
+        tail = json.dumps({"search_time": search_time, "query": query},
+                          ensure_ascii=False, separators=(",", ":"))
+        return response_encoder.respond(encoded_page(response), tail[1:].encode(), query,
+                                        http_request.headers, headers)
+
+# Filtered search responses keyed on (query key, page), so equivalent
+# queries share an entry (queries.py), encoded as they are cached so the
+# size counts every stored encoding
+search_cache = ResultCache.from_env(sizeof=lambda response: encoded_page(response).nbytes)
+
+# In-flight upstream searches, shared by concurrent identical requests
+search_flight = SingleFlight()
+
+# Persistent second tier behind search_cache, shared by every worker
+result_store = MongoResultStore.from_env()
+
+@app.on_event("startup")
+async def start_result_store():
+    await result_store.start()
+
+@app.on_event("shutdown")
+async def close_result_store():
+    await result_store.close()
 
 @app.get("/api/health")
 async def health_check():
     return {"status": "healthy", "message": "AI Search Engine API is running"}
 
+@app.get("/api/ready")
+async def readiness_check():
+    """
+    200 once this worker has finished starting up, for the entrypoint and
+    load balancers to poll; 503 while starting or shutting down
+    """
+    if not ready:
+        raise HTTPException(status_code=503, detail="Starting up")
+    return {"status": "ready", "worker": os.getpid()}
+
+@app.get("/api/metrics")
+async def metrics():
+    return Response(worker_metrics.render(), media_type=CONTENT_TYPE_LATEST)
+
+@app.get("/api/cache/stats")
+async def cache_stats():
+    return {
+        "worker": os.getpid(),
+        **search_cache.stats(),
+        "single_flight": search_flight.stats(),
+        "pagination": paginator.stats(),
+        "suggestions": suggestion_index.stats(),
+        "store": result_store.stats(),
+        "upstream": serpapi_client.stats(),
+        "providers": federated_search.stats(),
+        "local_index": local_index.stats(),
+        "categories": category_catalogue.stats(),
+        "relevance": relevance_stage.stats(),
+        "rate_limits": rate_limiter.stats(),
+        "events": event_log.stats(),
+        "queries": query_rewriter.stats(),
+        "warming": cache_warmer.stats(),
+        "encoding": response_encoder.stats()
+    }
+
+async def fetch_upstream_page(query: str, start: int) -> Tuple[List[SearchResult], int, bool]:
+    """
+    Fetch one page window at `start` from every search provider and keep
+    only the AI-related results of the fused list.
+
+    Returns the filtered results (positions are assigned per served page),
+    how many results the longest provider list held and whether any
+    provider has more after this window.
+    """
+    # Fan out to the providers concurrently; partial if some miss their deadline
+    organic_results, raw_count, more = await federated_search.search(
+        query, start, UPSTREAM_PAGE_SIZE
+    )
+    filtered_results = []
+    
+    with stage_seconds.time(stage="filtering"):
+        # Skip results missing essential fields
+        candidates = [
+            result for result in organic_results
+            if result.get("title", "") and result.get("link", "")
+        ]
+        
+        # Score the whole page at once against the AI relevance rules
+        for result, relevant in zip(candidates, relevance_stage.select(candidates)):
+            if relevant:
+                filtered_results.append(SearchResult(
+                    title=result["title"],
+                    link=result["link"],
+                    snippet=result.get("snippet", "") or "No description available",
+                    displayed_link=result.get("displayed_link", result["link"]),
+                    position=0
+                ))
+    
+    results_seen.inc(len(organic_results))
+    results_filtered_out.inc(len(organic_results) - len(filtered_results))
+    local_index.add(result.model_dump(exclude={"position"}) for result in filtered_results)
+    return filtered_results, raw_count, more
+
+# Per-query cursors over filtered upstream pages, so every served page is full;
+# results are deduplicated across pages by canonical URL and collapsed with
+# near-duplicate copies by their title and snippet
+paginator = Paginator.from_env(fetch_upstream_page, page_size=RESULTS_PER_PAGE,
+                               upstream_page_size=UPSTREAM_PAGE_SIZE,
+                               key=lambda result: canonical_url(result.link),
+                               fingerprint=lambda result: result_fingerprint(
+                                   result.title, result.snippet),
+                               query_key=query_rewriter.key)
+
+async def fetch_filtered_results(query: str, page: int) -> List[SearchResult]:
+    """
+    One page of AI-related results, numbered from 1 within the page
+    """
+    page_results = await paginator.get_page(query, page)
+    return [
+        result.model_copy(update={"position": i + 1})
+        for i, result in enumerate(page_results)
+    ]
+
+async def load_stored_response(cache_key) -> Optional[SearchResponse]:
+    """
+    Response from the persistent store, promoted into the memory cache
+    """
+    stored = await result_store.get(*cache_key)
+    if result_store.enabled:
+        cache_lookups.inc(tier="store", result="miss" if stored is None else "hit")
+    if stored is None:
+        return None
+    
+    payload, expires_in = stored
+    response = SearchResponse(**payload)
+    search_cache.set(cache_key, response, ttl=min(search_cache.ttl, expires_in))
+    return response
+
+async def search_and_cache(request: SearchRequest, cache_key) -> SearchResponse:
+    response = await load_stored_response(cache_key)
+    if response is not None:
+        return response
+    return await fetch_and_cache(request, cache_key)
+
+async def fetch_and_cache(request: SearchRequest, cache_key) -> SearchResponse:
+    """
+    Search upstream and store the response in both cache tiers
+    """
+    start_time = time.time()
+    filtered_results = await fetch_filtered_results(request.query, request.page)
+    
+    response = SearchResponse(
+        results=filtered_results,
+        total_results=len(filtered_results),
+        search_time=time.time() - start_time,
+        query=request.query
+    )
+    search_cache.set(cache_key, response)
+    result_store.set_later(*cache_key, response.model_dump())
+    return response
+
+def lookup_cached_response(request: SearchRequest, cache_key) -> Optional[SearchResponse]:
+    """
+    Fresh cached response, or else the last good one (stale-while-revalidate)
+    while a single background refresh replaces it
+    """
+    response = search_cache.get(cache_key)
+    if response is not None:
+        cache_lookups.inc(tier="memory", result="hit")
+        return response
+    
+    response = search_cache.get_stale(cache_key)
+    cache_lookups.inc(tier="memory", result="miss" if response is None else "stale")
+    if response is not None and cache_key not in search_flight:
+        refresh = asyncio.ensure_future(refresh_search(request, cache_key))
+        refresh.add_done_callback(report_refresh_failure)
+    return response
+
+@background_priority
+async def refresh_search(request: SearchRequest, cache_key) -> SearchResponse:
+    # Skips the result store, which may hold the very copy that went stale
+    return await refetch_search(request, cache_key)
+
+@background_priority
+async def refresh_category(category: dict) -> SearchResponse:
+    """
+    A fresh first page for a category, bypassing both cache tiers (and
+    refilling them) so the snapshot is as new as the refresh
+    """
+    request = SearchRequest(query=category["query"], page=1)
+    return await refetch_search(request, search_cache_key(request.query, request.page))
+
+async def refetch_search(request: SearchRequest, cache_key) -> SearchResponse:
+    """
+    Search upstream from scratch and refill both cache tiers, shared with
+    an identical search already in flight
+    """
+    async def fetch() -> SearchResponse:
+        paginator.forget(request.query)
+        return await fetch_and_cache(request, cache_key)
+    
+    return await search_flight.do(cache_key, fetch)
+
+# First pages of the home page categories, refreshed in the background
+category_catalogue = CategoryCatalogue.from_env(
+    refresh_category,
+    dump=lambda response: response.model_dump(),
+    load=lambda payload: SearchResponse(**payload)
+)
+
+@app.on_event("startup")
+async def start_category_refresh():
+    await category_catalogue.start()
+
+@app.on_event("shutdown")
+async def stop_category_refresh():
+    await category_catalogue.close()
+
+@background_priority
+async def warm_search(cache_key) -> SearchResponse:
+    # The key's words are sorted; search for the query as it was asked
+    _, page = cache_key
+    cached = search_cache.peek(cache_key)
+    query = cached.query if cached is not None else cache_key[0]
+    return await refetch_search(SearchRequest(query=query, page=page), cache_key)
+
+# Popularity of (normalized query, page) keys; hot entries of search_cache
+# are reloaded or refreshed before they expire, within CACHE_WARM_BUDGET
+# upstream refreshes a minute
+cache_warmer = CacheWarmer.from_env(search_cache.expires_in, load_stored_response, warm_search)
+
+@app.on_event("startup")
+async def start_cache_warmer():
+    # Searches already in the event log count, so a restart starts warm
+    if cache_warmer.enabled and isinstance(event_log.sink, JsonlFileSink):
+        since = time.time() - cache_warmer.decay_interval
+        cache_warmer.seed(await asyncio.to_thread(count_logged_searches,
+                                                  event_log.sink.directory, since))
+    await cache_warmer.start()
+
+@app.on_event("shutdown")
+async def stop_cache_warmer():
+    await cache_warmer.close()
+
+def count_logged_searches(directory: str, since: float) -> List[Tuple[Tuple[str, int], int]]:
+    if not os.path.isdir(directory):
+        return []
+    searches = Counter(
+        search_cache_key(event["query"], event.get("page") or 1)
+        for event in read_events(directory, since)
+        if event.get("type") == "search" and event.get("query")
+        # Batch jobs' searches are not what users come back for
+        and event.get("endpoint") != "bulk"
+    )
+    return list(searches.items())
+
+def logged_suggestion_queries(directory: str, half_life: float) -> List[Tuple[str, float]]:
+    """
+    Queries the event log shows were served with results, the ones the
+    suggestion index records, each weighted as decayed since it was served
+    """
+    if not os.path.isdir(directory):
+        return []
+    now = time.time()
+    weights: Dict[str, float] = {}
+    # Searches more than four half-lives old would weigh under 1/16 each
+    for event in read_events(directory, now - 4 * half_life):
+        if (event.get("type") == "search" and event.get("query") and event.get("results")
+                and event.get("endpoint") != "bulk"):
+            weight = 2.0 ** (-(now - event["at"]) / half_life)
+            weights[event["query"]] = weights.get(event["query"], 0.0) + weight
+    return list(weights.items())
+
+def local_search_response(request: SearchRequest) -> Optional[SearchResponse]:
+    """
+    A page answered from the local index, or None if it has nothing
+    """
+    start_time = time.time()
+    with stage_seconds.time(stage="local_index"):
+        hits = local_index.search(request.query, k=RESULTS_PER_PAGE,
+                                  offset=(request.page - 1) * RESULTS_PER_PAGE)
+    if local_index.enabled:
+        cache_lookups.inc(tier="local", result="hit" if hits else "miss")
+    if not hits:
+        return None
+    
+    results = [SearchResult(**hit, position=i + 1) for i, hit in enumerate(hits)]
+    return SearchResponse(
+        results=results,
+        total_results=len(results),
+        search_time=time.time() - start_time,
+        query=request.query
+    )
+
+def enrich_later(request: SearchRequest, cache_key) -> None:
+    """
+    Run the upstream search in the background so it replaces a local answer
+    """
+    if cache_key not in search_flight:
+        enrich = asyncio.ensure_future(
+            search_flight.do(cache_key, lambda: enrich_search(request, cache_key))
+        )
+        enrich.add_done_callback(report_refresh_failure)
+
+@background_priority
+async def enrich_search(request: SearchRequest, cache_key) -> SearchResponse:
+    return await search_and_cache(request, cache_key)
+
+def report_refresh_failure(task: "asyncio.Task[SearchResponse]") -> None:
+    if not task.cancelled() and task.exception() is not None:
+        print(f"Background refresh error: {task.exception()}")
+
+async def search_uncached(request: SearchRequest, cache_key) -> SearchResponse:
+    """
+    A response for a search the memory cache has nothing for
+    """
+    # Answer from results seen before and enrich from upstream behind it
+    if LOCAL_INDEX_SERVE == "first":
+        response = local_search_response(request)
+        if response is not None:
+            enrich_later(request, cache_key)
+            return response
+    
+    # Concurrent identical searches share one upstream call
+    try:
+        return await search_flight.do(cache_key, lambda: search_and_cache(request, cache_key))
+    except (CircuitOpenError, UpstreamError):
+        # Upstream unavailable: fall back to results served before
+        response = local_search_response(request)
+        if response is None:
+            raise
+        return response
+
 @app.post("/api/search", response_model=SearchResponse)
-async def search_ai_sites(request: SearchRequest):
+async def search_ai_sites(request: SearchRequest, http_request: Request):
     """
     Search the web for AI-related content using SerpAPI
     """
+    await enforce_rate_limit(http_request, "search")
     try:
-        import time
         start_time = time.time()
         
-        # Get API key
-        serpapi_key = os.getenv("SERPAPI_KEY")
-        if not serpapi_key:
-            raise HTTPException(status_code=500, detail="SerpAPI key not configured")
-        
-        # Enhanced query for better AI results
-        enhanced_query = f"{request.query} AI artificial intelligence machine learning"
-        
-        # SerpAPI parameters
-        params = {
-            "engine": "google",
-            "q": enhanced_query,
-            "num": 20,  # Get more results for better filtering
-            "start": (request.page - 1) * 10,
-            "api_key": serpapi_key,
-            "gl": "us",
-            "hl": "en"
-        }
-        
-        # Perform search
-        search = GoogleSearch(params)
-        results = search.get_dict()
-        
-        if "error" in results:
-            raise HTTPException(status_code=500, detail=f"Search API error: {results['error']}")
-        
-        # Process and filter results
-        organic_results = results.get("organic_results", [])
-        filtered_results = []
-        
-        for i, result in enumerate(organic_results):
-            title = result.get("title", "")
-            snippet = result.get("snippet", "")
-            link = result.get("link", "")
-            displayed_link = result.get("displayed_link", link)
-            
-            # Skip if essential fields are missing
-            if not title or not link:
-                continue
-                
-            # Apply strict AI filtering
-            if is_ai_related(title, snippet, link):
-                filtered_results.append(SearchResult(
-                    title=title,
-                    link=link,
-                    snippet=snippet or "No description available",
-                    displayed_link=displayed_link,
-                    position=len(filtered_results) + 1
-                ))
+        # Serve repeated queries straight from the cache; a miss falls
+        # through to the persistent store, then to SerpAPI
+        cache_key = search_cache_key(request.query, request.page)
+        response = lookup_cached_response(request, cache_key)
+        if response is None:
+            response = await search_uncached(request, cache_key)
         
-        # Limit to top 10 results per page
-        filtered_results = filtered_results[:10]
+        if response.results:
+            suggestion_index.record(request.query)
+        cache_warmer.record(cache_key)
+        log_search(request, len(response.results), time.time() - start_time, "search")
         
-        search_time = time.time() - start_time
+        return send_response(response, time.time() - start_time, request.query, http_request)
         
-        return SearchResponse(
-            results=filtered_results,
-            total_results=len(filtered_results),
-            search_time=search_time,
-            query=request.query
+    except CircuitOpenError as e:
+        print(f"Search error: {str(e)}")
+        search_errors.inc(endpoint="search")
+        raise HTTPException(
+            status_code=503,
+            detail="Search is temporarily unavailable, please retry shortly",
+            headers={"Retry-After": str(math.ceil(e.retry_after))}
         )
-        
+    except UpstreamError as e:
+        print(f"Search error: {str(e)}")
+        search_errors.inc(endpoint="search")
+        raise HTTPException(status_code=502, detail=f"Search upstream failed: {str(e)}")
     except Exception as e:
         print(f"Search error: {str(e)}")
+        search_errors.inc(endpoint="search")
         raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
 
-@app.get("/api/suggestions")
-async def get_search_suggestions(q: str):
+def ndjson_frame(frame: dict) -> str:
+    with stage_seconds.time(stage="serialization"):
+        return json.dumps(frame) + "\n"
+
+def result_frame(result: SearchResult) -> str:
+    # The model serializes itself, without a round trip through a dict
+    with stage_seconds.time(stage="serialization"):
+        return f'{{"type": "result", "result": {result.model_dump_json()}}}\n'
+
+async def stream_search_frames(request: SearchRequest) -> AsyncIterator[str]:
     """
-    Get AI-related search suggestions
+    One "result" frame per filtered result as soon as it is available,
+    then a "summary" frame (or an "error" frame if the search fails)
+    """
+    start_time = time.time()
+    results = []
+    
+    try:
+        cache_key = search_cache_key(request.query, request.page)
+        cached = lookup_cached_response(request, cache_key)
+        if cached is None:
+            cached = await load_stored_response(cache_key)
+        
+        if cached is not None:
+            results = cached.results
+            for result in results:
+                yield result_frame(result)
+        else:
+            async for result in paginator.iter_page(request.query, request.page):
+                result = result.model_copy(update={"position": len(results) + 1})
+                results.append(result)
+                yield result_frame(result)
+            
+            response = SearchResponse(
+                results=results,
+                total_results=len(results),
+                search_time=time.time() - start_time,
+                query=request.query
+            )
+            search_cache.set(cache_key, response)
+            result_store.set_later(*cache_key, response.model_dump())
+    
+    except (CircuitOpenError, UpstreamError) as e:
+        print(f"Search error: {str(e)}")
+        # Upstream unavailable: fall back to results served before, unless
+        # part of the page has already been sent
+        fallback = None if results else local_search_response(request)
+        if fallback is None:
+            search_errors.inc(endpoint="stream")
+            frame = {"type": "error", "detail": f"Search failed: {str(e)}"}
+            if isinstance(e, CircuitOpenError):
+                frame = {
+                    "type": "error",
+                    "detail": "Search is temporarily unavailable, please retry shortly",
+                    "retry_after": math.ceil(e.retry_after)
+                }
+            yield ndjson_frame(frame)
+            return
+        results = fallback.results
+        for result in results:
+            yield result_frame(result)
+    except Exception as e:
+        print(f"Search error: {str(e)}")
+        search_errors.inc(endpoint="stream")
+        yield ndjson_frame({"type": "error", "detail": f"Search failed: {str(e)}"})
+        return
+    
+    if results:
+        suggestion_index.record(request.query)
+    cache_warmer.record(search_cache_key(request.query, request.page))
+    log_search(request, len(results), time.time() - start_time, "stream")
+    
+    yield ndjson_frame({
+        "type": "summary",
+        "total_results": len(results),
+        "search_time": time.time() - start_time,
+        "query": request.query
+    })
+
+@app.post("/api/search/stream")
+async def stream_search_ai_sites(request: SearchRequest, http_request: Request):
+    """
+    Streaming variant of /api/search that sends results as NDJSON frames
+    """
+    await enforce_rate_limit(http_request, "search")
+    return StreamingResponse(
+        stream_search_frames(request),
+        media_type="application/x-ndjson",
+        # Keep nginx from buffering the stream
+        headers={"X-Accel-Buffering": "no"}
+    )
+
+# Searches accepted in one bulk request, and bulk searches that may miss
+# the cache at once across all bulk requests; the rest wait their turn
+BULK_MAX_SEARCHES = int(os.getenv("BULK_MAX_SEARCHES", "500"))
+bulk_slots = asyncio.Semaphore(int(os.getenv("BULK_CONCURRENCY", "8")))
+
+class BulkSearchRequest(BaseModel):
+    searches: List[SearchRequest] = Field(min_length=1, max_length=BULK_MAX_SEARCHES)
+
+@background_priority
+async def bulk_search(request: SearchRequest, cache_key) -> SearchResponse:
+    """
+    One search of a bulk request: a cache hit at once, a miss once it has
+    a bulk slot, with its upstream calls queued behind interactive ones
+    """
+    response = lookup_cached_response(request, cache_key)
+    if response is not None:
+        return response
+    async with bulk_slots:
+        return await search_uncached(request, cache_key)
+
+async def bulk_result_frame(request: SearchRequest, indexes: List[int]) -> dict:
+    """
+    The outcome of one distinct search, for every position it held in the
+    bulk request, with the status /api/search would have answered
+    """
+    start_time = time.time()
+    frame = {"type": "result", "indexes": indexes, "query": request.query, "page": request.page}
+    try:
+        response = await bulk_search(request, search_cache_key(request.query, request.page))
+    except CircuitOpenError as e:
+        print(f"Bulk search error: {str(e)}")
+        search_errors.inc(endpoint="bulk")
+        return {**frame, "status": 503,
+                "detail": "Search is temporarily unavailable, please retry shortly",
+                "retry_after": math.ceil(e.retry_after)}
+    except UpstreamError as e:
+        print(f"Bulk search error: {str(e)}")
+        search_errors.inc(endpoint="bulk")
+        return {**frame, "status": 502, "detail": f"Search upstream failed: {str(e)}"}
+    except Exception as e:
+        print(f"Bulk search error: {str(e)}")
+        search_errors.inc(endpoint="bulk")
+        return {**frame, "status": 500, "detail": f"Search failed: {str(e)}"}
+    
+    search_time = time.time() - start_time
+    log_search(request, len(response.results), search_time, "bulk")
+    return {
+        **frame,
+        "status": 200,
+        "results": [result.model_dump() for result in response.results],
+        "total_results": response.total_results,
+        "search_time": search_time
+    }
+
+async def bulk_search_frames(searches: List[SearchRequest], distinct) -> AsyncIterator[str]:
+    """
+    A "result" frame per distinct search as each one completes, then a
+    "summary" frame
     """
-    suggestions = [
-        "OpenAI ChatGPT",
-        "Anthropic Claude",
-        "Google Gemini",
-        "Midjourney AI art",
-        "Stable Diffusion",
-        "Hugging Face transformers",
-        "LangChain development",
-        "AI code generation",
-        "Machine learning tutorials",
-        "AI news and updates"
+    start_time = time.time()
+    tasks = [
+        asyncio.ensure_future(bulk_result_frame(request, indexes))
+        for request, indexes in distinct.values()
     ]
+    statuses = Counter()
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            frame = await next_done
+            statuses[str(frame["status"])] += 1
+            yield ndjson_frame(frame)
+    finally:
+        # Stop the searches of a client that went away (a search shared
+        # with other requests carries on for them)
+        for task in tasks:
+            task.cancel()
+    
+    yield ndjson_frame({
+        "type": "summary",
+        "searches": len(searches),
+        "distinct": len(distinct),
+        "statuses": dict(statuses),
+        "search_time": time.time() - start_time
+    })
+
+@app.post("/api/search/bulk")
+async def bulk_search_ai_sites(bulk: BulkSearchRequest, http_request: Request):
+    """
+    Run many searches through the cache and upstream path at once and
+    stream each one's results as NDJSON frames as it completes; repeated
+    searches run once
+    """
+    # Searches for the same cache key run once, answered for every index
+    distinct = {}
+    for index, request in enumerate(bulk.searches):
+        key = search_cache_key(request.query, request.page)
+        distinct.setdefault(key, (request, []))[1].append(index)
+    
+    await enforce_rate_limit(http_request, "bulk", cost=len(distinct))
+    return StreamingResponse(
+        bulk_search_frames(bulk.searches, distinct),
+        media_type="application/x-ndjson",
+        headers={"X-Accel-Buffering": "no"}
+    )
+
+@app.get("/api/categories")
+async def list_categories():
+    """
+    The category catalogue shown on the home page
+    """
+    return {"categories": category_catalogue.categories}
+
+@app.get("/api/categories/{category_id}", response_model=SearchResponse)
+async def get_category_results(category_id: str, http_request: Request,
+                               page: int = Query(default=1, ge=1)):
+    """
+    Results for one category; the first page is served from its snapshot
+    """
+    category = category_catalogue.get(category_id)
+    if category is None:
+        raise HTTPException(status_code=404, detail=f"Unknown category: {category_id}")
     
-    # Filter suggestions based on query
-    if q:
-        filtered_suggestions = [s for s in suggestions if q.lower() in s.lower()]
-        return {"suggestions": filtered_suggestions[:5]}
+    request = SearchRequest(query=category["query"], page=page)
+    snapshot = category_catalogue.snapshot(category_id) if page == 1 else None
+    if category_catalogue.enabled and page == 1:
+        cache_lookups.inc(tier="snapshot", result="miss" if snapshot is None else "hit")
+    if snapshot is None:
+        return await search_ai_sites(request, http_request)
     
-    return {"suggestions": suggestions[:5]}
+    start_time = time.time()
+    response, age = snapshot
+    if response.results:
+        suggestion_index.record(request.query)
+    log_search(request, len(response.results), time.time() - start_time, "category")
+    # Browsers keep the page and revalidate it with If-None-Match on the
+    # next click, getting a 304 while the snapshot is unchanged
+    return send_response(response, time.time() - start_time, request.query, http_request,
+                         headers={"Age": str(int(age)), "Cache-Control": "no-cache"})
+
+@app.get("/api/suggestions")
+async def get_search_suggestions(q: str, http_request: Request):
+    """
+    Get AI-related search suggestions
+    """
+    await enforce_rate_limit(http_request, "suggest")
+    return {"suggestions": suggestion_index.suggest(q, k=5)}
+
+@app.post("/api/events", status_code=204)
+async def log_event(http_request: Request):
+    """
+    Record a result click from the frontend. Fire-and-forget: answered
+    before the event is written, and the body is parsed whatever its
+    content type, since browsers send beacons as text/plain.
+    """
+    await enforce_rate_limit(http_request, "events")
+    try:
+        event = ClickEvent.model_validate_json(await http_request.body())
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_input=False))
+    event_log.record("click", query=normalize_query(event.query), link=event.link,
+                     position=event.position, page=event.page)
+    # A served search that led to a click counts again towards its
+    # suggestion rank; clicks cannot add queries of their own
+    if event.query in suggestion_index:
+        suggestion_index.record(event.query)
+    return Response(status_code=204)
+
+# Registered last, so it runs after every other startup hook
+@app.on_event("startup")
+async def mark_ready():
+    global ready
+    ready = True
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
+    # Production runs use gunicorn (gunicorn.conf.py); this is the same
+    # profile without it: one worker per CPU, uvloop and httptools if installed
+    workers = worker_count()
+    if workers > 1:
+        prepare_worker_state()
+    uvicorn.run("server:app", host="0.0.0.0", port=int(os.getenv("PORT", "8001")),
+                workers=workers, loop="auto", http="auto")
\ No newline at end of file
@@ -0,0 +1,55 @@
+"""
+Request coalescing for identical concurrent upstream calls
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls that share a key into one execution.
+
+    The first caller for a key starts the work as a task; callers that
+    arrive while it is still running await the same task and receive the
+    same result (or exception). The key is released as soon as the task
+    finishes, so later calls start fresh.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, "asyncio.Task[Any]"] = {}
+        self.executions = 0
+        self.shared = 0
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._inflight
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            self.executions += 1
+            task.add_done_callback(lambda t: self._release(key, t))
+        else:
+            self.shared += 1
+
+        # Shield the shared task so one caller disconnecting does not
+        # cancel the work every other caller is waiting on
+        return await asyncio.shield(task)
+
+    def _release(self, key: Hashable, task: "asyncio.Task[Any]") -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the exception as retrieved in case every waiter went away
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": len(self._inflight),
+            "executions": self.executions,
+            "shared": self.shared,
+        }
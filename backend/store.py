@@ -0,0 +1,194 @@
+"""
+Persistent second-tier cache for search responses, kept in MongoDB.
+
+Sits behind the in-process ResultCache: a memory miss is looked up here
+before going upstream, so a warm cache survives restarts and deploys and
+is shared by every worker. Writes happen in the background and never hold
+up a response; if Mongo is unreachable, the store is skipped for a while
+and searches carry on without it.
+
+A response read back from the store is served as a fresh cache hit, so
+stored responses live as long as cached ones: SEARCH_STORE_TTL defaults
+to SEARCH_CACHE_TTL. A longer store TTL serves responses that much older.
+"""
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional, Set, Tuple
+
+from cache import normalize_query
+from lazy import LazyModule
+
+# The driver is imported on first use, so servers without MONGO_URL never load it
+motor_asyncio = LazyModule("motor.motor_asyncio")
+pymongo = LazyModule("pymongo")
+
+
+class MongoResultStore:
+    """
+    Search responses stored one document per (normalized query, page).
+
+    Documents carry an `expires_at` date covered by a TTL index, so Mongo
+    deletes them itself; lookups also filter on it, since the TTL monitor
+    only runs about once a minute.
+    """
+
+    def __init__(
+        self,
+        url: Optional[str],
+        collection: str = "search_results",
+        ttl: float = 600.0,
+        max_pool_size: int = 50,
+        timeout: float = 2.0,
+        retry_after: float = 30.0,
+        clock=time.monotonic,
+    ):
+        self.url = url
+        self.collection_name = collection
+        self.ttl = ttl
+        self.max_pool_size = max_pool_size
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.clock = clock
+        self._client = None
+        self._collection = None
+        self._writes: Set["asyncio.Task[None]"] = set()
+        # Monotonic time until which the store is skipped after an error
+        self._suspended_until = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.errors = 0
+
+    @classmethod
+    def from_env(cls, **kwargs) -> "MongoResultStore":
+        return cls(
+            os.getenv("MONGO_URL"),
+            collection=os.getenv("SEARCH_STORE_COLLECTION", "search_results"),
+            ttl=float(os.getenv("SEARCH_STORE_TTL", os.getenv("SEARCH_CACHE_TTL", "600"))),
+            max_pool_size=int(os.getenv("MONGO_MAX_POOL_SIZE", "50")),
+            timeout=float(os.getenv("MONGO_TIMEOUT", "2")),
+            **kwargs,
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.url)
+
+    @property
+    def collection(self):
+        """
+        Collection handle on a lazily created, pooled motor client
+        """
+        if self._collection is None:
+            timeout_ms = int(self.timeout * 1000)
+            self._client = motor_asyncio.AsyncIOMotorClient(
+                self.url,
+                maxPoolSize=self.max_pool_size,
+                serverSelectionTimeoutMS=timeout_ms,
+                connectTimeoutMS=timeout_ms,
+                socketTimeoutMS=timeout_ms,
+                tz_aware=True,
+            )
+            database = self._client.get_default_database(default="app_db")
+            self._collection = database[self.collection_name]
+        return self._collection
+
+    async def start(self) -> None:
+        """
+        Create the indexes; safe to call on every startup
+        """
+        if not self.enabled:
+            return
+        try:
+            await self.collection.create_index(
+                [("query", pymongo.ASCENDING), ("page", pymongo.ASCENDING)], unique=True, name="query_page"
+            )
+            await self.collection.create_index("expires_at", expireAfterSeconds=0, name="expiry")
+        except pymongo.errors.PyMongoError as e:
+            self._failed("index setup", e)
+
+    async def close(self) -> None:
+        if self._writes:
+            await asyncio.wait(self._writes, timeout=self.timeout)
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+            self._collection = None
+
+    def _available(self) -> bool:
+        return self.enabled and self.clock() >= self._suspended_until
+
+    def _failed(self, operation: str, error: Exception) -> None:
+        self.errors += 1
+        self._suspended_until = self.clock() + self.retry_after
+        print(f"Result store {operation} failed, skipping it for {self.retry_after:.0f}s: {str(error)}")
+
+    async def get(self, query: str, page: int) -> Optional[Tuple[Dict[str, Any], float]]:
+        """
+        Stored response for a query page and its remaining lifetime in
+        seconds, or None
+        """
+        if not self._available():
+            return None
+
+        now = datetime.now(timezone.utc)
+        try:
+            document = await self.collection.find_one(
+                {"query": normalize_query(query), "page": page, "expires_at": {"$gt": now}},
+                {"_id": 0, "response": 1, "expires_at": 1},
+            )
+        except pymongo.errors.PyMongoError as e:
+            self._failed("read", e)
+            return None
+
+        if document is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return document["response"], (document["expires_at"] - now).total_seconds()
+
+    async def set(self, query: str, page: int, response: Dict[str, Any]) -> None:
+        if not self._available():
+            return
+
+        now = datetime.now(timezone.utc)
+        key = normalize_query(query)
+        try:
+            await self.collection.replace_one(
+                {"query": key, "page": page},
+                {
+                    "query": key,
+                    "page": page,
+                    "response": response,
+                    "stored_at": now,
+                    "expires_at": now + timedelta(seconds=self.ttl),
+                },
+                upsert=True,
+            )
+            self.writes += 1
+        except pymongo.errors.PyMongoError as e:
+            self._failed("write", e)
+
+    def set_later(self, query: str, page: int, response: Dict[str, Any]) -> None:
+        """
+        Write in the background, off the response path
+        """
+        if not self._available():
+            return
+        task = asyncio.ensure_future(self.set(query, page, response))
+        self._writes.add(task)
+        task.add_done_callback(self._writes.discard)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "available": self._available(),
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "writes": self.writes,
+            "pending_writes": len(self._writes),
+            "errors": self.errors,
+        }
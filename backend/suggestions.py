@@ -0,0 +1,432 @@
+"""
+Ranked search suggestions from the queries the engine actually serves.
+
+Every query is indexed under each of its word-starting suffixes ("anthropic
+claude" and "claude"), so a prefix typed from the start of any word maps to
+one contiguous slice of a sorted array found by binary search. A max
+segment tree over the entries' ranks then yields the best k queries in that
+slice in O(k log n), however broad the prefix. Ranking favours queries that
+are both popular and recent: each entry's frequency decays with age.
+
+Entries are keyed by a function of the query, by default its normalized
+text; the server keys them like its search cache, so spellings of one
+search ("machine learning", "learning machine") count towards a single
+suggestion, shown and matched as first seen.
+"""
+import bisect
+import heapq
+import math
+import os
+import time
+from array import array
+from operator import attrgetter, itemgetter
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from cache import normalize_query
+
+# Adjacent keys on a QWERTY keyboard, used to generate likely typos
+KEYBOARD_NEIGHBOURS = {
+    "q": "wa", "w": "qeas", "e": "wrsd", "r": "etdf", "t": "ryfg", "y": "tugh",
+    "u": "yihj", "i": "uojk", "o": "ipkl", "p": "ol", "a": "qwsz", "s": "awedxz",
+    "d": "serfcx", "f": "drtgvc", "g": "ftyhbv", "h": "gyujnb", "j": "huikmn",
+    "k": "jiolm", "l": "kop", "z": "asx", "x": "zsdc", "c": "xdfv", "v": "cfgb",
+    "b": "vghn", "n": "bhjm", "m": "njk",
+}
+
+# Starting vocabulary until real traffic has been recorded
+SEED_SUGGESTIONS = [
+    "OpenAI ChatGPT",
+    "Anthropic Claude",
+    "Google Gemini",
+    "Midjourney AI art",
+    "Stable Diffusion",
+    "Hugging Face transformers",
+    "LangChain development",
+    "AI code generation",
+    "Machine learning tutorials",
+    "AI news and updates"
+]
+
+_NO_RANK = float("-inf")
+
+
+class _Entry:
+    __slots__ = ("key", "text", "display", "weight", "last_seen", "rank", "leading", "inner")
+
+    def __init__(self, key: str, display: str, now: float):
+        self.key = key
+        # What prefixes are matched against
+        self.text = normalize_query(display)
+        self.display = display
+        self.weight = 0.0
+        self.last_seen = now
+        self.rank = _NO_RANK
+        # Positions of this entry's strings in the leading and inner arrays
+        self.leading = -1
+        self.inner: Tuple[int, ...] = ()
+
+
+class _PrefixArray:
+    """
+    Sorted index strings, each owned by a query key, with a max segment
+    tree over the owners' ranks
+    """
+
+    def __init__(self, items: List[Tuple[str, _Entry]]):
+        items.sort(key=itemgetter(0))
+        self.strings = [text for text, _ in items]
+        self.owners = [owner for _, owner in items]
+
+        size = 1
+        while size < len(items):
+            size *= 2
+        self.size = size
+        tree = array("d", [_NO_RANK]) * (2 * size)
+        tree[size:size + len(items)] = array("d", [owner.rank for owner in self.owners])
+        for node in range(size - 1, 0, -1):
+            left = tree[2 * node]
+            right = tree[2 * node + 1]
+            tree[node] = left if left > right else right
+        self.tree = tree
+
+    def raise_rank(self, position: int, rank: float) -> None:
+        # Ranks only grow, so the walk stops at the first ancestor that
+        # already covers the new value
+        tree = self.tree
+        node = position + self.size
+        while node and tree[node] < rank:
+            tree[node] = rank
+            node //= 2
+
+    def span(self, prefix: str, lo: int = 0, hi: Optional[int] = None) -> Tuple[int, int]:
+        """
+        Positions [lo, hi) of the strings starting with `prefix`, searched
+        for within a known enclosing span
+        """
+        strings = self.strings
+        if hi is None:
+            hi = len(strings)
+        lo = bisect.bisect_left(strings, prefix, lo, hi)
+        return lo, bisect.bisect_left(strings, prefix + "\U0010ffff", lo, hi)
+
+    def next_chars(self, depth: int, lo: int, hi: int) -> Set[str]:
+        """
+        Characters found at `depth` in the strings of a span sharing their
+        first `depth` characters, one binary search per distinct character
+        """
+        strings = self.strings
+        chars = set()
+        while lo < hi:
+            text = strings[lo]
+            if len(text) <= depth:
+                lo += 1
+                continue
+            ch = text[depth]
+            chars.add(ch)
+            lo = bisect.bisect_left(strings, text[:depth] + chr(ord(ch) + 1), lo, hi)
+        return chars
+
+    def has_prefix(self, prefix: str, lo: int, hi: int) -> bool:
+        position = bisect.bisect_left(self.strings, prefix, lo, hi)
+        return position < hi and self.strings[position].startswith(prefix)
+
+    def top(self, prefix: str, k: int, seen: Set[_Entry]) -> List[_Entry]:
+        """
+        Up to k best-ranked owners of a string starting with `prefix`,
+        skipping (and then adding to) `seen`
+        """
+        return self.top_spans([self.span(prefix)], k, seen)
+
+    def top_spans(self, spans: List[Tuple[int, int]], k: int, seen: Set[_Entry]) -> List[_Entry]:
+        """
+        Same as top, over the union of several spans
+        """
+        # Start from the canonical nodes covering each span and expand the
+        # best one until k distinct leaves come out
+        tree = self.tree
+        size = self.size
+        heap = []
+        for lo, hi in spans:
+            left, right = lo + size, hi + size
+            while left < right:
+                if left & 1:
+                    heap.append((-tree[left], left))
+                    left += 1
+                if right & 1:
+                    right -= 1
+                    heap.append((-tree[right], right))
+                left //= 2
+                right //= 2
+        heapq.heapify(heap)
+
+        found = []
+        while heap:
+            _, node = heapq.heappop(heap)
+            if node >= size:
+                owner = self.owners[node - size]
+                if owner not in seen:
+                    seen.add(owner)
+                    found.append(owner)
+                    if len(found) == k:
+                        break
+            else:
+                heapq.heappush(heap, (-tree[2 * node], 2 * node))
+                heapq.heappush(heap, (-tree[2 * node + 1], 2 * node + 1))
+        return found
+
+
+class SuggestionIndex:
+    """
+    Prefix index over served queries, ranked by decayed frequency.
+
+    An entry's weight halves every `half_life` seconds without a hit. Its
+    rank, log2(weight) + last_seen / half_life, orders entries exactly as
+    their current decayed weights would, without having to re-decay every
+    entry as time passes.
+
+    Repeat queries update the rank trees in place. Queries seen for the
+    first time wait in a small pending set, scanned on every lookup, until
+    `max_pending` of them are merged into the sorted arrays in one rebuild.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 200_000,
+        half_life: float = 7 * 24 * 3600.0,
+        max_pending: int = 1000,
+        fuzzy_min_prefix: int = 4,
+        clock: Callable[[], float] = time.time,
+        key: Callable[[str], str] = normalize_query,
+    ):
+        self.max_entries = max_entries
+        self.half_life = half_life
+        self.max_pending = max_pending
+        self.fuzzy_min_prefix = fuzzy_min_prefix
+        self.clock = clock
+        self.key = key
+        self._entries: Dict[str, _Entry] = {}
+        self._pending: List[_Entry] = []
+        # Queries by their full text, and by every later word-starting
+        # suffix; matches in the first rank ahead of matches in the second
+        self._leading = _PrefixArray([])
+        self._inner = _PrefixArray([])
+        self.pruned = 0
+        self.rebuilds = 0
+
+    @classmethod
+    def from_env(cls, **kwargs) -> "SuggestionIndex":
+        return cls(
+            max_entries=int(os.getenv("SUGGESTIONS_MAX_ENTRIES", "200000")),
+            half_life=float(os.getenv("SUGGESTIONS_HALF_LIFE", str(7 * 24 * 3600))),
+            max_pending=int(os.getenv("SUGGESTIONS_MAX_PENDING", "1000")),
+            **kwargs,
+        )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, query: str) -> bool:
+        return self.key(query) in self._entries
+
+    def _add(self, query: str, weight: float, now: float) -> Tuple[_Entry, bool]:
+        key = self.key(query)
+        display = " ".join(query.split())
+        entry = self._entries.get(key)
+        created = entry is None
+        if created:
+            entry = self._entries[key] = _Entry(key, display, now)
+        elif normalize_query(display) == entry.text:
+            # The latest capitalization; other spellings of the same key
+            # only add weight, the indexed text stays put
+            entry.display = display
+
+        if now > entry.last_seen:
+            entry.weight *= 2.0 ** (-(now - entry.last_seen) / self.half_life)
+            entry.last_seen = now
+        entry.weight += weight
+        entry.rank = math.log2(entry.weight) + entry.last_seen / self.half_life
+        return entry, created
+
+    def record(self, query: str, weight: float = 1.0, at: Optional[float] = None) -> None:
+        """
+        Count one (or `weight`) occurrences of a served query
+        """
+        if weight <= 0 or not query.strip():
+            return
+        entry, created = self._add(query, weight, self.clock() if at is None else at)
+
+        if created:
+            self._pending.append(entry)
+            if len(self._entries) > self.max_entries:
+                self.prune()
+            elif len(self._pending) >= self.max_pending:
+                self.rebuild()
+        elif entry.leading >= 0:
+            self._leading.raise_rank(entry.leading, entry.rank)
+            for position in entry.inner:
+                self._inner.raise_rank(position, entry.rank)
+
+    def build(self, queries: Iterable[Tuple[str, float]]) -> None:
+        """
+        Bulk-load (query, weight) pairs, e.g. from query logs at startup
+        """
+        now = self.clock()
+        for query, weight in queries:
+            if weight > 0 and query.strip():
+                self._add(query, weight, now)
+
+        if len(self._entries) > self.max_entries:
+            self.prune()
+        else:
+            self.rebuild()
+
+    def prune(self) -> None:
+        """
+        Drop the lowest-ranked entries to get back under 90% of max_entries
+        """
+        target = int(self.max_entries * 0.9)
+        if len(self._entries) > target:
+            keep = heapq.nlargest(target, self._entries.items(), key=lambda item: item[1].rank)
+            self.pruned += len(self._entries) - len(keep)
+            self._entries = dict(keep)
+        self.rebuild()
+
+    def rebuild(self) -> None:
+        """
+        Merge pending queries into the sorted arrays
+        """
+        leading = []
+        inner = []
+        for entry in self._entries.values():
+            text = entry.text
+            leading.append((text, entry))
+            space = text.find(" ")
+            while space != -1:
+                inner.append((text[space + 1:], entry))
+                space = text.find(" ", space + 1)
+
+        self._leading = _PrefixArray(leading)
+        self._inner = _PrefixArray(inner)
+        for position, entry in enumerate(self._leading.owners):
+            entry.leading = position
+            entry.inner = ()
+        for position, entry in enumerate(self._inner.owners):
+            entry.inner += (position,)
+        self._pending = []
+        self.rebuilds += 1
+
+    def _top(self, prefix: str, k: int, seen: Set[_Entry]) -> List[_Entry]:
+        """
+        Best k queries with a word starting with `prefix`; queries that
+        start with it rank ahead of ones that only contain it
+        """
+        rank = attrgetter("rank")
+        fresh_inner = []
+        entries = self._leading.top(prefix, k, seen)
+        if self._pending:
+            word_prefix = " " + prefix
+            fresh_leading = []
+            for entry in self._pending:
+                if entry.text.startswith(prefix):
+                    fresh_leading.append(entry)
+                elif word_prefix in entry.text:
+                    fresh_inner.append(entry)
+            if fresh_leading:
+                entries = heapq.nlargest(k, entries + fresh_leading, key=rank)
+
+        if len(entries) < k:
+            inner = self._inner.top(prefix, k - len(entries), seen)
+            if fresh_inner:
+                inner = heapq.nlargest(k - len(entries), inner + fresh_inner, key=rank)
+            entries += inner
+        seen.update(entries)
+        return entries
+
+    def _typos(self, prefix: str, i: int, next_chars: Set[str]) -> Set[str]:
+        """
+        Prefixes one likely typo at position i away (an extra, missing,
+        swapped or neighbouring-key character), keeping only those whose
+        character at i is one of `next_chars`
+        """
+        head, tail = prefix[:i], prefix[i + 1:]
+        variants = set()
+        if not tail:
+            variants.add(head)
+        elif tail[0] in next_chars:
+            variants.add(head + tail)
+            variants.add(head + tail[0] + prefix[i] + tail[1:])
+        for ch in next_chars.intersection(KEYBOARD_NEIGHBOURS.get(prefix[i], "")):
+            variants.add(head + ch + tail)
+        if i:
+            rest = prefix[i:]
+            variants.update(head + ch + rest for ch in next_chars)
+        variants.discard(prefix)
+        variants.discard("")
+        return variants
+
+    def _fuzzy(self, prefix: str, k: int, seen: Set[_Entry]) -> List[_Entry]:
+        """
+        Best k queries matching a prefix one typo away from `prefix`.
+
+        A typo at position i leaves prefix[:i] intact, so its variants are
+        only looked for within the span of that exact prefix, only with
+        characters that occur there next, and not at all past the point
+        where the exact prefix stops matching.
+        """
+        found: List[_Entry] = []
+        for prefix_array in (self._leading, self._inner):
+            spans = []
+            lo, hi = 0, len(prefix_array.strings)
+            for i in range(len(prefix)):
+                if i:
+                    lo, hi = prefix_array.span(prefix[:i], lo, hi)
+                if lo == hi:
+                    break
+                next_chars = prefix_array.next_chars(i, lo, hi)
+                for variant in self._typos(prefix, i, next_chars):
+                    if prefix_array.has_prefix(variant, lo, hi):
+                        spans.append(prefix_array.span(variant, lo, hi))
+            if spans:
+                found += prefix_array.top_spans(spans, k, seen)
+        return heapq.nlargest(k, found, key=attrgetter("rank"))
+
+    def suggest(self, prefix: str, k: int = 5) -> List[str]:
+        key = normalize_query(prefix)
+        seen: Set[_Entry] = set()
+        entries = self._top(key, k, seen)
+
+        # Not enough exact matches: fill up with near-miss prefixes,
+        # ranked after every exact match. Queries still pending a rebuild
+        # only match exactly.
+        if len(entries) < k and len(key) >= self.fuzzy_min_prefix:
+            entries += self._fuzzy(key, k - len(entries), seen)
+
+        return [entry.display for entry in entries]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "pending": len(self._pending),
+            "pruned": self.pruned,
+            "rebuilds": self.rebuilds,
+        }
+
+
+def load_seed_queries(path: Optional[str] = None) -> List[Tuple[str, float]]:
+    """
+    Built-in seed suggestions plus an optional query log export with one
+    "query" or "query<TAB>count" per line
+    """
+    seeds = [(query, 1.0) for query in SEED_SUGGESTIONS]
+    if not path:
+        return seeds
+
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                query, _, count = line.rstrip("\n").partition("\t")
+                if query.strip():
+                    seeds.append((query, float(count) if count else 1.0))
+    except (OSError, ValueError) as e:
+        print(f"Could not load suggestion seeds from {path}: {str(e)}")
+    return seeds
@@ -0,0 +1,235 @@
+"""
+Pooled async client for the SerpAPI search endpoint
+"""
+import asyncio
+import os
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+
+from metrics import stage_seconds, upstream_errors, upstream_rejections, upstream_retries
+from ratelimit import QuotaScheduler
+from resilience import CircuitBreaker, CircuitOpenError, RetryBudget, backoff_delay
+
+SERPAPI_URL = "https://serpapi.com/search.json"
+
+# Responses worth another attempt: rate limiting and server-side failures
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+def _http2_available() -> bool:
+    """
+    HTTP/2 needs the `h2` package, which requirements.txt installs with
+    httpx[http2]; fall back to HTTP/1.1 where it is missing
+    """
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class UpstreamError(Exception):
+    """
+    Raised when SerpAPI cannot be reached or returns an unusable response
+    """
+
+
+class SerpAPIClient:
+    """
+    Long-lived httpx.AsyncClient wrapper shared by every request handler.
+
+    Connections are pooled and kept alive between calls, and a semaphore
+    bounds how many upstream requests can be in flight at once so a burst
+    of traffic queues here instead of opening unbounded sockets.
+
+    Each attempt has its own deadline and the whole call an overall one,
+    so a hung upstream cannot hold a request (or a connection) for long.
+    Failed attempts are retried with jittered backoff while the retry
+    budget allows, and a circuit breaker fails calls fast while SerpAPI is
+    unhealthy. Every attempt first waits for its share of the upstream
+    quota, which sheds calls once too many are waiting.
+    """
+
+    def __init__(
+        self,
+        base_url: str = SERPAPI_URL,
+        timeout: float = 10.0,
+        connect_timeout: float = 3.0,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        max_concurrency: int = 50,
+        attempt_timeout: float = 4.0,
+        deadline: float = 10.0,
+        max_attempts: int = 3,
+        backoff_base: float = 0.1,
+        retry_budget: Optional[RetryBudget] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        quota: Optional[QuotaScheduler] = None,
+    ):
+        self.base_url = base_url
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._client: Optional[httpx.AsyncClient] = None
+        self.attempt_timeout = attempt_timeout
+        self.deadline = deadline
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.retry_budget = retry_budget or RetryBudget()
+        self.breaker = breaker or CircuitBreaker()
+        self.quota = quota or QuotaScheduler(rate=0)
+        self.retries = 0
+
+    @classmethod
+    def from_env(cls) -> "SerpAPIClient":
+        return cls(
+            base_url=os.getenv("SERPAPI_URL", SERPAPI_URL),
+            timeout=float(os.getenv("SERPAPI_TIMEOUT", "10")),
+            connect_timeout=float(os.getenv("SERPAPI_CONNECT_TIMEOUT", "3")),
+            max_connections=int(os.getenv("SERPAPI_MAX_CONNECTIONS", "100")),
+            max_keepalive_connections=int(os.getenv("SERPAPI_MAX_KEEPALIVE", "20")),
+            max_concurrency=int(os.getenv("SERPAPI_MAX_CONCURRENCY", "50")),
+            attempt_timeout=float(os.getenv("SERPAPI_ATTEMPT_TIMEOUT", "4")),
+            deadline=float(os.getenv("SERPAPI_DEADLINE", "10")),
+            max_attempts=int(os.getenv("SERPAPI_MAX_ATTEMPTS", "3")),
+            retry_budget=RetryBudget(ratio=float(os.getenv("SERPAPI_RETRY_RATIO", "0.2"))),
+            breaker=CircuitBreaker(
+                failure_threshold=int(os.getenv("SERPAPI_BREAKER_FAILURES", "5")),
+                reset_timeout=float(os.getenv("SERPAPI_BREAKER_RESET", "30")),
+            ),
+            quota=QuotaScheduler.from_env(),
+        )
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=self.limits,
+                http2=_http2_available(),
+            )
+        return self._client
+
+    async def start(self) -> None:
+        # Touch the property so the pool exists before the first request
+        self.client
+
+    async def close(self) -> None:
+        await self.quota.close()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def search(
+        self, params: Dict[str, Any], timeout: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """
+        Run one SerpAPI query and return the decoded JSON payload.
+
+        Error payloads are returned as-is (they carry an "error" key) so the
+        caller can report them; transport failures raise UpstreamError, and
+        CircuitOpenError is raised without calling SerpAPI while the
+        breaker is open, or as QuotaExceededError when the quota scheduler
+        sheds the call. `timeout` overrides the per-attempt deadline.
+        """
+        attempt_timeout = timeout if timeout is not None else self.attempt_timeout
+        self.retry_budget.deposit()
+        try:
+            return await asyncio.wait_for(
+                self._search_with_retries(params, attempt_timeout), self.deadline
+            )
+        except asyncio.TimeoutError as e:
+            upstream_errors.inc(kind="deadline")
+            raise UpstreamError(
+                f"SerpAPI search did not finish within {self.deadline:.0f}s"
+            ) from e
+
+    async def _search_with_retries(
+        self, params: Dict[str, Any], attempt_timeout: float
+    ) -> Dict[str, Any]:
+        attempt = 1
+        while True:
+            try:
+                self.breaker.before_call()
+            except CircuitOpenError:
+                upstream_rejections.inc()
+                raise
+
+            error = None
+            try:
+                await self.quota.acquire()
+                status, data = await self._attempt(params, attempt_timeout)
+            except UpstreamError as e:
+                status, data, error = None, None, e
+            except BaseException:
+                self.breaker.abandon()
+                raise
+
+            if error is None and status not in RETRY_STATUSES:
+                self.breaker.record_success()
+                return data
+
+            self.breaker.record_failure()
+            if attempt >= self.max_attempts or not self.retry_budget.withdraw():
+                if error is not None:
+                    raise error
+                return data
+
+            self.retries += 1
+            upstream_retries.inc()
+            await asyncio.sleep(backoff_delay(attempt, self.backoff_base))
+            attempt += 1
+
+    async def _attempt(
+        self, params: Dict[str, Any], attempt_timeout: float
+    ) -> Tuple[int, Dict[str, Any]]:
+        async with self._semaphore:
+            try:
+                with stage_seconds.time(stage="upstream_fetch"):
+                    # wait_for also bounds slow-trickling responses, which
+                    # httpx's per-read timeouts would let through
+                    response = await asyncio.wait_for(
+                        self.client.get(self.base_url, params=params, timeout=self.timeout),
+                        attempt_timeout,
+                    )
+            except (httpx.TimeoutException, asyncio.TimeoutError) as e:
+                upstream_errors.inc(kind="timeout")
+                raise UpstreamError(f"SerpAPI request timed out: {e!r}") from e
+            except httpx.HTTPError as e:
+                upstream_errors.inc(kind="transport")
+                raise UpstreamError(f"SerpAPI request failed: {e!r}") from e
+
+        try:
+            with stage_seconds.time(stage="json_decode"):
+                data = response.json()
+        except ValueError as e:
+            upstream_errors.inc(kind="invalid_json")
+            raise UpstreamError(
+                f"SerpAPI returned invalid JSON (HTTP {response.status_code})"
+            ) from e
+        if not isinstance(data, dict):
+            upstream_errors.inc(kind="invalid_payload")
+            raise UpstreamError(
+                f"SerpAPI returned an unexpected payload (HTTP {response.status_code})"
+            )
+
+        if response.status_code >= 400 and "error" not in data:
+            data["error"] = f"HTTP {response.status_code}"
+        if "error" in data:
+            upstream_errors.inc(kind="api")
+        return response.status_code, data
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "retries": self.retries,
+            "retry_budget": self.retry_budget.stats(),
+            "breaker": self.breaker.stats(),
+            "quota": self.quota.stats(),
+        }
@@ -0,0 +1,291 @@
+"""
+Cache warming driven by query popularity.
+
+Every search served counts towards its (normalized query, page) cache key
+in a Count-Min sketch, a fixed-size table of counters that never
+undercounts a key and overcounts it only by collisions with others. The
+sketch's estimate feeds a top-k set of the hottest keys, and both are
+halved every `decay_interval` seconds so popularity follows what is being
+searched now.
+
+A background task wakes every `interval` seconds and walks the hottest
+keys. A hot entry of the search cache that expires within `lead` seconds
+is reloaded from the persistent store or, failing that, refreshed
+upstream before it expires, so the users repeating the query keep hitting
+the cache instead of paying for the expiry. Upstream refreshes spend a
+token bucket of `budget` per minute; once it is empty, the remaining hot
+entries are left to expire as they would without warming.
+"""
+import asyncio
+import heapq
+import os
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from metrics import cache_warms
+from ratelimit import refill
+
+_MASK64 = (1 << 64) - 1
+
+
+class CountMinSketch:
+    """
+    `depth` rows of `width` counters (rounded up to a power of two), each
+    row indexed by its own hash of the key; a key's estimate is the
+    smallest of its counters
+    """
+
+    def __init__(self, width: int = 2048, depth: int = 4, seed: Optional[int] = None):
+        bits = max(1, (width - 1).bit_length())
+        self.width = 1 << bits
+        self.depth = depth
+        self._shift = 64 - bits
+        rng = random.Random(seed)
+        # Multiply-shift hashing: the top bits of the key's hash times an
+        # odd multiplier per row. Rows must collide independently, which
+        # hashing (salt, key) tuples does not give.
+        self._multipliers = [rng.getrandbits(64) | 1 for _ in range(depth)]
+        self._rows = [[0] * self.width for _ in range(depth)]
+        self.total = 0
+
+    def _cells(self, key: Hashable) -> List[int]:
+        hashed = hash(key)
+        return [((hashed * multiplier) & _MASK64) >> self._shift
+                for multiplier in self._multipliers]
+
+    def add(self, key: Hashable, count: int = 1) -> int:
+        """
+        Count `key` and return its new estimate. Only the counters at the
+        current minimum are raised (conservative update), which keeps
+        collisions from inflating every row.
+        """
+        cells = self._cells(key)
+        estimate = min(row[cell] for row, cell in zip(self._rows, cells)) + count
+        for row, cell in zip(self._rows, cells):
+            if row[cell] < estimate:
+                row[cell] = estimate
+        self.total += count
+        return estimate
+
+    def estimate(self, key: Hashable) -> int:
+        return min(row[cell] for row, cell in zip(self._rows, self._cells(key)))
+
+    def halve(self) -> None:
+        self._rows = [[counter >> 1 for counter in row] for row in self._rows]
+        self.total >>= 1
+
+
+class TopK:
+    """
+    The `k` keys with the highest counts offered so far. A min-heap finds
+    the key to replace; entries are pushed on every update and the stale
+    ones skipped when they surface, with the heap rebuilt once it grows
+    well past `k`.
+    """
+
+    def __init__(self, k: int = 100):
+        self.k = k
+        self._counts: Dict[Hashable, int] = {}
+        self._heap: List[Tuple[int, Hashable]] = []
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._counts
+
+    def offer(self, key: Hashable, count: int) -> None:
+        if key not in self._counts and len(self._counts) >= self.k:
+            smallest, smallest_key = self._smallest()
+            if count <= smallest:
+                return
+            heapq.heappop(self._heap)
+            del self._counts[smallest_key]
+        self._counts[key] = count
+        heapq.heappush(self._heap, (count, key))
+        if len(self._heap) > 4 * self.k + 16:
+            self._rebuild()
+
+    def _smallest(self) -> Tuple[int, Hashable]:
+        while True:
+            count, key = self._heap[0]
+            if self._counts.get(key) == count:
+                return count, key
+            heapq.heappop(self._heap)
+
+    def _rebuild(self) -> None:
+        self._heap = [(count, key) for key, count in self._counts.items()]
+        heapq.heapify(self._heap)
+
+    def items(self) -> List[Tuple[Hashable, int]]:
+        """
+        (key, count) pairs, highest count first
+        """
+        return sorted(self._counts.items(), key=lambda item: -item[1])
+
+    def halve(self) -> None:
+        self._counts = {key: count >> 1 for key, count in self._counts.items()}
+        self._rebuild()
+
+
+class CacheWarmer:
+    """
+    Popularity of search cache keys, and the task that refreshes the hot
+    ones before they expire.
+
+    `expires_in(key)` gives the seconds until a key's cache entry expires,
+    or None without one; `reload(key)` promotes the stored copy of a key,
+    if any, into the cache; `refresh(key)` searches upstream and caches
+    the result.
+    """
+
+    def __init__(
+        self,
+        expires_in: Callable[[Hashable], Optional[float]],
+        reload: Callable[[Hashable], Awaitable[Any]],
+        refresh: Callable[[Hashable], Awaitable[Any]],
+        interval: float = 30.0,
+        lead: float = 90.0,
+        budget: float = 20.0,
+        top: int = 100,
+        min_count: int = 3,
+        decay_interval: float = 3600.0,
+        width: int = 2048,
+        depth: int = 4,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.expires_in = expires_in
+        self.reload = reload
+        self.refresh = refresh
+        self.interval = interval
+        # Longer than the interval, so an entry is caught on the pass
+        # before it expires
+        self.lead = max(lead, interval)
+        self.budget = budget
+        self.min_count = min_count
+        self.decay_interval = decay_interval
+        self.clock = clock
+        self.sketch = CountMinSketch(width, depth)
+        self.top = TopK(top)
+        self._tokens = budget
+        self._updated = clock()
+        self._decayed = clock()
+        self._task: Optional["asyncio.Task[None]"] = None
+        self.passes = 0
+        self.counts = {"store": 0, "upstream": 0, "over_budget": 0, "failed": 0}
+
+    @classmethod
+    def from_env(cls, expires_in, reload, refresh, **kwargs) -> "CacheWarmer":
+        return cls(
+            expires_in,
+            reload,
+            refresh,
+            interval=float(os.getenv("CACHE_WARM_INTERVAL", "30")),
+            lead=float(os.getenv("CACHE_WARM_LEAD", "90")),
+            budget=float(os.getenv("CACHE_WARM_BUDGET", "20")),
+            top=int(os.getenv("CACHE_WARM_TOP_K", "100")),
+            min_count=int(os.getenv("CACHE_WARM_MIN_COUNT", "3")),
+            decay_interval=float(os.getenv("CACHE_WARM_DECAY_INTERVAL", "3600")),
+            **kwargs,
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.interval > 0
+
+    def record(self, key: Hashable, count: int = 1) -> None:
+        """
+        Count a search served for `key`
+        """
+        if self.enabled:
+            self.top.offer(key, self.sketch.add(key, count))
+
+    def seed(self, counts: Iterable[Tuple[Hashable, int]]) -> None:
+        """
+        Count searches served before this process started, such as the
+        ones in the event log
+        """
+        for key, count in counts:
+            self.record(key, count)
+
+    def hottest(self) -> List[Tuple[Hashable, int]]:
+        return [(key, count) for key, count in self.top.items() if count >= self.min_count]
+
+    def _take_token(self) -> bool:
+        now = self.clock()
+        self._tokens = refill(self._tokens, now - self._updated, self.budget / 60.0, self.budget)
+        self._updated = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    def _count(self, result: str) -> None:
+        self.counts[result] += 1
+        cache_warms.inc(result=result)
+
+    async def warm_once(self) -> int:
+        """
+        Refresh the hot entries about to expire, hottest first; returns how
+        many were refreshed
+        """
+        if self.decay_interval > 0 and self.clock() - self._decayed >= self.decay_interval:
+            self.sketch.halve()
+            self.top.halve()
+            self._decayed = self.clock()
+
+        warmed = 0
+        for key, _ in self.hottest():
+            expires_in = self.expires_in(key)
+            if expires_in is None or expires_in > self.lead:
+                # Not cached (evicted, or never served from the cache), or fresh
+                continue
+            try:
+                await self.reload(key)
+                remaining = self.expires_in(key)
+                if remaining is not None and remaining > self.lead:
+                    self._count("store")
+                    warmed += 1
+                    continue
+                if not self._take_token():
+                    self._count("over_budget")
+                    continue
+                await self.refresh(key)
+            except Exception as e:
+                self._count("failed")
+                print(f"Cache warming error for {key}: {e}")
+                continue
+            self._count("upstream")
+            warmed += 1
+        self.passes += 1
+        return warmed
+
+    async def start(self) -> None:
+        if self.enabled:
+            self._task = asyncio.ensure_future(self._warm_periodically())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _warm_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.warm_once()
+
+    def stats(self) -> Dict[str, Any]:
+        hottest = self.hottest()
+        return {
+            "enabled": self.enabled,
+            "interval": self.interval,
+            "lead": self.lead,
+            "budget_per_minute": self.budget,
+            "searches_counted": self.sketch.total,
+            "tracked": len(self.top),
+            "hot": len(hottest),
+            "hottest_count": hottest[0][1] if hottest else 0,
+            "passes": self.passes,
+            **self.counts,
+        }
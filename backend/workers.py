@@ -0,0 +1,119 @@
+"""
+Coordination between the worker processes of one server.
+
+Workers share nothing but the filesystem. A worker takes on a role (the
+category refresh leader, the writer of an index shard) by holding an
+exclusive, non-blocking flock on a lock file. The kernel drops the lock
+when the process exits, however it exits, so another worker can take the
+role over from one that crashed.
+"""
+import fcntl
+import os
+import shutil
+import tempfile
+from typing import Optional, Tuple
+
+
+def worker_count() -> int:
+    """
+    WEB_CONCURRENCY, or else one worker per CPU this process may run on
+    """
+    configured = os.getenv("WEB_CONCURRENCY")
+    if configured:
+        return max(1, int(configured))
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def state_directory(name: str) -> str:
+    """
+    `name` under WORKER_STATE_DIR, or "" when workers share no state
+    """
+    root = os.getenv("WORKER_STATE_DIR", "")
+    return os.path.join(root, name) if root else ""
+
+
+def prepare_worker_state() -> str:
+    """
+    Called once in the parent process before workers are started: point
+    WORKER_STATE_DIR at a directory and clear the metrics left there by a
+    previous run. Category snapshots are kept, so a restart serves them
+    straight away.
+    """
+    root = os.environ.setdefault(
+        "WORKER_STATE_DIR", os.path.join(tempfile.gettempdir(), "ai-search-workers")
+    )
+    shutil.rmtree(os.path.join(root, "metrics"), ignore_errors=True)
+    os.makedirs(root, exist_ok=True)
+    return root
+
+
+class FileLock:
+    """
+    An exclusive flock held by this process until release() or exit
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd: Optional[int] = None
+
+    @property
+    def held(self) -> bool:
+        return self._fd is not None
+
+    def try_acquire(self) -> bool:
+        if self._fd is not None:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self._fd = fd
+        return True
+
+    def acquire(self) -> None:
+        """
+        Wait for the lock; for short critical sections shared by workers
+        """
+        if self._fd is not None:
+            return
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        except BaseException:
+            os.close(fd)
+            raise
+        self._fd = fd
+
+    def release(self) -> None:
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+
+
+def claim_slot(directory: str, prefix: str, limit: int = 256) -> Tuple[int, FileLock]:
+    """
+    The lowest numbered `<prefix>-<n>.lock` in `directory` no other
+    process holds, locked for this one
+    """
+    os.makedirs(directory, exist_ok=True)
+    for slot in range(limit):
+        lock = FileLock(os.path.join(directory, f"{prefix}-{slot}.lock"))
+        if lock.try_acquire():
+            return slot, lock
+    raise RuntimeError(f"No free {prefix} slot in {directory}")
+
+
+def process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
@@ -107,6 +107,122 @@ class AISearchEngineTester:
             data={"query": query}
         )
 
+    def test_stream_search(self, query):
+        """Test the streaming search endpoint and check its NDJSON frames"""
+        url = f"{self.base_url}/api/search/stream"
+        name = f"Streaming search for '{query}'"
+        
+        self.tests_run += 1
+        print(f"\n🔍 Testing {name}...")
+        
+        try:
+            start_time = time.time()
+            first_frame_time = None
+            frames = []
+            
+            with requests.post(url, json={"query": query}, stream=True) as response:
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    if first_frame_time is None:
+                        first_frame_time = time.time() - start_time
+                    frames.append(json.loads(line))
+            
+            elapsed_time = time.time() - start_time
+            success = (
+                response.status_code == 200
+                and bool(frames)
+                and frames[-1].get("type") == "summary"
+                and frames[-1].get("total_results") == len(frames) - 1
+            )
+            
+            if success:
+                self.tests_passed += 1
+                print(f"✅ Passed - {len(frames) - 1} results - First frame: {first_frame_time:.2f}s - Total: {elapsed_time:.2f}s")
+            else:
+                print(f"❌ Failed - Status: {response.status_code} - Last frame: {frames[-1] if frames else None}")
+            
+            self.test_results.append({
+                "name": name,
+                "success": success,
+                "status_code": response.status_code,
+                "expected_status": 200,
+                "response_time": elapsed_time,
+                "url": url,
+                "method": "POST"
+            })
+            return success, frames
+        
+        except Exception as e:
+            print(f"❌ Failed - Error: {str(e)}")
+            self.test_results.append({
+                "name": name,
+                "success": False,
+                "error": str(e),
+                "url": url,
+                "method": "POST"
+            })
+            return False, None
+
+    def test_bulk_search(self, queries):
+        """Test the bulk search endpoint: repeated queries answered once, every one with a status"""
+        url = f"{self.base_url}/api/search/bulk"
+        name = f"Bulk search for {len(queries)} queries"
+        
+        self.tests_run += 1
+        print(f"\n🔍 Testing {name}...")
+        
+        try:
+            start_time = time.time()
+            frames = []
+            searches = [{"query": query} for query in queries]
+            
+            with requests.post(url, json={"searches": searches}, stream=True) as response:
+                for line in response.iter_lines():
+                    if line:
+                        frames.append(json.loads(line))
+            
+            elapsed_time = time.time() - start_time
+            results = [frame for frame in frames if frame.get("type") == "result"]
+            answered = sorted(index for frame in results for index in frame["indexes"])
+            success = (
+                response.status_code == 200
+                and bool(frames)
+                and frames[-1].get("type") == "summary"
+                and frames[-1].get("distinct") == len(results)
+                and answered == list(range(len(queries)))
+                and all("status" in frame for frame in results)
+            )
+            
+            if success:
+                self.tests_passed += 1
+                statuses = frames[-1]["statuses"]
+                print(f"✅ Passed - {len(results)} distinct searches - Statuses: {statuses} - Total: {elapsed_time:.2f}s")
+            else:
+                print(f"❌ Failed - Status: {response.status_code} - Last frame: {frames[-1] if frames else None}")
+            
+            self.test_results.append({
+                "name": name,
+                "success": success,
+                "status_code": response.status_code,
+                "expected_status": 200,
+                "response_time": elapsed_time,
+                "url": url,
+                "method": "POST"
+            })
+            return success, frames
+        
+        except Exception as e:
+            print(f"❌ Failed - Error: {str(e)}")
+            self.test_results.append({
+                "name": name,
+                "success": False,
+                "error": str(e),
+                "url": url,
+                "method": "POST"
+            })
+            return False, None
+
     def test_suggestions(self, query):
         """Test the suggestions endpoint with a specific query"""
         return self.run_test(
@@ -117,6 +233,28 @@ class AISearchEngineTester:
             params={"q": query}
         )
         
+    def test_cache_stats(self):
+        """Test the search cache stats endpoint"""
+        return self.run_test(
+            "Cache Stats",
+            "GET",
+            "api/cache/stats",
+            200
+        )
+        
+    def test_metrics(self):
+        """Test the Prometheus metrics endpoint"""
+        success, body = self.run_test(
+            "Metrics",
+            "GET",
+            "api/metrics",
+            200
+        )
+        if success and "search_stage_seconds" not in body:
+            print("❌ Metrics are missing the per-stage search latency histogram")
+            return False, body
+        return success, body
+        
     def test_category_search(self, category):
         """Test search with a specific AI category query"""
         category_query = next((cat["query"] for cat in self.ai_categories if cat["id"] == category), None)
@@ -132,6 +270,28 @@ class AISearchEngineTester:
             data={"query": category_query}
         )
         
+    def test_category_catalogue(self):
+        """Test that the backend catalogue matches the frontend categories"""
+        success, response = self.run_test(
+            "Category Catalogue",
+            "GET",
+            "api/categories",
+            200
+        )
+        if success and [cat["id"] for cat in response["categories"]] != [cat["id"] for cat in self.ai_categories]:
+            print("❌ Category catalogue does not match the frontend categories")
+            return False, response
+        return success, response
+        
+    def test_category_snapshot(self, category):
+        """Test the precomputed results of a category"""
+        return self.run_test(
+            f"Category Snapshot for '{category}'",
+            "GET",
+            f"api/categories/{category}",
+            200
+        )
+        
     def test_all_categories(self):
         """Test search with all AI categories"""
         results = []
@@ -184,6 +344,13 @@ def main():
     for query in ai_queries:
         tester.test_search(query)
     
+    print("\n===== TESTING STREAMING SEARCH =====")
+    for query in ai_queries[:2]:
+        tester.test_stream_search(query)
+    
+    print("\n===== TESTING BULK SEARCH =====")
+    tester.test_bulk_search(ai_queries + ai_queries[:2])
+    
     # Test suggestions endpoint
     suggestion_queries = ["openai", "mid", "machine", "claude", "stable"]
     
@@ -198,9 +365,21 @@ def main():
     tester.test_category_search("image")
     tester.test_category_search("code")
     
+    print("\nTesting category snapshots:")
+    tester.test_category_catalogue()
+    tester.test_category_snapshot("chatbot")
+    tester.test_category_snapshot("video")
+    tester.run_test("Unknown Category", "GET", "api/categories/unknown", 404)
+    
     print("\nTesting all categories:")
     category_results = tester.test_all_categories()
     
+    print("\n===== TESTING SEARCH CACHE =====")
+    tester.test_cache_stats()
+    
+    print("\n===== TESTING METRICS =====")
+    tester.test_metrics()
+    
     print("\n===== CATEGORY SEARCH RESULTS =====")
     for result in category_results:
         status = "✅" if result["success"] else "❌"
@@ -0,0 +1,116 @@
+"""
+Bulk search against one /api/search call per query.
+
+Runs a list of topic searches, some repeated, the way a batch job would:
+once as one /api/search request after another (as backend_test.py loops
+over categories) and once as a single /api/search/bulk request, each
+against the in-process app and a fake SerpAPI with fixed latency. Both
+are run cold (distinct queries per mode, so neither reuses the other's
+cache) and then again warm, from the cache. Reports wall time, upstream
+calls and the time per search, and fails unless the bulk request beats
+the loop cold and both warm runs are answered from the cache.
+
+    python benchmarks/bench_bulk.py --searches 200 --distinct 120 --concurrency 16
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+import httpx  # noqa: E402
+
+from fake_serpapi import FakeSerpAPIServer  # noqa: E402
+
+
+def topic_searches(mode: str, searches: int, distinct: int, seed: int):
+    rng = random.Random(seed)
+    return [{"query": f"{mode} ai topic {rng.randrange(distinct)}"} for _ in range(searches)]
+
+
+async def one_by_one(client, searches):
+    for search in searches:
+        response = await client.post("/api/search", json=search)
+        response.raise_for_status()
+
+
+async def in_bulk(client, searches):
+    response = await client.post("/api/search/bulk", json={"searches": searches})
+    response.raise_for_status()
+    frames = [json.loads(line) for line in response.text.splitlines()]
+    summary = frames[-1]
+    assert summary["type"] == "summary", summary
+    answered = sum(len(frame["indexes"]) for frame in frames[:-1] if frame["status"] == 200)
+    assert answered == len(searches), f"{answered} of {len(searches)} searches answered"
+
+
+async def run(app, fake, args):
+    """
+    {(mode, phase): (seconds, upstream calls)}
+    """
+    timings = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench",
+                                 timeout=None) as client:
+        for mode, send in (("loop", one_by_one), ("bulk", in_bulk)):
+            searches = topic_searches(mode, args.searches, args.distinct, args.seed)
+            for phase in ("cold", "warm"):
+                calls = fake.calls
+                started = time.perf_counter()
+                await send(client, searches)
+                elapsed = time.perf_counter() - started
+                timings[mode, phase] = (elapsed, fake.calls - calls)
+                print(f"{mode} {phase}: {elapsed:7.3f}s  "
+                      f"{elapsed / len(searches) * 1000:7.2f} ms/search  "
+                      f"upstream calls {fake.calls - calls}")
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--searches", type=int, default=200)
+    parser.add_argument("--distinct", type=int, default=120,
+                        help="distinct queries among the searches")
+    parser.add_argument("--concurrency", type=int, default=16,
+                        help="BULK_CONCURRENCY for the server")
+    parser.add_argument("--latency", type=float, default=0.05,
+                        help="fake upstream latency in seconds")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    with FakeSerpAPIServer(latency=args.latency) as fake:
+        os.environ["SERPAPI_URL"] = fake.url
+        os.environ.setdefault("SERPAPI_KEY", "benchmark")
+        os.environ["MONGO_URL"] = ""
+        os.environ["LOCAL_INDEX_DIR"] = ""
+        os.environ["EVENT_LOG"] = "off"
+        os.environ["BULK_CONCURRENCY"] = str(args.concurrency)
+        # One client sends everything: measure the server, not the
+        # per-client rate limits or the upstream quota
+        os.environ["RATE_LIMIT_SEARCH_RATE"] = "0"
+        os.environ["RATE_LIMIT_BULK_RATE"] = "0"
+        os.environ["UPSTREAM_QUOTA_RATE"] = "0"
+        import server
+
+        print(f"{args.searches} searches, {args.distinct} distinct queries, "
+              f"upstream latency {args.latency * 1000:.0f} ms")
+        timings = asyncio.run(run(server.app, fake, args))
+
+    failures = []
+    if timings["bulk", "cold"][0] >= timings["loop", "cold"][0]:
+        failures.append("bulk cold is no faster than the loop")
+    for mode in ("loop", "bulk"):
+        # A prefetch still in flight from the cold run may land here
+        if timings[mode, "warm"][1] > args.distinct // 10:
+            failures.append(f"{mode} warm went upstream {timings[mode, 'warm'][1]} times")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
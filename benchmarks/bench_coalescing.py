@@ -0,0 +1,70 @@
+"""
+Burst load test for request coalescing on /api/search.
+
+Fires many concurrent identical searches at the in-process app and counts
+how many calls reach the fake SerpAPI. With single-flight in place the
+upstream count should equal the number of unique queries in the burst.
+
+    python benchmarks/bench_coalescing.py --clients 200 --unique 11
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+import httpx  # noqa: E402
+
+from fake_serpapi import FakeSerpAPIServer  # noqa: E402
+
+
+async def burst(app, clients: int, unique: int):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one(i: int):
+            response = await client.post(
+                "/api/search", json={"query": f"category query {i % unique}"}
+            )
+            response.raise_for_status()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(clients)))
+        return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--clients", type=int, default=200,
+                        help="concurrent requests in the burst")
+    parser.add_argument("--unique", type=int, default=11,
+                        help="number of distinct queries in the burst")
+    parser.add_argument("--latency", type=float, default=0.2,
+                        help="fake upstream latency in seconds")
+    args = parser.parse_args()
+
+    with FakeSerpAPIServer(latency=args.latency) as fake:
+        os.environ["SERPAPI_URL"] = fake.url
+        os.environ.setdefault("SERPAPI_KEY", "benchmark")
+        # Measure the memory tier only; no persistent store or local index
+        os.environ["MONGO_URL"] = ""
+        os.environ["LOCAL_INDEX_DIR"] = ""
+        # All the load comes from one client: measure the server, not the
+        # per-client rate limit or the upstream quota
+        os.environ["RATE_LIMIT_SEARCH_RATE"] = "0"
+        os.environ["UPSTREAM_QUOTA_RATE"] = "0"
+        import server
+
+        elapsed = asyncio.run(burst(server.app, args.clients, args.unique))
+
+        print(f"requests sent:       {args.clients}")
+        print(f"unique queries:      {args.unique}")
+        print(f"upstream calls:      {fake.calls}")
+        print(f"shared (coalesced):  {server.search_flight.shared}")
+        print(f"burst wall time:     {elapsed:.3f}s")
+    return 0 if fake.calls == args.unique else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
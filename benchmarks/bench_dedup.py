@@ -0,0 +1,207 @@
+"""
+Accuracy and cost of collapsing duplicate search results.
+
+Generates a corpus of distinct articles on AI topics and adds copies of
+some of them: the same link with tracking parameters or another URL form,
+mirrors on other hosts with a site name appended to the title, and
+syndicated copies with a word changed or the snippet cut short. Runs it
+through a DuplicateFilter and reports how many copies were collapsed by
+URL and as near-duplicates, how many distinct articles were wrongly
+collapsed, the cost per result, and how many slots of a 10-result page
+copies took before and after. Fails if more than --max-wrong of the
+distinct articles are collapsed, a tracking-parameter copy is kept, or
+collapsing frees no page slots.
+
+With `--index` it instead runs over the documents stored in a local
+index directory and lists the largest groups of near-duplicates found.
+
+    python benchmarks/bench_dedup.py --articles 5000 --distance 8
+    python benchmarks/bench_dedup.py --index backend/local_index
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from dedup import DuplicateFilter, result_fingerprint  # noqa: E402
+from providers import canonical_url  # noqa: E402
+
+TOPIC = (
+    "ai artificial intelligence machine learning model models language large open source "
+    "chatbot assistant image video generation tools developers api release new best guide "
+    "how to build train fine tune prompt agents research paper benchmark review compare "
+    "free online platform startup product launch data neural network deep vision speech "
+    "openai chatgpt gpt claude gemini llama mistral diffusion transformer inference gpu"
+).split()
+COMMON = (
+    "the a of and to in for with on is that your from this are can you new more about "
+    "now how what why when it its by as at be we our an or will has than into over"
+).split()
+SITES = ["TechCrunch", "The Verge", "Medium", "Hacker News", "VentureBeat", "Wired"]
+
+
+def make_corpus(articles: int, copy_rate: float, seed: int):
+    """
+    (result, article id, kind) in ranked order, each copy a few ranks from
+    its article: kind is "original" for the first appearance of an article
+    and how it was copied for the second
+    """
+    rng = random.Random(seed)
+
+    def words(n):
+        return " ".join(rng.choice(TOPIC) if rng.random() < 0.45 else rng.choice(COMMON)
+                        for _ in range(n))
+
+    originals = []
+    for article in range(articles):
+        host = f"{rng.choice(TOPIC)}{rng.randrange(1000)}.com"
+        originals.append({
+            "title": words(rng.randint(6, 11)).capitalize(),
+            "link": f"https://{host}/{words(3).replace(' ', '-')}-{article}",
+            "snippet": words(rng.randint(18, 32)) + ".",
+        })
+
+    ranked = [(float(article), original, article, "original")
+              for article, original in enumerate(originals)]
+    for article, original in enumerate(originals):
+        if rng.random() >= copy_rate:
+            continue
+        kind = rng.choice(["tracking", "mirror", "syndicated"])
+        copy = dict(original)
+        if kind == "tracking":
+            link = original["link"].replace("https://", rng.choice(["http://www.", "https://m."]))
+            copy["link"] = link + rng.choice(["/", "?utm_source=x", "?fbclid=abc", "/amp"])
+        elif kind == "mirror":
+            copy["link"] = f"https://mirror{rng.randrange(100)}.net/{article}"
+            copy["title"] = f"{original['title']} | {rng.choice(SITES)}"
+        else:
+            copy["link"] = f"https://news{rng.randrange(100)}.org/story/{article}"
+            snippet = original["snippet"].split()
+            if rng.random() < 0.5:
+                snippet[rng.randrange(len(snippet))] = rng.choice(COMMON)
+            else:
+                snippet = snippet[:len(snippet) - rng.randint(2, 5)] + ["..."]
+            copy["snippet"] = " ".join(snippet)
+        ranked.append((article + rng.uniform(-5, 15), copy, article, kind))
+
+    ranked.sort(key=lambda item: item[0])
+    # An article's first appearance is what its copy collapses into
+    copied = {article: kind for _, _, article, kind in ranked if kind != "original"}
+    first = set()
+    corpus = []
+    for _, result, article, _ in ranked:
+        corpus.append((result, article, copied[article] if article in first else "original"))
+        first.add(article)
+    return corpus
+
+
+def run_filter(results, distance, max_entries):
+    duplicates = DuplicateFilter(max_entries=max_entries, distance=distance)
+    started = time.perf_counter()
+    verdicts = [
+        duplicates.check(canonical_url(result["link"]),
+                         result_fingerprint(result.get("title", ""), result.get("snippet", "")))
+        for result in results
+    ]
+    return verdicts, time.perf_counter() - started
+
+
+def synthetic(args):
+    corpus = make_corpus(args.articles, args.copy_rate, args.seed)
+    verdicts, elapsed = run_filter([result for result, _, _ in corpus],
+                                   args.distance, args.max_entries)
+
+    caught = defaultdict(lambda: [0, 0])
+    wrong = 0
+    for (_, _, kind), verdict in zip(corpus, verdicts):
+        if kind == "original":
+            wrong += verdict is not None
+        else:
+            caught[kind][0] += verdict is not None
+            caught[kind][1] += 1
+
+    originals = sum(kind == "original" for _, _, kind in corpus)
+    print(f"{len(corpus)} results: {originals} articles, {len(corpus) - originals} copies "
+          f"(distance {args.distance})")
+    for kind, (hit, total) in sorted(caught.items()):
+        print(f"  {kind:<11} {hit:>6}/{total:<6} collapsed ({hit / max(total, 1):.1%})")
+    print(f"  distinct articles wrongly collapsed: {wrong} ({wrong / originals:.2%})")
+    print(f"  by URL {verdicts.count('url')}, as near-duplicates {verdicts.count('near')}")
+    print(f"cost: {elapsed / len(corpus) * 1e6:.1f} us per result")
+
+    # Pages of 10 filled in corpus order, with and without collapsing
+    wasted_before = sum(kind != "original" for _, _, kind in corpus[:args.page_size * 10])
+    kept = [item for item, verdict in zip(corpus, verdicts) if verdict is None]
+    wasted_after = sum(kind != "original" for _, _, kind in kept[:args.page_size * 10])
+    print(f"slots taken by copies on the first 10 pages: "
+          f"{wasted_before} before, {wasted_after} after")
+
+    failures = []
+    if wrong / originals > args.max_wrong:
+        failures.append(f"{wrong / originals:.2%} of distinct articles collapsed, "
+                        f"over {args.max_wrong:.2%}")
+    hit, total = caught["tracking"]
+    if hit != total:
+        failures.append(f"{total - hit} copies differing only in tracking parameters kept")
+    if wasted_after >= wasted_before:
+        failures.append("collapsing freed no slots on the first pages")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+def offline(args):
+    from local_index import stored_documents
+
+    documents = list(stored_documents(args.index))
+    if not documents:
+        print(f"No stored documents under {args.index}")
+        return
+    verdicts, elapsed = run_filter(documents, args.distance, args.max_entries)
+
+    # Group each near-duplicate with the first document it matched
+    duplicates = DuplicateFilter(max_entries=args.max_entries, distance=args.distance)
+    groups = defaultdict(list)
+    for document in documents:
+        key = canonical_url(document["link"])
+        fingerprint = result_fingerprint(document.get("title", ""), document.get("snippet", ""))
+        if duplicates.check(key, fingerprint) == "near":
+            groups[duplicates.fingerprints.find(fingerprint)].append(document["link"])
+
+    print(f"{len(documents)} stored documents, {elapsed / len(documents) * 1e6:.1f} us each")
+    print(f"  by URL {verdicts.count('url')}, as near-duplicates {verdicts.count('near')}")
+    for key, links in sorted(groups.items(), key=lambda item: -len(item[1]))[:args.top]:
+        print(f"  {key}")
+        for link in links:
+            print(f"    {link}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--articles", type=int, default=5000)
+    parser.add_argument("--copy-rate", type=float, default=0.3,
+                        help="share of articles that get a copy")
+    parser.add_argument("--distance", type=int, default=6,
+                        help="fingerprint bits two copies may differ in")
+    parser.add_argument("--max-entries", type=int, default=100_000)
+    parser.add_argument("--page-size", type=int, default=10)
+    parser.add_argument("--index", help="local index directory to run over instead")
+    parser.add_argument("--top", type=int, default=10,
+                        help="near-duplicate groups listed with --index")
+    parser.add_argument("--max-wrong", type=float, default=0.005,
+                        help="fail if more of the distinct articles are collapsed")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    if args.index:
+        offline(args)
+        return 0
+    return synthetic(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
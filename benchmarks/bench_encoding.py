@@ -0,0 +1,132 @@
+"""
+Per-request encoding cost and size of search response bodies.
+
+Builds pages of search results and times what a cache hit costs to put
+on the wire: the previous path (copy the cached response with this
+request's search time and query, serialize it whole, then compress it
+whole) against the encoded page, which stores the compressed results
+once and appends each request's tail. Checks that every encoded body
+decodes to the plain serialization and reports the size per encoding.
+
+    python benchmarks/bench_encoding.py --pages 200
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from encoding import ResponseEncoder, brotli  # noqa: E402
+
+WORDS = (
+    "ai artificial intelligence machine learning model models language large open source "
+    "chatbot assistant image video generation tools developers api release new best guide "
+    "how to build train fine tune prompt agents research paper benchmark review compare "
+    "free online platform startup product launch data neural network deep vision speech"
+).split()
+
+
+def make_pages(count: int, page_size: int, seed: int):
+    rng = random.Random(seed)
+    words = lambda n: " ".join(rng.choice(WORDS) for _ in range(n))  # noqa: E731
+    pages = []
+    for p in range(count):
+        results = []
+        for i in range(page_size):
+            host = f"{rng.choice(WORDS)}{rng.randrange(100)}.com"
+            results.append({
+                "title": words(rng.randint(5, 10)).title(),
+                "link": f"https://{host}/{words(3).replace(' ', '-')}",
+                "snippet": words(rng.randint(20, 35)) + ".",
+                "displayed_link": f"{host} › {rng.choice(WORDS)}",
+                "position": i + 1,
+            })
+        pages.append({"results": results, "total_results": page_size,
+                      "search_time": 0.0, "query": words(3)})
+    return pages
+
+
+def timed(fn, items):
+    started = time.perf_counter()
+    for item in items:
+        fn(item)
+    return (time.perf_counter() - started) / len(items)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--page-size", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=20,
+                        help="cache hits timed per page")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    os.environ.setdefault("MONGO_URL", "")
+    os.environ.setdefault("LOCAL_INDEX_DIR", "")
+    from server import SearchResponse, encoded_page
+
+    responses = [SearchResponse(**page) for page in make_pages(args.pages, args.page_size, args.seed)]
+    encoder = ResponseEncoder()
+    headers = {"accept-encoding": "gzip, deflate, br"}
+
+    started = time.perf_counter()
+    for response in responses:
+        encoded_page(response)
+    build = (time.perf_counter() - started) / len(responses)
+
+    def tail(response):
+        return json.dumps({"search_time": 0.000123, "query": response.query},
+                          ensure_ascii=False, separators=(",", ":"))[1:].encode()
+
+    for response in responses:
+        plain = json.loads(response.model_dump_json())
+        for encoding in encoder.encodings + [None]:
+            body = encoded_page(response).body(tail(response), encoding)
+            if encoding == "gzip":
+                body = gzip.decompress(body)
+            elif encoding == "br":
+                body = brotli.decompress(body)
+            assert json.loads(body) == {**plain, "search_time": 0.000123}, encoding
+
+    hits = responses * args.repeat
+
+    def previous(response):
+        copy = response.model_copy(update={"search_time": 0.000123})
+        gzip.compress(copy.model_dump_json().encode(), 6)
+
+    def encoded(response):
+        encoder.respond(encoded_page(response), tail(response), response.query, headers)
+
+    per_hit_before = timed(previous, hits)
+    per_hit = timed(encoded, hits)
+    print(f"{args.pages} pages of {args.page_size} results")
+    print(f"encoded page, built once per cached response: {build * 1e6:.0f} us")
+    print(f"per cache hit: serialize + gzip whole body {per_hit_before * 1e6:.1f} us, "
+          f"encoded page ({encoder.encodings[0]}) {per_hit * 1e6:.1f} us")
+
+    sizes = {"identity": 0}
+    for response in responses:
+        for encoding in encoder.encodings + [None]:
+            name = encoding or "identity"
+            sizes[name] = sizes.get(name, 0) + len(encoded_page(response).body(tail(response), encoding))
+    for name, size in sizes.items():
+        print(f"  {name:<9} {size / len(responses):>7.0f} bytes/page "
+              f"({size / sizes['identity']:.0%})")
+
+    failures = []
+    if per_hit >= per_hit_before:
+        failures.append("a cache hit costs no less than encoding the whole body")
+    if sizes.get("gzip", 0) >= sizes["identity"]:
+        failures.append("gzip bodies are no smaller than identity")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
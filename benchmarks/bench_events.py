@@ -0,0 +1,124 @@
+"""
+Cost of logging search and click events.
+
+Times what recording an event costs the request that records it, then
+pushes a stream of events through the JSONL file sink and reports the
+write throughput, compressed bytes per event and file rotations, checks
+that every written event reads back, and runs a stalled sink to show
+events being dropped (not queued without bound, not blocking) once the
+queue is full.
+
+    python benchmarks/bench_events.py --events 200000
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from events import EventLog, EventSink, JsonlFileSink, read_events  # noqa: E402
+
+QUERIES = [
+    "chatgpt alternatives", "open source llm", "ai image generator", "stable diffusion xl",
+    "ai code assistant", "prompt engineering guide", "llama 3 fine tuning", "ai music generator",
+    "rag vector database", "ai video editing", "whisper speech to text", "claude vs gpt",
+]
+
+
+def record_one(log: EventLog, rng: random.Random) -> None:
+    if rng.random() < 0.8:
+        log.record("search", query=rng.choice(QUERIES), page=1, results=10,
+                   ms=round(rng.uniform(1, 400), 1), endpoint="stream")
+    else:
+        log.record("click", query=rng.choice(QUERIES),
+                   link=f"https://example.com/{rng.randrange(10_000)}",
+                   position=rng.randint(1, 10), page=1)
+
+
+class StalledSink(EventSink):
+    name = "stalled"
+
+    async def write(self, events):
+        await asyncio.sleep(3600)
+
+
+async def through_file_sink(args, directory):
+    sink = JsonlFileSink(directory, max_bytes=args.max_file_bytes)
+    # Room for every event, so this measures the writer rather than drops
+    log = EventLog(sink, max_queue=args.events, batch_size=args.batch_size,
+                   flush_interval=0.05)
+    await log.start()
+    rng = random.Random(args.seed)
+
+    started = time.perf_counter()
+    for i in range(args.events):
+        record_one(log, rng)
+        if i % 1000 == 999:
+            # Let the writer run, as a server between requests would
+            await asyncio.sleep(0)
+    await log.close()
+    elapsed = time.perf_counter() - started
+    return log, sink, elapsed
+
+
+async def stalled(args):
+    log = EventLog(StalledSink(), max_queue=args.max_queue, batch_size=args.batch_size)
+    await log.start()
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    for _ in range(args.max_queue * 3):
+        record_one(log, rng)
+    elapsed = time.perf_counter() - started
+    stats = log.stats()
+    log._task.cancel()
+    return stats, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--events", type=int, default=100_000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--max-queue", type=int, default=10_000)
+    parser.add_argument("--max-file-bytes", type=int, default=256 * 1024,
+                        help="small, so the run rotates files")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    # Recording alone, with nothing draining the queue
+    log = EventLog(JsonlFileSink(tempfile.gettempdir()), max_queue=args.events)
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    for _ in range(args.events):
+        record_one(log, rng)
+    print(f"record(): {(time.perf_counter() - started) / args.events * 1e6:.2f} us per event")
+
+    with tempfile.TemporaryDirectory() as directory:
+        log, sink, elapsed = asyncio.run(through_file_sink(args, directory))
+        read_back = sum(1 for _ in read_events(directory))
+        files = len(os.listdir(directory))
+        print(f"file sink: {log.written} events in {elapsed:.2f}s "
+              f"({log.written / elapsed:,.0f} events/s), {log.batches} batches, "
+              f"{sink.bytes_written / max(log.written, 1):.1f} bytes/event compressed")
+        print(f"  {files} files after {sink.rotations} rotations, {read_back} events read back, "
+              f"{log.dropped} dropped")
+
+    stats, elapsed = asyncio.run(stalled(args))
+    print(f"stalled sink: {stats['recorded']} queued, {stats['dropped']} dropped "
+          f"of {args.max_queue * 3} in {elapsed * 1000:.0f} ms")
+
+    failures = []
+    if read_back != log.written:
+        failures.append(f"{log.written - read_back} events lost between write and read")
+    if stats["queued"] > args.max_queue or not stats["dropped"]:
+        failures.append(f"the stalled queue grew to {stats['queued']} events")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
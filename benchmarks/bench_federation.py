@@ -0,0 +1,122 @@
+"""
+Fan-out latency and fusion of federated search against fake providers.
+
+Runs FederatedSearch over in-process fake providers with overlapping
+result sets: a fast one, a moderate one and one slower than its own
+timeout (or failing outright). The fused call should return in about the
+slowest *timeout* rather than the slowest provider's latency, with partial
+results, and URLs several providers share should appear once; the run
+fails otherwise.
+
+    python benchmarks/bench_federation.py --slow-latency 2 --timeout 0.3
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from providers import FederatedSearch, ProviderError, SearchProvider, canonical_url  # noqa: E402
+
+
+class FakeProvider(SearchProvider):
+    """
+    Returns `num` results after `latency` seconds, drawn from a shared pool
+    of URLs so providers overlap; every other link differs only in form
+    (www., trailing slash, tracking parameters) from its canonical URL
+    """
+
+    def __init__(self, name: str, latency: float, timeout: float, seed: int,
+                 fail: bool = False, pool: int = 60):
+        super().__init__(timeout)
+        self.name = name
+        self.latency = latency
+        self.fail = fail
+        self.pool = pool
+        self.random = random.Random(seed)
+        self.calls = 0
+
+    async def search(self, query, start, num):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        if self.fail:
+            raise ProviderError(f"{self.name} is down")
+        ids = self.random.sample(range(self.pool), num)
+        results = [
+            {
+                "title": f"{query} result {i}",
+                "link": (f"https://example.com/ai/{i}" if n % 2 else
+                         f"http://www.example.com/ai/{i}/?utm_source={self.name}"),
+                "snippet": f"Machine learning result {i} from {self.name}",
+                "displayed_link": f"example.com/ai/{i}",
+            }
+            for n, i in enumerate(ids)
+        ]
+        return results, True
+
+
+async def run(args):
+    scenarios = {
+        "all healthy": dict(slow_latency=args.fast_latency * 2, fail=False),
+        "one slow": dict(slow_latency=args.slow_latency, fail=False),
+        "one failing": dict(slow_latency=args.fast_latency, fail=True),
+    }
+    failures = []
+    print(f"{'scenario':<12} {'p50 ms':>8} {'max ms':>8} {'fused':>6} {'dupes':>6} {'partial':>8}")
+    for label, scenario in scenarios.items():
+        providers = [
+            FakeProvider("fast", args.fast_latency, args.timeout, seed=1),
+            FakeProvider("medium", args.fast_latency * 2, args.timeout, seed=2),
+            FakeProvider("slow", scenario["slow_latency"], args.timeout, seed=3,
+                         fail=scenario["fail"]),
+        ]
+        federation = FederatedSearch(providers)
+        latencies = []
+        fused_sizes = []
+        duplicates = 0
+        for i in range(args.searches):
+            started = time.perf_counter()
+            fused, _, _ = await federation.search(f"query {i}", 0, args.num)
+            latencies.append(time.perf_counter() - started)
+            fused_sizes.append(len(fused))
+            canonical = [canonical_url(result["link"]) for result in fused]
+            duplicates += len(canonical) - len(set(canonical))
+        latencies.sort()
+        print(f"{label:<12} {latencies[len(latencies) // 2] * 1000:>8.1f} "
+              f"{latencies[-1] * 1000:>8.1f} {sum(fused_sizes) / len(fused_sizes):>6.1f} "
+              f"{duplicates:>6} {federation.partial:>8}")
+
+        if duplicates:
+            failures.append(f"{label}: {duplicates} duplicate URLs in fused results")
+        if latencies[-1] >= args.timeout + args.fast_latency * 2 + 0.1:
+            failures.append(f"{label}: a search took {latencies[-1]:.2f}s, past the timeout")
+        expected_partial = 0 if label == "all healthy" else args.searches
+        if federation.partial != expected_partial:
+            failures.append(f"{label}: {federation.partial} partial searches, "
+                            f"expected {expected_partial}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--searches", type=int, default=20)
+    parser.add_argument("--num", type=int, default=20,
+                        help="results requested from each provider")
+    parser.add_argument("--fast-latency", type=float, default=0.05,
+                        help="latency of the fast provider in seconds")
+    parser.add_argument("--slow-latency", type=float, default=2.0,
+                        help="latency of the slow provider in seconds")
+    parser.add_argument("--timeout", type=float, default=0.3,
+                        help="per-provider timeout in seconds")
+    args = parser.parse_args()
+    failures = asyncio.run(run(args))
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,248 @@
+"""
+Concurrent load test of the search API against a local fake SerpAPI.
+
+Starts the FastAPI app in-process (no network hop to the backend) with the
+fake SerpAPI in a child process, then drives concurrent searches over
+the frontend's 11 category queries. The run has two phases: "cold" starts
+from empty caches and "warm" replays the same requests. For each phase it
+reports throughput, latency percentiles and the error rate, plus process
+memory. Results can be saved as a baseline JSON and later runs compared
+against it to catch regressions.
+
+    python benchmarks/bench_load.py --requests 2000 --concurrency 50
+    python benchmarks/bench_load.py --save benchmarks/baselines/load.json
+    python benchmarks/bench_load.py --compare benchmarks/baselines/load.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import sys
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+import httpx  # noqa: E402
+
+from fake_serpapi import FakeSerpAPIServer  # noqa: E402
+
+# Same queries as the category buttons in frontend/src/App.js
+CATEGORY_QUERIES = [
+    "AI chatbot assistant conversation",
+    "AI code assistant programming development",
+    "AI content creation writing generator",
+    "AI education learning tutorial platform",
+    "generative AI model LLM GPT",
+    "AI healthcare medical diagnosis",
+    "AI image generation art DALL-E Midjourney",
+    "AI music generation audio sound",
+    "AI productivity automation workflow tools",
+    "AI research papers academic science",
+    "AI video generation editing deepfake",
+]
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def memory_usage():
+    """
+    Current and peak resident set size of this process, in MiB
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak_mib = peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+    current_mib = None
+    try:
+        with open("/proc/self/statm") as f:
+            current_mib = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except OSError:
+        pass
+    return {"rss_mib": current_mib, "peak_rss_mib": peak_mib}
+
+
+def make_schedule(requests: int, pages: int):
+    """
+    (query, page) pairs cycling through every category and page
+    """
+    pairs = [(query, page) for page in range(1, pages + 1) for query in CATEGORY_QUERIES]
+    return [pairs[i % len(pairs)] for i in range(requests)]
+
+
+async def run_phase(client: httpx.AsyncClient, schedule, concurrency: int, endpoint: str):
+    latencies = []
+    errors = 0
+    queue = asyncio.Queue()
+    for item in schedule:
+        queue.put_nowait(item)
+
+    async def worker():
+        nonlocal errors
+        while not queue.empty():
+            query, page = queue.get_nowait()
+            started = time.perf_counter()
+            try:
+                response = await client.post(endpoint, json={"query": query, "page": page})
+                # Read the full body so streamed responses are timed to the end
+                body = response.content
+                failed = response.status_code != 200 or b'"type": "error"' in body
+            except httpx.HTTPError:
+                failed = True
+            latencies.append(time.perf_counter() - started)
+            errors += failed
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "requests": len(schedule),
+        "errors": errors,
+        "error_rate": errors / len(schedule),
+        "elapsed_s": elapsed,
+        "throughput_rps": len(schedule) / elapsed,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "max_ms": max(latencies) * 1000,
+    }
+
+
+async def run(app, args):
+    schedule = make_schedule(args.requests, args.pages)
+    endpoint = "/api/search/stream" if args.stream else "/api/search"
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        return {
+            phase: await run_phase(client, schedule, args.concurrency, endpoint)
+            for phase in ("cold", "warm")
+        }
+
+
+def compare(report, baseline, tolerance: float, min_delta_ms: float = 1.0):
+    """
+    Regressions beyond `tolerance` (a fraction) in latency or throughput;
+    latency changes under `min_delta_ms` are treated as noise
+    """
+    regressions = []
+    for phase, current in report["phases"].items():
+        previous = baseline.get("phases", {}).get(phase)
+        if previous is None:
+            continue
+        for metric in ("p50_ms", "p95_ms", "p99_ms"):
+            if (
+                current[metric] > previous[metric] * (1 + tolerance)
+                and current[metric] - previous[metric] >= min_delta_ms
+            ):
+                regressions.append(
+                    f"{phase} {metric}: {previous[metric]:.1f} -> {current[metric]:.1f}"
+                )
+        if current["throughput_rps"] < previous["throughput_rps"] * (1 - tolerance):
+            regressions.append(
+                f"{phase} throughput_rps: {previous['throughput_rps']:.0f} -> "
+                f"{current['throughput_rps']:.0f}"
+            )
+        if current["error_rate"] > previous["error_rate"] + tolerance / 10:
+            regressions.append(
+                f"{phase} error_rate: {previous['error_rate']:.3f} -> {current['error_rate']:.3f}"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=1000,
+                        help="requests per phase")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--pages", type=int, default=2,
+                        help="result pages requested per category query")
+    parser.add_argument("--stream", action="store_true",
+                        help="load /api/search/stream instead of /api/search")
+    parser.add_argument("--latency", type=float, default=0.1,
+                        help="fake upstream latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="fraction of fake upstream calls that fail")
+    parser.add_argument("--results-per-page", type=int, default=20,
+                        help="organic results per fake upstream page")
+    parser.add_argument("--snippet-repeat", type=int, default=1,
+                        help="repeat each fake snippet to grow the payload")
+    parser.add_argument("--save", metavar="PATH", help="write the report as baseline JSON")
+    parser.add_argument("--compare", metavar="PATH", help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed relative regression when comparing")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0,
+                        help="ignore latency regressions smaller than this")
+    args = parser.parse_args()
+
+    fake_options = {
+        "latency": args.latency,
+        "error_rate": args.error_rate,
+        "results_per_page": args.results_per_page,
+        "snippet_repeat": args.snippet_repeat,
+    }
+    with FakeSerpAPIServer(isolated=True, **fake_options) as fake:
+        os.environ["SERPAPI_URL"] = fake.url
+        os.environ.setdefault("SERPAPI_KEY", "benchmark")
+        # Keep the run offline and reproducible: no persistent store or local index
+        os.environ["MONGO_URL"] = ""
+        os.environ["LOCAL_INDEX_DIR"] = ""
+        # All the load comes from one client: measure the server, not the
+        # per-client rate limit or the upstream quota
+        os.environ["RATE_LIMIT_SEARCH_RATE"] = "0"
+        os.environ["UPSTREAM_QUOTA_RATE"] = "0"
+        import server
+
+        memory_before = memory_usage()
+        phases = asyncio.run(run(server.app, args))
+        report = {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "config": {**vars(args), "save": None, "compare": None},
+            "phases": phases,
+            "upstream": fake.stats(),
+            "cache": server.search_cache.stats(),
+            "memory": {"before": memory_before, "after": memory_usage()},
+        }
+
+    for phase, stats in phases.items():
+        print(f"[{phase}] {stats['requests']} requests, {stats['errors']} errors "
+              f"({stats['error_rate']:.1%}), {stats['throughput_rps']:.0f} req/s")
+        print(f"       p50 {stats['p50_ms']:.1f} ms  p95 {stats['p95_ms']:.1f} ms  "
+              f"p99 {stats['p99_ms']:.1f} ms  max {stats['max_ms']:.1f} ms")
+    print(f"upstream calls: {report['upstream']['calls']} ({report['upstream']['errors']} failed)")
+    print(f"cache hit rate: {report['cache']['hit_rate']:.1%}")
+    memory = report["memory"]["after"]
+    rss = f"{memory['rss_mib']:.0f} MiB" if memory["rss_mib"] is not None else "n/a"
+    print(f"memory:         {rss} RSS (peak {memory['peak_rss_mib']:.0f} MiB)")
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"baseline saved to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        knobs = [
+            name for name, value in report["config"].items()
+            if name not in ("tolerance", "min_delta_ms") and baseline.get("config", {}).get(name) != value
+        ]
+        if knobs:
+            print(f"note: baseline was run with different {', '.join(knobs)}")
+        regressions = compare(report, baseline, args.tolerance, args.min_delta_ms)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+        print(f"no regressions beyond {args.tolerance:.0%} of {args.compare}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
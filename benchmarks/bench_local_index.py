@@ -0,0 +1,153 @@
+"""
+Build and query latency of the local BM25 index on a synthetic corpus.
+
+Indexes `--docs` generated AI-flavoured results through LocalIndex.add,
+exactly as served pages are, with flushes and tiered merges running as
+they would in the app. Then it times BM25 queries (the frontend category
+queries plus random term pairs) against the merged on-disk segments and
+reopens the index from disk to time a cold open. With --max-p99 it
+fails when the 99th percentile query latency is over that budget.
+
+    python benchmarks/bench_local_index.py --docs 200000
+    python benchmarks/bench_local_index.py --docs 1000000 --queries 500
+    python benchmarks/bench_local_index.py --docs 50000 --max-p99 20
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from local_index import LocalIndex  # noqa: E402
+
+from bench_load import CATEGORY_QUERIES, percentile  # noqa: E402
+
+AI_TERMS = (
+    "ai artificial intelligence machine learning deep neural network llm gpt chatgpt "
+    "openai claude gemini transformer diffusion model generative chatbot assistant code "
+    "image video music audio research paper healthcare education writing automation"
+).split()
+
+
+def make_vocabulary(size: int, rng: random.Random):
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(letters) for _ in range(rng.randint(3, 10))))
+    return list(words)
+
+
+def make_documents(count: int, vocabulary, seed: int):
+    """
+    Results with Zipf-distributed filler words around a few AI terms
+    """
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    filler = rng.choices(vocabulary, weights=weights, k=count * 24)
+    for i in range(count):
+        words = filler[i * 24:(i + 1) * 24]
+        ai = rng.sample(AI_TERMS, 3)
+        yield {
+            "title": " ".join(ai[:2] + words[:6]),
+            "link": f"https://example{i % 997}.com/articles/{i}",
+            "snippet": " ".join(words[6:] + ai[2:]),
+            "displayed_link": f"example{i % 997}.com",
+        }
+
+
+async def build(index: LocalIndex, docs, batch: int):
+    started = time.perf_counter()
+    pending = []
+    for doc in docs:
+        pending.append(doc)
+        if len(pending) == batch:
+            index.add(pending)
+            pending = []
+            # Let scheduled flushes and merges make progress, like the app does
+            await asyncio.sleep(0)
+    index.add(pending)
+    await index.flush()
+    while index._flush_task is not None and not index._flush_task.done():
+        await index._flush_task
+    return time.perf_counter() - started
+
+
+def time_queries(index: LocalIndex, queries, k: int):
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        index.search(query, k=k)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def directory_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    vocabulary = make_vocabulary(args.vocabulary, rng)
+    directory = tempfile.mkdtemp(prefix="local-index-bench-")
+    try:
+        index = LocalIndex(directory, flush_every=args.flush_every, merge_factor=args.merge_factor)
+        index.open()
+        elapsed = await build(index, make_documents(args.docs, vocabulary, args.seed), batch=10)
+        stats = index.stats()
+        print(f"indexed {stats['documents']} docs in {elapsed:.1f}s "
+              f"({stats['documents'] / elapsed:.0f} docs/s), {stats['flushes']} flushes, "
+              f"{stats['merges']} merges, {stats['segments']} segments, "
+              f"{directory_size(directory) / 1024 / 1024:.0f} MiB on disk")
+
+        queries = [rng.choice(CATEGORY_QUERIES) for _ in range(args.queries // 2)]
+        queries += [f"{rng.choice(AI_TERMS)} {rng.choice(vocabulary[:2000])}"
+                    for _ in range(args.queries - len(queries))]
+        time_queries(index, queries[:20], args.k)  # warm the page cache and norms
+        latencies = time_queries(index, queries, args.k)
+        p99 = percentile(latencies, 0.99)
+        print(f"query p50 {percentile(latencies, 0.5) * 1000:.2f} ms  "
+              f"p95 {percentile(latencies, 0.95) * 1000:.2f} ms  "
+              f"p99 {percentile(latencies, 0.99) * 1000:.2f} ms  "
+              f"max {max(latencies) * 1000:.2f} ms over {len(latencies)} queries")
+        await index.close()
+
+        started = time.perf_counter()
+        reopened = LocalIndex(directory)
+        reopened.open()
+        opened = time.perf_counter() - started
+        started = time.perf_counter()
+        reopened.search(CATEGORY_QUERIES[0], k=args.k)
+        print(f"reopen {opened * 1000:.1f} ms, first query after reopen "
+              f"{(time.perf_counter() - started) * 1000:.1f} ms")
+        await reopened.close()
+    finally:
+        shutil.rmtree(directory)
+
+    if args.max_p99 is not None and p99 * 1000 > args.max_p99:
+        print(f"OVER BUDGET query p99 {p99 * 1000:.2f} ms > {args.max_p99:.2f} ms")
+        return 1
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--docs", type=int, default=200_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10, help="results per query")
+    parser.add_argument("--vocabulary", type=int, default=50_000)
+    parser.add_argument("--flush-every", type=int, default=1000)
+    parser.add_argument("--merge-factor", type=int, default=8)
+    parser.add_argument("--max-p99", type=float, metavar="MS",
+                        help="fail if the 99th percentile query takes longer")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+"""
+Cache sharing and cost of query rewriting.
+
+Generates variants of a set of topic queries, the way users type them:
+other case and spacing, words reordered or repeated, and synonyms ("chat
+gpt" for "chatgpt", "large language models" for "llm"). Reports how many
+cache keys the variants fall into with the old key (the case- and
+whitespace-normalized query) and with the rewrite key, then sends every
+variant to /api/search on the in-process app and counts the upstream
+calls to a fake SerpAPI. Also reports how many queries are sent without
+the AI suffix and the cost of a rewrite, memoized and not. Fails unless
+the variants share fewer keys, and make fewer upstream calls, than the
+normalized queries would.
+
+    python benchmarks/bench_queries.py --variants 8
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+import httpx  # noqa: E402
+
+from cache import normalize_query  # noqa: E402
+from fake_serpapi import FakeSerpAPIServer  # noqa: E402
+from queries import QueryRewriter  # noqa: E402
+
+TOPICS = [
+    "chatgpt prompt engineering guide", "openai api pricing", "llm fine tuning tutorial",
+    "stable diffusion xl models", "midjourney prompts for logos", "ai code assistant comparison",
+    "hugging face transformers tutorial", "rag vector database setup", "dall-e image editing",
+    "generative ai for marketing", "best python books", "running shoes review",
+]
+
+# Other ways the same words get typed
+SPELLINGS = {
+    "chatgpt": ["ChatGPT", "chat gpt", "Chat-GPT", "GPT"],
+    "openai": ["OpenAI", "open ai"],
+    "llm": ["LLM", "large language models", "LLMs"],
+    "stable diffusion": ["Stable Diffusion", "stable-diffusion"],
+    "hugging face": ["HuggingFace", "Hugging Face"],
+    "dall-e": ["DALL-E", "dalle"],
+    "generative ai": ["GenAI", "gen ai"],
+    "ai": ["AI", "A.I."],
+}
+
+
+def variant(query: str, rng: random.Random) -> str:
+    for canonical, spellings in SPELLINGS.items():
+        if canonical in query and rng.random() < 0.5:
+            query = query.replace(canonical, rng.choice(spellings))
+    words = query.split()
+    if rng.random() < 0.3:
+        i, j = rng.randrange(len(words)), rng.randrange(len(words))
+        words[i], words[j] = words[j], words[i]
+    if rng.random() < 0.2:
+        words.append(rng.choice(words))
+    if rng.random() < 0.3:
+        words = [word.upper() if rng.random() < 0.3 else word.capitalize() for word in words]
+    return rng.choice([" ", "  "]).join(words) + rng.choice(["", " ", "?"])
+
+
+async def send_all(app, queries):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench",
+                                 timeout=None) as client:
+        for query in queries:
+            response = await client.post("/api/search", json={"query": query})
+            response.raise_for_status()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--variants", type=int, default=8, help="variants per topic")
+    parser.add_argument("--latency", type=float, default=0.02,
+                        help="fake upstream latency in seconds")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    queries = [variant(topic, rng) for topic in TOPICS for _ in range(args.variants)]
+    rewriter = QueryRewriter()
+    old_keys = {normalize_query(query) for query in queries}
+    new_keys = {rewriter.key(query) for query in queries}
+    print(f"{len(queries)} queries, variants of {len(TOPICS)} topics")
+    print(f"cache keys: {len(old_keys)} normalized, {len(new_keys)} rewritten")
+    unsuffixed = sum(rewriter.rewrite(topic).has_ai_terms for topic in TOPICS)
+    print(f"sent without the AI suffix: {unsuffixed} of {len(TOPICS)} topics")
+
+    cold = QueryRewriter(max_memo=1)
+    started = time.perf_counter()
+    for query in queries:
+        cold.rewrite(query + " x")
+        cold.rewrite(query)
+    unmemoized = (time.perf_counter() - started) / (2 * len(queries))
+    started = time.perf_counter()
+    for _ in range(100):
+        for query in queries:
+            rewriter.rewrite(query)
+    memoized = (time.perf_counter() - started) / (100 * len(queries))
+    print(f"rewrite: {unmemoized * 1e6:.1f} us, {memoized * 1e6:.2f} us memoized")
+
+    with FakeSerpAPIServer(latency=args.latency) as fake:
+        os.environ["SERPAPI_URL"] = fake.url
+        os.environ.setdefault("SERPAPI_KEY", "benchmark")
+        os.environ["MONGO_URL"] = ""
+        os.environ["LOCAL_INDEX_DIR"] = ""
+        os.environ["EVENT_LOG"] = "off"
+        os.environ["RATE_LIMIT_SEARCH_RATE"] = "0"
+        os.environ["UPSTREAM_QUOTA_RATE"] = "0"
+        import server
+
+        asyncio.run(send_all(server.app, queries))
+        calls = fake.calls
+        print(f"upstream calls: {calls} for {len(new_keys)} rewritten keys "
+              f"({len(old_keys)} normalized keys would each have missed)")
+
+    failures = []
+    if len(new_keys) >= len(old_keys):
+        failures.append("rewriting merged no cache keys")
+    if calls >= len(old_keys):
+        failures.append(f"{calls} upstream calls, no fewer than one per normalized key")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
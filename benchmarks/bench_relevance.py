@@ -0,0 +1,118 @@
+"""
+Micro-benchmark of is_ai_related against the original per-keyword scan.
+
+Builds a large synthetic corpus of search results (a mix of on-topic and
+off-topic text), checks both implementations agree on it, and reports the
+per-result cost of each. Also times score_batch, the offline re-scoring
+entry point, on the corpus and on an archive that holds each result
+`--repeats` times, and checks its verdicts agree too.
+
+    python benchmarks/bench_relevance.py --results 50000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from relevance import AI_DOMAINS, AI_KEYWORDS, is_ai_related, score_batch  # noqa: E402
+
+FILLER = (
+    "the best new guide to tools for your team with reviews news and tips "
+    "on travel cooking finance storage organization weather shoes design"
+).split()
+
+TOPICAL = [
+    "machine learning", "openai", "chatgpt", "neural network", "ai tool",
+    "transformers", "pytorch", "deep learning", "llm", "stable diffusion",
+]
+
+
+def legacy_is_ai_related(title: str, snippet: str, link: str) -> bool:
+    """
+    The original implementation, kept here as the comparison baseline
+    """
+    text_content = f"{title} {snippet}".lower()
+    domain = link.lower()
+
+    for ai_domain in AI_DOMAINS:
+        if ai_domain in domain:
+            return True
+
+    keyword_matches = 0
+    for keyword in AI_KEYWORDS:
+        if keyword in text_content:
+            keyword_matches += 1
+
+    core_ai_terms = ["artificial intelligence", "machine learning", "deep learning",
+                     "neural network", "openai", "chatgpt", "claude", "gemini"]
+
+    has_core_term = any(term in text_content for term in core_ai_terms)
+
+    return keyword_matches >= 2 or (keyword_matches >= 1 and has_core_term)
+
+
+def make_corpus(size: int, topical_ratio: float, seed: int = 7):
+    rng = random.Random(seed)
+    corpus = []
+    for n in range(size):
+        words = [rng.choice(FILLER) for _ in range(rng.randint(25, 45))]
+        if rng.random() < topical_ratio:
+            for _ in range(rng.randint(1, 3)):
+                words.insert(rng.randrange(len(words)), rng.choice(TOPICAL))
+        title = " ".join(words[:8]).title()
+        snippet = " ".join(words[8:]).capitalize() + "."
+        link = f"https://site{n % 997}.example.com/articles/{n}"
+        corpus.append((title, snippet, link))
+    return corpus
+
+
+def timed(fn, corpus):
+    started = time.perf_counter()
+    verdicts = [fn(*item) for item in corpus]
+    return time.perf_counter() - started, verdicts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--results", type=int, default=50000)
+    parser.add_argument("--topical-ratio", type=float, default=0.5,
+                        help="fraction of results that mention AI terms")
+    parser.add_argument("--repeats", type=int, default=5,
+                        help="copies of each result in the archive")
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.results, args.topical_ratio)
+
+    legacy_time, legacy = timed(legacy_is_ai_related, corpus)
+    compiled_time, compiled = timed(is_ai_related, corpus)
+
+    started = time.perf_counter()
+    batch, _ = score_batch(corpus)
+    batch_time = time.perf_counter() - started
+    archive = corpus * args.repeats
+    archive_loop_time, _ = timed(is_ai_related, archive)
+    started = time.perf_counter()
+    score_batch(archive)
+    archive_batch_time = time.perf_counter() - started
+
+    mismatches = sum(a != b for a, b in zip(legacy, compiled))
+    mismatches += sum(a != b for a, b in zip(compiled, batch.tolist()))
+
+    def per_result(seconds):
+        return f"{seconds:.3f}s ({seconds / len(corpus) * 1e6:.2f} us/result)"
+
+    print(f"results:           {len(corpus)} ({sum(compiled)} AI-related)")
+    print(f"legacy scan:       {per_result(legacy_time)}")
+    print(f"compiled matcher:  {per_result(compiled_time)}  {legacy_time / compiled_time:.2f}x")
+    print(f"score_batch:       {per_result(batch_time)}")
+    print(f"archive x{args.repeats}:        is_ai_related {archive_loop_time:.3f}s, "
+          f"score_batch {archive_batch_time:.3f}s  {archive_loop_time / archive_batch_time:.2f}x")
+    print(f"mismatches:        {mismatches}")
+    return 0 if mismatches == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
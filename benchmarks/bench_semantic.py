@@ -0,0 +1,107 @@
+"""
+Accuracy and per-page cost of the semantic relevance stage.
+
+Scores a small hand-labelled set of search results (AI content in plain
+and unusual wording, off-topic pages on GitHub and Medium, keyword
+false friends) with each RELEVANCE_MODE and reports precision and recall,
+then times pages of `--page-size` results through the hybrid stage with
+a cold and a warm vector cache. The set (tests/fixtures/
+labelled_results.json, also checked by tests/test_semantic.py) was
+written alongside the prototypes, so a perfect score on it shows the
+stage covers that wording, not how accurate it is on real traffic.
+
+    python benchmarks/bench_semantic.py --threshold 0.06
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from semantic import RelevanceStage, prototype_scorer  # noqa: E402
+
+# Hand-labelled results shared with tests/test_semantic.py
+with open(os.path.join(os.path.dirname(__file__), "..", "tests", "fixtures",
+                       "labelled_results.json"), encoding="utf-8") as labelled_file:
+    LABELLED = [(item["title"], item["snippet"], item["link"], item["ai"])
+                for item in json.load(labelled_file)]
+
+FILLER = (
+    "the best new guide to tools for your team with reviews news and tips on travel "
+    "cooking finance storage organization weather shoes design model training learning"
+).split()
+
+
+def evaluate(stage: RelevanceStage):
+    verdicts = stage.select([
+        {"title": title, "snippet": snippet, "link": link} for title, snippet, link, _ in LABELLED
+    ])
+    labels = [label for *_, label in LABELLED]
+    true_positive = sum(v and l for v, l in zip(verdicts, labels))
+    precision = true_positive / max(1, sum(verdicts))
+    recall = true_positive / max(1, sum(labels))
+    errors = [item[0] for item, v, l in zip(LABELLED, verdicts, labels) if v != l]
+    return precision, recall, errors
+
+
+def make_pages(count: int, page_size: int, seed: int):
+    rng = random.Random(seed)
+    pages = []
+    for p in range(count):
+        page = []
+        for i in range(page_size):
+            title, snippet, _, _ = rng.choice(LABELLED)
+            words = [rng.choice(FILLER) for _ in range(rng.randint(10, 25))]
+            page.append({
+                "title": title,
+                "snippet": f"{snippet} {' '.join(words)}",
+                "link": f"https://site{rng.randrange(997)}.example.com/{p}/{i}",
+            })
+        pages.append(page)
+    return pages
+
+
+def time_pages(stage: RelevanceStage, pages):
+    latencies = []
+    for page in pages:
+        started = time.perf_counter()
+        stage.select(page)
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    return latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--threshold", type=float, default=0.06)
+    parser.add_argument("--keyword-floor", type=float, default=0.03)
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    print(f"{'mode':<9} {'precision':>9} {'recall':>7}  misclassified")
+    for mode in RelevanceStage.MODES:
+        stage = RelevanceStage(mode, threshold=args.threshold, keyword_floor=args.keyword_floor)
+        precision, recall, errors = evaluate(stage)
+        print(f"{mode:<9} {precision:>9.2f} {recall:>7.2f}  {'; '.join(errors)}")
+
+    stage = RelevanceStage("hybrid", prototype_scorer(args.pages * args.page_size),
+                           threshold=args.threshold, keyword_floor=args.keyword_floor)
+    pages = make_pages(args.pages, args.page_size, args.seed)
+    cold = time_pages(stage, pages)
+    warm = time_pages(stage, pages)
+    print(f"per page of {args.page_size}: cold cache p50 {cold[0] * 1000:.2f} ms "
+          f"p99 {cold[1] * 1000:.2f} ms, warm cache p50 {warm[0] * 1000:.2f} ms "
+          f"p99 {warm[1] * 1000:.2f} ms")
+
+    keywords = RelevanceStage("keywords")
+    baseline = time_pages(keywords, pages)
+    print(f"keyword rules alone: p50 {baseline[0] * 1000:.2f} ms p99 {baseline[1] * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+Cold-start cost of the backend: imports, startup hooks and time to ready.
+
+Imports the server in fresh interpreters under `python -X importtime` and
+reports the import time of each top-level package, then times each
+startup hook in-process, then starts the real server (uvicorn, or the
+gunicorn production profile with `--workers`) against a local fake
+SerpAPI and measures the wall time until /api/ready answers. Medians are
+taken over `--runs` runs. With budgets set, it exits non-zero when the
+median import or time to ready goes over them, so CI can assert on it.
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --runs 5 --max-import 2.0 --max-ready 4.0
+    python benchmarks/bench_startup.py --workers 4
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+sys.path.insert(0, BACKEND)
+
+import httpx  # noqa: E402
+
+from fake_serpapi import FakeSerpAPIServer  # noqa: E402
+
+
+def offline_env(fake_url: str, directory: str, workers: int):
+    """
+    The server's environment for a run: the fake upstream, an empty local
+    index, no persistent store
+    """
+    env = dict(os.environ)
+    env.update({
+        "SERPAPI_URL": fake_url,
+        "SERPAPI_KEY": env.get("SERPAPI_KEY", "benchmark"),
+        "MONGO_URL": "",
+        "LOCAL_INDEX_DIR": os.path.join(directory, "local_index"),
+        "WEB_CONCURRENCY": str(workers),
+        "WORKER_STATE_DIR": os.path.join(directory, "workers") if workers > 1 else "",
+    })
+    return env
+
+
+def import_times(env):
+    """
+    Total seconds to import the server in a fresh interpreter, and the
+    seconds spent importing each top-level package
+    """
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import server"],
+        cwd=BACKEND, env=env, capture_output=True, text=True, check=True,
+    )
+    packages = defaultdict(float)
+    total = 0.0
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        packages[name.strip().split(".")[0]] += int(self_us) / 1e6
+        if name.strip() == "server":
+            total = int(cumulative_us) / 1e6
+    return total, packages
+
+
+def hook_times(env):
+    """
+    Seconds each startup hook takes, run in this process
+    """
+    os.environ.update(env)
+    import server
+
+    async def run():
+        timings = []
+        for hook in server.app.router.on_startup:
+            started = time.perf_counter()
+            await hook()
+            timings.append((hook.__name__, time.perf_counter() - started))
+        for hook in server.app.router.on_shutdown:
+            await hook()
+        return timings
+
+    return asyncio.run(run())
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def time_to_ready(env, workers: int, timeout: float = 60.0) -> float:
+    """
+    Seconds from starting the server process until /api/ready answers 200
+    """
+    port = _free_port()
+    if workers > 1:
+        command = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "server:app"]
+    else:
+        command = [sys.executable, "server.py"]
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        command, cwd=BACKEND, env={**env, "PORT": str(port)},
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"Server exited during startup with code {process.returncode}")
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/api/ready").status_code == 200:
+                    return time.perf_counter() - started
+            except httpx.TransportError:
+                pass
+            time.sleep(0.02)
+        raise RuntimeError(f"Server not ready after {timeout:.0f}s")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="start the gunicorn profile with this many workers")
+    parser.add_argument("--top", type=int, default=12,
+                        help="packages listed in the import profile")
+    parser.add_argument("--max-import", type=float, metavar="SECONDS",
+                        help="fail if the median server import takes longer")
+    parser.add_argument("--max-ready", type=float, metavar="SECONDS",
+                        help="fail if the median time to ready is longer")
+    args = parser.parse_args()
+
+    with FakeSerpAPIServer(isolated=True) as fake, tempfile.TemporaryDirectory() as directory:
+        env = offline_env(fake.url, directory, args.workers)
+
+        imports = [import_times(env) for _ in range(args.runs)]
+        import_median = statistics.median(total for total, _ in imports)
+        packages = defaultdict(list)
+        for _, run in imports:
+            for package, seconds in run.items():
+                packages[package].append(seconds)
+        print(f"server import: median {import_median * 1000:.0f} ms over {args.runs} runs")
+        ranked = sorted(packages.items(), key=lambda item: -statistics.median(item[1]))
+        for package, seconds in ranked[:args.top]:
+            print(f"  {package:<24} {statistics.median(seconds) * 1000:>7.1f} ms")
+
+        readies = [time_to_ready(env, args.workers) for _ in range(args.runs)]
+        ready_median = statistics.median(readies)
+        server = f"gunicorn, {args.workers} workers" if args.workers > 1 else "uvicorn"
+        print(f"time to ready ({server}): median {ready_median * 1000:.0f} ms, "
+              f"max {max(readies) * 1000:.0f} ms")
+
+        print("startup hooks:")
+        for name, seconds in hook_times(env):
+            print(f"  {name:<32} {seconds * 1000:>7.1f} ms")
+
+    over = []
+    if args.max_import is not None and import_median > args.max_import:
+        over.append(f"server import {import_median:.2f}s > {args.max_import:.2f}s")
+    if args.max_ready is not None and ready_median > args.max_ready:
+        over.append(f"time to ready {ready_median:.2f}s > {args.max_ready:.2f}s")
+    for budget in over:
+        print(f"OVER BUDGET {budget}")
+    return 1 if over else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+"""
+Build time, memory and lookup latency of the suggestion index.
+
+Indexes a large synthetic query log (Zipf-distributed popularity), then
+times lookups for prefixes of real queries, including mistyped ones.
+With --max-p99 it fails when the 99th percentile lookup is over that
+budget.
+
+    python benchmarks/bench_suggestions.py --queries 150000
+    python benchmarks/bench_suggestions.py --max-p99 2
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from relevance import AI_KEYWORDS  # noqa: E402
+from suggestions import SuggestionIndex  # noqa: E402
+
+SYLLABLES = ["ka", "lo", "mi", "ne", "ra", "to", "vu", "zi", "de", "po", "sa", "qu", "an", "el"]
+
+
+def make_vocabulary(rng: random.Random, size: int):
+    words = {word for keyword in AI_KEYWORDS for word in keyword.split()}
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def make_queries(count: int, seed: int = 11):
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(rng, 5000)
+    queries = set()
+    while len(queries) < count:
+        queries.add(" ".join(rng.choice(vocabulary) for _ in range(rng.randint(1, 5))))
+    # Zipf-like popularity: the i-th query is seen ~1/i as often
+    return [(query, 1000.0 / (i + 1)) for i, query in enumerate(sorted(queries, key=hash))]
+
+
+def mistype(rng: random.Random, text: str) -> str:
+    if len(text) < 2:
+        return text
+    i = rng.randrange(len(text) - 1)
+    return text[:i] + text[i + 1] + text[i] + text[i + 2:]
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--queries", type=int, default=150000)
+    parser.add_argument("--lookups", type=int, default=20000)
+    parser.add_argument("--typo-ratio", type=float, default=0.2)
+    parser.add_argument("--max-p99", type=float, metavar="MS",
+                        help="fail if the 99th percentile lookup takes longer")
+    args = parser.parse_args()
+
+    queries = make_queries(args.queries)
+
+    # Memory is measured on a separate build, as tracing slows it down
+    tracemalloc.start()
+    SuggestionIndex(max_entries=args.queries * 2).build(queries)
+    memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    index = SuggestionIndex(max_entries=args.queries * 2)
+    started = time.perf_counter()
+    index.build(queries)
+    build_time = time.perf_counter() - started
+
+    rng = random.Random(5)
+    timings = []
+    for _ in range(args.lookups):
+        query = rng.choice(queries)[0]
+        prefix = query[: rng.randint(1, min(len(query), 12))]
+        if rng.random() < args.typo_ratio:
+            prefix = mistype(rng, prefix)
+        started = time.perf_counter()
+        index.suggest(prefix)
+        timings.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    for query, _ in queries[:10000]:
+        index.record(query)
+    record_time = (time.perf_counter() - started) / 10000 * 1e6
+
+    print(f"indexed queries:  {len(index)}")
+    print(f"build time:       {build_time:.2f}s")
+    print(f"peak memory:      {memory / 1024 / 1024:.1f} MiB")
+    print(f"record:           {record_time:.1f} us/query")
+    print(f"lookup p50:       {statistics.median(timings):.3f} ms")
+    print(f"lookup p99:       {percentile(timings, 0.99):.3f} ms")
+    print(f"lookup max:       {max(timings):.3f} ms")
+    p99 = percentile(timings, 0.99)
+    if args.max_p99 is not None and p99 > args.max_p99:
+        print(f"OVER BUDGET lookup p99 {p99:.3f} ms > {args.max_p99:.3f} ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
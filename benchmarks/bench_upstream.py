@@ -0,0 +1,75 @@
+"""
+Throughput of the pooled SerpAPI client against the local fake SerpAPI.
+
+With a non-blocking client, requests/second should grow roughly linearly
+with the number of concurrent callers until the concurrency limit is hit.
+Fails if the best level does not reach --min-scaling times the throughput
+of the first.
+
+    python benchmarks/bench_upstream.py --latency 0.05 --duration 3
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from fake_serpapi import FakeSerpAPIServer  # noqa: E402
+from upstream import SerpAPIClient  # noqa: E402
+
+
+async def drive(client: SerpAPIClient, concurrency: int, duration: float) -> int:
+    deadline = time.perf_counter() + duration
+    completed = 0
+
+    async def worker(worker_id: int):
+        nonlocal completed
+        while time.perf_counter() < deadline:
+            await client.search({"q": f"query {worker_id}", "num": 20, "start": 0})
+            completed += 1
+
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    return completed
+
+
+async def run(url: str, levels, duration: float, max_concurrency: int):
+    client = SerpAPIClient(base_url=url, max_concurrency=max_concurrency)
+    await client.start()
+    throughputs = []
+    try:
+        print(f"{'clients':>8} {'requests':>9} {'req/s':>9}")
+        for concurrency in levels:
+            started = time.perf_counter()
+            completed = await drive(client, concurrency, duration)
+            elapsed = time.perf_counter() - started
+            throughputs.append(completed / elapsed)
+            print(f"{concurrency:>8} {completed:>9} {completed / elapsed:>9.1f}")
+    finally:
+        await client.close()
+    return throughputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--latency", type=float, default=0.05,
+                        help="fake upstream latency in seconds")
+    parser.add_argument("--duration", type=float, default=3.0,
+                        help="seconds to run each concurrency level")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--max-concurrency", type=int, default=50)
+    parser.add_argument("--min-scaling", type=float, default=4.0)
+    args = parser.parse_args()
+
+    with FakeSerpAPIServer(latency=args.latency) as fake:
+        throughputs = asyncio.run(run(fake.url, args.levels, args.duration, args.max_concurrency))
+    scaling = max(throughputs) / max(throughputs[0], 1e-9)
+    if scaling < args.min_scaling:
+        print(f"FAIL throughput scaled {scaling:.1f}x, under {args.min_scaling:.1f}x")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+"""
+Popularity-driven cache warming, simulated.
+
+Replays a Zipf-distributed stream of searches against a ResultCache on a
+simulated clock, once without warming and once with a CacheWarmer, and
+reports fresh cache hits, stale hits (served while refreshed behind the
+request), misses (the user waits for upstream) and upstream calls for
+each run. Also times recording a search and checks the sketch's top-k
+against the exact counts. Fails unless warming raises the fresh hit rate
+and the top-k finds at least --min-recall of the true hottest keys.
+
+    python benchmarks/bench_warming.py --rate 5 --hours 4 --budget 10
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from cache import ResultCache  # noqa: E402
+from warming import CacheWarmer  # noqa: E402
+
+
+class SimulatedClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def search_stream(args):
+    """
+    (second, key) pairs: `rate` searches a second over `queries` distinct
+    queries with Zipf popularity, a fifth of them for page 2
+    """
+    rng = random.Random(args.seed)
+    weights = [1 / (rank + 1) ** args.skew for rank in range(args.queries)]
+    seconds = int(args.hours * 3600)
+    queries = rng.choices(range(args.queries), weights, k=seconds * args.rate)
+    for i, query in enumerate(queries):
+        yield i // args.rate, (f"query {query}", 2 if rng.random() < 0.2 else 1)
+
+
+async def replay(args, warm: bool):
+    clock = SimulatedClock()
+    cache = ResultCache(max_entries=args.max_entries, ttl=args.ttl, stale_ttl=args.stale_ttl,
+                        clock=clock)
+    counts = Counter()
+
+    async def reload(key):
+        # No persistent store in the simulation
+        return None
+
+    async def refresh(key):
+        counts["warm_calls"] += 1
+        cache.set(key, "page")
+
+    warmer = CacheWarmer(cache.expires_in, reload, refresh, interval=args.interval,
+                         lead=args.lead, budget=args.budget, top=args.top,
+                         min_count=args.min_count, clock=clock)
+    next_pass = args.interval
+    for second, key in search_stream(args):
+        clock.now = float(second)
+        if warm and clock.now >= next_pass:
+            await warmer.warm_once()
+            next_pass += args.interval
+        if cache.get(key) is not None:
+            counts["fresh"] += 1
+        elif cache.get_stale(key) is not None:
+            # Served stale, refreshed behind the request
+            counts["stale"] += 1
+            counts["calls"] += 1
+            cache.set(key, "page")
+        else:
+            counts["miss"] += 1
+            counts["calls"] += 1
+            cache.set(key, "page")
+        warmer.record(key)
+    return counts, warmer
+
+
+def report(name, counts, searches):
+    calls = counts["calls"] + counts["warm_calls"]
+    print(f"{name:<8} fresh {counts['fresh'] / searches:6.1%}  "
+          f"stale {counts['stale'] / searches:6.1%}  "
+          f"miss {counts['miss'] / searches:6.1%}  upstream calls {calls} "
+          f"({counts['warm_calls']} warming)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rate", type=int, default=5, help="searches per simulated second")
+    parser.add_argument("--hours", type=float, default=4)
+    parser.add_argument("--queries", type=int, default=20_000)
+    parser.add_argument("--skew", type=float, default=1.0, help="Zipf exponent")
+    parser.add_argument("--max-entries", type=int, default=1024)
+    parser.add_argument("--ttl", type=float, default=600)
+    parser.add_argument("--stale-ttl", type=float, default=3600)
+    parser.add_argument("--interval", type=float, default=30)
+    parser.add_argument("--lead", type=float, default=90)
+    parser.add_argument("--budget", type=float, default=20, help="warming refreshes per minute")
+    parser.add_argument("--top", type=int, default=100)
+    parser.add_argument("--min-count", type=int, default=3)
+    parser.add_argument("--min-recall", type=float, default=0.9)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    searches = int(args.hours * 3600) * args.rate
+    print(f"{searches} searches over {args.hours}h, {args.queries} queries, "
+          f"TTL {args.ttl:.0f}s, budget {args.budget:.0f}/min")
+    cold, _ = asyncio.run(replay(args, warm=False))
+    report("no warm", cold, searches)
+    warmed, warmer = asyncio.run(replay(args, warm=True))
+    report("warm", warmed, searches)
+    print(f"  warming passes {warmer.passes}: {warmer.counts}")
+
+    # The sketch's top-k against exact counts over the same stream
+    exact = Counter(key for _, key in search_stream(args))
+    true_top = {key for key, _ in exact.most_common(args.top)}
+    found = {key for key, _ in warmer.top.items()}
+    recall = len(found & true_top) / len(true_top)
+    print(f"top-{args.top} recall {recall:.0%}")
+
+    keys = [key for _, key in zip(range(100_000), search_stream(args))]
+    timing = CacheWarmer(lambda key: None, reload=None, refresh=None)
+    started = time.perf_counter()
+    for _, key in keys:
+        timing.record(key)
+    print(f"record(): {(time.perf_counter() - started) / len(keys) * 1e6:.2f} us per search")
+
+    failures = []
+    if warmed["fresh"] <= cold["fresh"]:
+        failures.append("warming did not raise the fresh hit rate")
+    if recall < args.min_recall:
+        failures.append(f"top-{args.top} recall {recall:.0%} under {args.min_recall:.0%}")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
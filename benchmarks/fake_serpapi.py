@@ -0,0 +1,192 @@
+"""
+Local stand-in for the SerpAPI search endpoint used by the benchmarks.
+
+Serves `/search.json` with a configurable latency, error rate and result
+payload so the backend can be load-tested offline without spending API
+quota.
+"""
+import asyncio
+import multiprocessing
+import random
+import socket
+import threading
+import time
+
+import httpx
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+AI_SNIPPETS = [
+    "A practical guide to machine learning and neural network training.",
+    "OpenAI released a new ChatGPT model for developers building AI tools.",
+    "Deep learning with PyTorch and TensorFlow for computer vision tasks.",
+    "How large language model agents use retrieval augmented generation.",
+]
+
+OTHER_SNIPPETS = [
+    "Ten easy weeknight dinner recipes for the whole family.",
+    "Local weather forecast and weekend travel updates.",
+    "Compare the best running shoes of the season.",
+]
+
+# Extra words mixed into each snippet, so distinct results are not
+# collapsed as near-duplicates of each other
+AI_WORDS = " ".join(AI_SNIPPETS).lower().replace(".", "").split() + (
+    "benchmarks datasets tokenizers embeddings checkpoints inference pipelines "
+    "evaluation prompts adapters quantization notebooks gpus clusters transformers"
+).split()
+OTHER_WORDS = " ".join(OTHER_SNIPPETS).lower().replace(".", "").split() + (
+    "gardens kitchens bicycles museums beaches markets festivals holidays "
+    "budgets mountains rivers trains parks islands bakeries"
+).split()
+
+
+def _snippet(words, n: int) -> str:
+    return " ".join(random.Random(n).sample(words, 10)).capitalize() + "."
+
+
+def make_organic_results(query: str, start: int, count: int, snippet_repeat: int = 1):
+    """
+    Deterministic mix of AI-related and unrelated results for a query/offset;
+    `snippet_repeat` pads each snippet out to simulate larger payloads
+    """
+    results = []
+    for i in range(count):
+        n = start + i
+        if n % 3 == 2:
+            snippet = _snippet(OTHER_WORDS, n)
+            title = f"{query} - lifestyle article {n}"
+            link = f"https://example-news.com/articles/{n}"
+        else:
+            snippet = _snippet(AI_WORDS, n)
+            title = f"{query} - machine learning resource {n}"
+            link = f"https://ai-resources.example.org/{n}"
+        results.append({
+            "position": n + 1,
+            "title": title,
+            "link": link,
+            "displayed_link": link.replace("https://", ""),
+            "snippet": " ".join([snippet] * snippet_repeat),
+        })
+    return results
+
+
+def create_app(
+    latency: float = 0.05,
+    results_per_page: int = 20,
+    error_rate: float = 0.0,
+    snippet_repeat: int = 1,
+    seed: int = 0,
+) -> FastAPI:
+    app = FastAPI(title="Fake SerpAPI")
+    app.state.calls = 0
+    app.state.errors = 0
+    rng = random.Random(seed)
+
+    @app.get("/search.json")
+    async def search(request: Request):
+        app.state.calls += 1
+        params = request.query_params
+        if latency:
+            await asyncio.sleep(latency)
+        if error_rate and rng.random() < error_rate:
+            app.state.errors += 1
+            return JSONResponse({"error": "Simulated upstream failure"}, status_code=503)
+        start = int(params.get("start", 0))
+        num = min(int(params.get("num", results_per_page)), results_per_page)
+        # Like Google, every page links a next one
+        return {
+            "search_metadata": {"status": "Success"},
+            "organic_results": make_organic_results(
+                params.get("q", ""), start, num, snippet_repeat
+            ),
+            "serpapi_pagination": {
+                "current": start // max(num, 1) + 1,
+                "next": str(request.url.include_query_params(start=start + num)),
+            },
+        }
+
+    @app.get("/stats")
+    async def stats():
+        return {"calls": app.state.calls, "errors": app.state.errors}
+
+    return app
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _serve(port: int, app_options) -> None:
+    uvicorn.run(create_app(**app_options), host="127.0.0.1", port=port, log_level="warning")
+
+
+class FakeSerpAPIServer:
+    """
+    Runs the fake SerpAPI app for the duration of a `with` block and
+    exposes its URL and call counters.
+
+    By default it runs on a background thread. With `isolated=True` it
+    runs in its own process instead, so a busy backend under load does not
+    slow the fake upstream down by holding the GIL.
+    """
+
+    def __init__(self, isolated: bool = False, **app_options):
+        self.isolated = isolated
+        self.port = _free_port()
+        self.url = f"http://127.0.0.1:{self.port}/search.json"
+        if isolated:
+            self.app = None
+            self.process = multiprocessing.Process(
+                target=_serve, args=(self.port, app_options), daemon=True
+            )
+        else:
+            self.app = create_app(**app_options)
+            config = uvicorn.Config(
+                self.app, host="127.0.0.1", port=self.port, log_level="warning"
+            )
+            self.server = uvicorn.Server(config)
+            self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def stats(self):
+        if self.app is not None:
+            return {"calls": self.app.state.calls, "errors": self.app.state.errors}
+        return httpx.get(f"http://127.0.0.1:{self.port}/stats").json()
+
+    @property
+    def calls(self) -> int:
+        return self.stats()["calls"]
+
+    @property
+    def errors(self) -> int:
+        return self.stats()["errors"]
+
+    def __enter__(self):
+        if not self.isolated:
+            self.thread.start()
+            while not self.server.started:
+                time.sleep(0.01)
+            return self
+
+        self.process.start()
+        while True:
+            try:
+                self.stats()
+                return self
+            except httpx.TransportError:
+                if not self.process.is_alive():
+                    raise RuntimeError("Fake SerpAPI process exited during startup")
+                time.sleep(0.05)
+
+    def __exit__(self, *exc):
+        if not self.isolated:
+            self.server.should_exit = True
+            self.thread.join()
+            return
+
+        self.process.terminate()
+        self.process.join()
@@ -5,17 +5,31 @@ set -e
 cd /backend || { echo "Backend directory not found"; exit 1; }
 
 echo "Starting FastAPI backend"
-# Start Uvicorn with proper host binding
-uvicorn server:app --host 0.0.0.0 --port 8001 &
+# Per-client rate limits take the client's address from X-Real-IP only
+# when it comes from one of these peers (comma-separated). The default
+# trusts the nginx started below; add the address of any other proxy
+# that reaches the backend directly, or its clients share one bucket.
+export RATE_LIMIT_TRUSTED_PROXIES=${RATE_LIMIT_TRUSTED_PROXIES:-127.0.0.1,::1}
+# One Uvicorn worker per CPU under gunicorn (see gunicorn.conf.py)
+gunicorn -c gunicorn.conf.py server:app &
 BACKEND_PID=$!
 
-echo "Waiting for backend to start..."
-sleep 30
-
-if ! kill -0 $BACKEND_PID 2>/dev/null; then
-    echo "Backend failed to start at initialization, exiting"
-    exit 1
-fi
+echo "Waiting for backend to become ready..."
+READY_TIMEOUT=${READY_TIMEOUT:-60}
+STARTED=$(date +%s)
+until wget -q -O /dev/null http://127.0.0.1:8001/api/ready 2>/dev/null; do
+    if ! kill -0 $BACKEND_PID 2>/dev/null; then
+        echo "Backend failed to start at initialization, exiting"
+        exit 1
+    fi
+    if [ $(( $(date +%s) - STARTED )) -ge "$READY_TIMEOUT" ]; then
+        echo "Backend not ready after ${READY_TIMEOUT}s, exiting"
+        kill $BACKEND_PID
+        exit 1
+    fi
+    sleep 0.2
+done
+echo "Backend ready after $(( $(date +%s) - STARTED ))s"
 
 # Start Nginx
 nginx -g 'daemon off;' &
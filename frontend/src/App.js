@@ -12,12 +12,16 @@ const App = () => {
   const [hasSearched, setHasSearched] = useState(false);
   const [selectedCategory, setSelectedCategory] = useState(null);
   const debounceTimer = useRef(null);
+  const searchController = useRef(null);
   const searchInputRef = useRef(null);
+  // Query behind the results on screen, reported with clicks on them
+  const searchedQuery = useRef('');
 
   const API_BASE_URL = process.env.REACT_APP_BACKEND_URL || 'http://localhost:8001';
 
-  // AI Categories based on clubhouse.ai structure
-  const aiCategories = [
+  // AI Categories based on clubhouse.ai structure; the backend owns the
+  // catalogue, this copy is shown until it has been loaded
+  const defaultCategories = [
     { id: 'chatbot', name: 'Chatbot', icon: '🤖', query: 'AI chatbot assistant conversation' },
     { id: 'code', name: 'Code Assistant', icon: '💻', query: 'AI code assistant programming development' },
     { id: 'content', name: 'Content Creation', icon: '📝', query: 'AI content creation writing generator' },
@@ -30,28 +34,93 @@ const App = () => {
     { id: 'research', name: 'Research', icon: '🔬', query: 'AI research papers academic science' },
     { id: 'video', name: 'Video Generation', icon: '🎬', query: 'AI video generation editing deepfake' }
   ];
+  const [aiCategories, setAiCategories] = useState(defaultCategories);
+
+  useEffect(() => {
+    fetch(`${API_BASE_URL}/api/categories`)
+      .then((response) => (response.ok ? response.json() : null))
+      .then((data) => {
+        if (data && data.categories && data.categories.length) {
+          setAiCategories(data.categories);
+        }
+      })
+      .catch((error) => console.error('Categories error:', error));
+  }, [API_BASE_URL]);
 
   // Handle category click
   const handleCategoryClick = (category) => {
     setSelectedCategory(category.id);
     setQuery(category.name);
     setShowSuggestions(false);
-    performSearch(category.query);
+    performCategorySearch(category);
+  };
+
+  // Category results come from a snapshot the backend keeps fresh
+  const performCategorySearch = async (category) => {
+    if (searchController.current) {
+      searchController.current.abort();
+    }
+
+    const controller = new AbortController();
+    searchController.current = controller;
+    searchedQuery.current = category.query;
+
+    setLoading(true);
+    setHasSearched(true);
+    setResults([]);
+
+    try {
+      const response = await fetch(`${API_BASE_URL}/api/categories/${encodeURIComponent(category.id)}`, {
+        signal: controller.signal
+      });
+
+      if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+      }
+
+      const data = await response.json();
+      setResults(data.results || []);
+      setSearchTime(data.search_time || 0);
+      setTotalResults(data.total_results || 0);
+    } catch (error) {
+      if (error.name === 'AbortError') {
+        return;
+      }
+      console.error('Search error:', error);
+      setResults([]);
+      setSearchTime(0);
+      setTotalResults(0);
+    } finally {
+      if (searchController.current === controller) {
+        setLoading(false);
+      }
+    }
   };
 
-  // Debounced search function
+  // Debounced search function; results stream in as NDJSON frames
   const performSearch = async (searchQuery) => {
+    // Drop any search that is still streaming
+    if (searchController.current) {
+      searchController.current.abort();
+    }
+
     if (!searchQuery.trim()) {
       setResults([]);
       setHasSearched(false);
+      setLoading(false);
       return;
     }
 
+    const controller = new AbortController();
+    searchController.current = controller;
+    searchedQuery.current = searchQuery;
+
     setLoading(true);
     setHasSearched(true);
+    setResults([]);
 
     try {
-      const response = await fetch(`${API_BASE_URL}/api/search`, {
+      const response = await fetch(`${API_BASE_URL}/api/search/stream`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -59,25 +128,71 @@ const App = () => {
         body: JSON.stringify({
           query: searchQuery,
           page: 1
-        })
+        }),
+        signal: controller.signal
       });
 
       if (!response.ok) {
         throw new Error(`HTTP error! status: ${response.status}`);
       }
 
-      const data = await response.json();
-      setResults(data.results || []);
-      setSearchTime(data.search_time || 0);
-      setTotalResults(data.total_results || 0);
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+
+      const handleFrame = (frame) => {
+        if (frame.type === 'result') {
+          setResults((previous) => [...previous, frame.result]);
+        } else if (frame.type === 'summary') {
+          setSearchTime(frame.search_time || 0);
+          setTotalResults(frame.total_results || 0);
+        } else if (frame.type === 'error') {
+          throw new Error(frame.detail);
+        }
+      };
+
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split('\n');
+        buffer = lines.pop();
+        lines.filter((line) => line.trim()).forEach((line) => handleFrame(JSON.parse(line)));
+      }
+
+      if (buffer.trim()) {
+        handleFrame(JSON.parse(buffer));
+      }
     } catch (error) {
+      if (error.name === 'AbortError') {
+        return;
+      }
       console.error('Search error:', error);
       setResults([]);
       setSearchTime(0);
       setTotalResults(0);
     } finally {
-      setLoading(false);
+      if (searchController.current === controller) {
+        setLoading(false);
+      }
+    }
+  };
+
+  // Report a result click; a beacon is queued by the browser, so it
+  // neither delays the new tab nor is lost if this page is left
+  const handleResultClick = (result) => {
+    const event = JSON.stringify({
+      query: searchedQuery.current,
+      link: result.link,
+      position: result.position,
+      page: 1
+    });
+    const url = `${API_BASE_URL}/api/events`;
+    if (navigator.sendBeacon && navigator.sendBeacon(url, event)) {
+      return;
     }
+    fetch(url, { method: 'POST', body: event, keepalive: true }).catch(() => {});
   };
 
   // Get search suggestions
@@ -89,6 +204,10 @@ const App = () => {
 
     try {
       const response = await fetch(`${API_BASE_URL}/api/suggestions?q=${encodeURIComponent(searchQuery)}`);
+      // Rate limited: keep showing the previous suggestions
+      if (response.status === 429) {
+        return;
+      }
       const data = await response.json();
       setSuggestions(data.suggestions || []);
     } catch (error) {
@@ -278,7 +397,7 @@ const App = () => {
 
         {/* Search Results */}
         <div className="mt-8 pb-12">
-          {loading && (
+          {loading && results.length === 0 && (
             <div className="space-y-6">
               {[...Array(5)].map((_, index) => (
                 <div key={index} className="animate-pulse">
@@ -291,7 +410,7 @@ const App = () => {
             </div>
           )}
 
-          {!loading && results.length > 0 && (
+          {results.length > 0 && (
             <div className="space-y-8">
               {results.map((result, index) => (
                 <div key={index} className="group">
@@ -306,6 +425,7 @@ const App = () => {
                       target="_blank"
                       rel="noopener noreferrer"
                       className="visited:text-purple-600"
+                      onClick={() => handleResultClick(result)}
                     >
                       {result.title}
                     </a>
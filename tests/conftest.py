@@ -0,0 +1,17 @@
+"""
+The backend modules import each other as top-level modules (the server runs
+from backend/), so the tests put backend/ on the path the same way the
+benchmarks do.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+# Importing server builds its singletons from the environment; keep them
+# offline and off disk, whatever backend/.env configures
+os.environ["MONGO_URL"] = ""
+os.environ["LOCAL_INDEX_DIR"] = ""
+os.environ["EVENT_LOG"] = "off"
+os.environ["WORKER_STATE_DIR"] = ""
+os.environ.setdefault("SERPAPI_KEY", "test")
@@ -0,0 +1,90 @@
+from cache import ResultCache, normalize_query
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_normalize_query():
+    assert normalize_query("  OpenAI   API ") == "openai api"
+
+
+def test_entries_expire_after_ttl():
+    clock = Clock()
+    cache = ResultCache(ttl=10, clock=clock)
+    cache.set("k", "v")
+    assert cache.get("k") == "v"
+    assert "k" in cache
+    clock.now = 10
+    assert cache.get("k") is None
+    assert "k" not in cache
+    assert cache.stats()["expirations"] == 1
+
+
+def test_per_entry_ttl():
+    clock = Clock()
+    cache = ResultCache(ttl=10, clock=clock)
+    cache.set("k", "v", ttl=2)
+    assert cache.expires_in("k") == 2
+    clock.now = 3
+    assert cache.get("k") is None
+
+
+def test_least_recently_used_is_evicted_first():
+    cache = ResultCache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.evictions == 1
+
+
+def test_byte_limit():
+    cache = ResultCache(max_bytes=10, sizeof=len)
+    cache.set("a", "xxxx")
+    cache.set("b", "yyyy")
+    cache.set("c", "zzzz")
+    assert len(cache) == 2 and cache.current_bytes == 8
+    assert cache.get("a") is None
+    # Larger than the whole cache: not stored, nothing evicted for it
+    cache.set("d", "x" * 11)
+    assert cache.get("d") is None and len(cache) == 2
+
+
+def test_replacing_an_entry_updates_its_size():
+    cache = ResultCache(sizeof=len)
+    cache.set("a", "xxxx")
+    cache.set("a", "xx")
+    assert cache.current_bytes == 2
+    cache.delete("a")
+    assert cache.current_bytes == 0
+
+
+def test_stale_entries_are_kept_for_get_stale():
+    clock = Clock()
+    cache = ResultCache(ttl=10, stale_ttl=5, clock=clock)
+    cache.set("k", "v")
+    clock.now = 12
+    assert cache.get("k") is None
+    assert cache.get_stale("k") == "v"
+    assert cache.peek("k") == "v"
+    clock.now = 15
+    assert cache.get("k") is None
+    assert cache.get_stale("k") is None
+    assert len(cache) == 0
+
+
+def test_peek_does_not_count_or_refresh_recency():
+    cache = ResultCache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.peek("a") == 1
+    cache.set("c", 3)
+    assert cache.peek("a") is None
+    assert cache.hits == cache.misses == 0
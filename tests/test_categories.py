@@ -0,0 +1,192 @@
+import asyncio
+import json
+
+import pytest
+
+from categories import CATEGORIES, CategoryCatalogue, load_categories
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+CATALOGUE = [
+    {"id": "llm", "name": "LLMs", "icon": "", "query": "large language models"},
+    {"id": "vision", "name": "Vision", "icon": "", "query": "computer vision models"},
+]
+
+
+def counting_refresh(calls, fail=()):
+    async def refresh(category):
+        calls.append(category["id"])
+        if category["id"] in fail:
+            raise RuntimeError("upstream down")
+        return f"{category['id']} #{calls.count(category['id'])}"
+
+    return refresh
+
+
+def test_catalogue_from_a_file(tmp_path):
+    assert load_categories(None) == CATEGORIES
+    path = tmp_path / "categories.json"
+    path.write_text(json.dumps([{"id": "llm", "name": "LLMs", "query": "llm"}]))
+    assert load_categories(str(path)) == [{"id": "llm", "name": "LLMs", "query": "llm", "icon": ""}]
+    path.write_text(json.dumps([{"id": "llm", "name": "LLMs"}]))
+    with pytest.raises(ValueError):
+        load_categories(str(path))
+
+
+def test_snapshots_expire_after_max_age():
+    clock = Clock()
+    calls = []
+    catalogue = CategoryCatalogue(CATALOGUE, counting_refresh(calls), max_age=100, clock=clock)
+    assert catalogue.snapshot("llm") is None
+
+    assert asyncio.run(catalogue.refresh_category(catalogue.get("llm")))
+    clock.now = 40
+    assert catalogue.snapshot("llm") == ("llm #1", 40)
+    clock.now = 101
+    assert catalogue.snapshot("llm") is None
+    assert catalogue.stats()["hits"] == 1
+    assert catalogue.stats()["misses"] == 2
+
+
+def test_failed_refresh_keeps_the_previous_snapshot():
+    clock = Clock()
+    calls = []
+    catalogue = CategoryCatalogue(CATALOGUE, counting_refresh(calls), clock=clock)
+    asyncio.run(catalogue.refresh_category(catalogue.get("llm")))
+    catalogue.refresh = counting_refresh(calls, fail={"llm"})
+    clock.now = 10
+    assert not asyncio.run(catalogue.refresh_category(catalogue.get("llm")))
+    assert catalogue.snapshot("llm") == ("llm #1", 10)
+    assert catalogue.stats()["failures"] == 1
+
+
+def test_readers_see_the_old_snapshot_until_the_swap():
+    clock = Clock()
+    release = None
+    seen = []
+
+    async def slow_refresh(category):
+        await release.wait()
+        return "new"
+
+    catalogue = CategoryCatalogue(CATALOGUE, slow_refresh, clock=clock)
+    catalogue._swap_in("llm", "old", 0.0)
+
+    async def run():
+        nonlocal release
+        release = asyncio.Event()
+        refresh = asyncio.ensure_future(catalogue.refresh_category(catalogue.get("llm")))
+        await asyncio.sleep(0)
+        seen.append(catalogue.snapshot("llm")[0])
+        release.set()
+        await refresh
+        seen.append(catalogue.snapshot("llm")[0])
+
+    asyncio.run(run())
+    assert seen == ["old", "new"]
+
+
+def test_scheduler_warms_every_category_then_refreshes_round_robin():
+    calls = []
+    catalogue = CategoryCatalogue(CATALOGUE, counting_refresh(calls), interval=0.04, jitter=0)
+
+    async def run():
+        await catalogue.start()
+        await asyncio.sleep(0.15)
+        await catalogue.close()
+
+    asyncio.run(run())
+    # Warmed in catalogue order, then one category per interval / 2
+    assert calls[:4] == ["llm", "vision", "llm", "vision"]
+    assert len(calls) >= 5
+    assert catalogue.stats()["snapshots"] == 2
+
+
+def test_disabled_catalogue_never_refreshes():
+    calls = []
+    catalogue = CategoryCatalogue(CATALOGUE, counting_refresh(calls), interval=0)
+
+    async def run():
+        await catalogue.start()
+        await asyncio.sleep(0.01)
+        await catalogue.close()
+
+    asyncio.run(run())
+    assert calls == []
+    assert not catalogue.enabled
+
+
+def test_followers_load_the_leaders_snapshots(tmp_path):
+    leader_calls, follower_calls = [], []
+    leader = CategoryCatalogue(CATALOGUE, counting_refresh(leader_calls), interval=60,
+                               shared_directory=str(tmp_path))
+    follower = CategoryCatalogue(CATALOGUE, counting_refresh(follower_calls), interval=60,
+                                 shared_directory=str(tmp_path), poll_interval=0.01)
+
+    async def run():
+        await leader.start()
+        await asyncio.sleep(0.01)
+        await follower.start()
+        await asyncio.sleep(0.05)
+        assert leader.stats()["leader"] and not follower.stats()["leader"]
+        await follower.close()
+        await leader.close()
+
+    asyncio.run(run())
+    assert leader_calls == ["llm", "vision"]
+    assert follower_calls == []
+    assert follower.snapshot("vision")[0] == "vision #1"
+    # Unchanged files are not loaded again
+    assert follower.load_shared() == 0
+
+
+def test_category_endpoint_serves_the_snapshot_then_falls_back(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    import server
+
+    clock = Clock()
+    catalogue = CategoryCatalogue(
+        [{"id": "agents", "name": "Agents", "icon": "", "query": "autonomous agent frameworks"}],
+        None, max_age=100, clock=clock,
+    )
+    monkeypatch.setattr(server, "category_catalogue", catalogue)
+    upstream_calls = []
+
+    async def upstream(query, page):
+        upstream_calls.append((query, page))
+        link = f"https://upstream.example/{page}"
+        return [server.SearchResult(title=link, link=link, snippet="", displayed_link=link, position=1)]
+
+    monkeypatch.setattr(server, "fetch_filtered_results", upstream)
+    snapshot = server.SearchResponse(
+        results=[server.SearchResult(title="s", link="https://snapshot.example", snippet="",
+                                     displayed_link="snapshot.example", position=1)],
+        total_results=1, search_time=0.1, query="autonomous agent frameworks",
+    )
+    catalogue._swap_in("agents", snapshot, 0.0)
+    clock.now = 30
+    client = TestClient(server.app)
+
+    served = client.get("/api/categories/agents")
+    assert served.status_code == 200
+    assert served.headers["age"] == "30"
+    assert served.json()["results"][0]["link"] == "https://snapshot.example"
+    assert upstream_calls == []
+
+    # Later pages, and the first page once its snapshot is too old, are searched
+    assert client.get("/api/categories/agents?page=2").json()["results"][0]["link"] \
+        == "https://upstream.example/2"
+    clock.now = 200
+    assert client.get("/api/categories/agents").json()["results"][0]["link"] \
+        == "https://upstream.example/1"
+    assert upstream_calls == [("autonomous agent frameworks", 2), ("autonomous agent frameworks", 1)]
+
+    assert client.get("/api/categories/nope").status_code == 404
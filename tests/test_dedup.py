@@ -0,0 +1,61 @@
+import random
+
+from dedup import DuplicateFilter, FingerprintIndex, result_fingerprint, simhash
+
+TEXT = ("OpenAI released a new ChatGPT model for developers building AI tools "
+        "with function calling and a longer context window")
+
+
+def test_short_texts_have_no_fingerprint():
+    assert simhash("too short to tell") is None
+
+
+def test_near_copies_are_close_and_others_far():
+    original = simhash(TEXT)
+    copy = simhash(TEXT.replace("developers", "engineers") + " today")
+    other = simhash("Ten easy weeknight dinner recipes for the whole family, with "
+                    "shopping lists and tips for leftovers")
+    assert (original ^ copy).bit_count() <= 12
+    assert (original ^ other).bit_count() > 12
+    assert simhash(TEXT.upper()) == original
+
+
+def test_fingerprint_index_finds_within_distance():
+    index = FingerprintIndex(distance=3)
+    index.add(0b1011 << 40, "a")
+    assert index.find((0b1011 << 40) ^ 0b111) == "a"
+    assert index.find((0b1011 << 40) ^ 0b1111) is None
+
+
+def test_fingerprint_index_matches_brute_force():
+    rng = random.Random(3)
+    stored = [rng.getrandbits(64) for _ in range(500)]
+    index = FingerprintIndex(distance=6)
+    for i, fingerprint in enumerate(stored):
+        index.add(fingerprint, i)
+    for fingerprint in stored[:100]:
+        flipped = fingerprint
+        for bit in rng.sample(range(64), rng.randint(0, 6)):
+            flipped ^= 1 << bit
+        assert index.find(flipped) is not None
+    for _ in range(200):
+        probe = rng.getrandbits(64)
+        expected = any((probe ^ s).bit_count() <= 6 for s in stored)
+        assert (index.find(probe) is not None) == expected
+
+
+def test_fingerprint_index_evicts_oldest():
+    index = FingerprintIndex(max_entries=2, distance=0)
+    for key, fingerprint in enumerate((1, 2, 3)):
+        index.add(fingerprint, key)
+    assert index.find(1) is None and index.find(3) == 2
+    assert len(index) == 2 and index.evictions == 1
+
+
+def test_duplicate_filter():
+    duplicates = DuplicateFilter()
+    fingerprint = result_fingerprint("ChatGPT for developers", TEXT)
+    assert duplicates.check("https://openai.com/a", fingerprint) is None
+    assert duplicates.check("https://openai.com/a", fingerprint) == "url"
+    assert duplicates.check("https://mirror.example/a", fingerprint) == "near"
+    assert duplicates.check("https://example.com/b", None) is None
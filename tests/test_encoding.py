@@ -0,0 +1,71 @@
+import gzip
+
+import pytest
+
+from encoding import EncodedPage, ResponseEncoder, brotli
+
+PREFIX = b'{"results":[' + b",".join(b'{"title":"result %d"}' % i for i in range(200)) + b'],'
+TAIL = b'"search_time":0.01,"query":"openai"}'
+
+
+def test_gzip_body_is_the_prefix_and_tail():
+    page = EncodedPage(PREFIX)
+    body = page.body(TAIL, "gzip")
+    assert gzip.decompress(body) == PREFIX + TAIL
+    assert len(body) < len(PREFIX)
+
+
+@pytest.mark.skipif(brotli is None, reason="brotli not installed")
+def test_brotli_body_is_the_prefix_and_tail():
+    page = EncodedPage(PREFIX)
+    assert brotli.decompress(page.body(TAIL, "br")) == PREFIX + TAIL
+
+
+def test_tails_longer_than_one_block():
+    page = EncodedPage(PREFIX)
+    tail = b"x" * 70_000
+    assert gzip.decompress(page.body(tail, "gzip")) == PREFIX + tail
+    if brotli is not None:
+        assert brotli.decompress(page.body(tail, "br")) == PREFIX + tail
+
+
+def test_identity_body():
+    assert EncodedPage(PREFIX).body(TAIL, None) == PREFIX + TAIL
+
+
+@pytest.mark.parametrize("accept, expected", [
+    ("gzip, deflate, br", "br"),
+    ("gzip", "gzip"),
+    ("br;q=0.5, gzip;q=0.8", "gzip"),
+    ("*", "br"),
+    ("identity", None),
+    ("gzip;q=0", None),
+    ("", None),
+])
+def test_negotiation(accept, expected):
+    encoder = ResponseEncoder(encodings=["br", "gzip"])
+    if brotli is None and expected == "br":
+        expected = "gzip"
+    assert encoder.negotiate(accept) == expected
+
+
+def test_small_bodies_are_sent_as_is():
+    encoder = ResponseEncoder(min_size=10_000)
+    response = encoder.respond(encoder.page(PREFIX), TAIL, "openai", {"accept-encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.body == PREFIX + TAIL
+
+
+def test_matching_etag_gets_304():
+    encoder = ResponseEncoder(min_size=0)
+    page = encoder.page(PREFIX)
+    first = encoder.respond(page, TAIL, "openai", {"accept-encoding": "gzip"})
+    assert first.headers["content-encoding"] == "gzip"
+    etag = first.headers["etag"]
+
+    again = encoder.respond(page, TAIL, "openai", {"if-none-match": etag})
+    assert again.status_code == 304 and again.body == b""
+    # Another query over the same page is another representation
+    other = encoder.respond(page, TAIL, "chatgpt", {"if-none-match": etag})
+    assert other.status_code == 200
+    assert encoder.stats()["not_modified"] == 1
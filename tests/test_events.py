@@ -0,0 +1,67 @@
+import gzip
+import json
+import os
+
+import pytest
+
+from events import EventSink, read_events
+
+
+def write_log(path, lines):
+    with gzip.open(path, "wb") as f:
+        f.write(b"".join(line + b"\n" for line in lines))
+
+
+def event(query, at):
+    return json.dumps({"kind": "search", "query": query, "at": at}).encode()
+
+
+def test_read_events_in_file_order(tmp_path):
+    write_log(tmp_path / "events-1.jsonl.gz", [event("a", 1), event("b", 2)])
+    write_log(tmp_path / "events-2.jsonl.gz", [event("c", 3)])
+    assert [e["query"] for e in read_events(str(tmp_path))] == ["a", "b", "c"]
+    assert [e["query"] for e in read_events(str(tmp_path), since=2)] == ["b", "c"]
+
+
+def test_malformed_lines_are_skipped(tmp_path, capsys):
+    write_log(tmp_path / "events-1.jsonl.gz", [
+        event("a", 1), b'{"kind": "search", "qu', b"[1, 2]", b"\xff\xfe", event("b", 2),
+    ])
+    assert [e["query"] for e in read_events(str(tmp_path))] == ["a", "b"]
+    assert "events-1.jsonl.gz" in capsys.readouterr().out
+
+
+def test_events_without_a_numeric_time_are_skipped(tmp_path):
+    write_log(tmp_path / "events-1.jsonl.gz", [
+        event("a", 1), b'{"kind": "search", "query": "missing"}', event("string", "2"),
+        event("null", None), event("bool", True), event("b", 2.5),
+    ])
+    assert [e["query"] for e in read_events(str(tmp_path))] == ["a", "b"]
+    assert [e["query"] for e in read_events(str(tmp_path), since=2)] == ["b"]
+
+
+def test_corrupt_files_end_early(tmp_path):
+    write_log(tmp_path / "events-1.jsonl.gz", [event("a", 1)])
+    # A crash mid-batch leaves a truncated gzip member
+    whole = gzip.compress(event("b", 2) + b"\n" + event("c", 3) + b"\n")
+    (tmp_path / "events-2.jsonl.gz").write_bytes(whole[:-12])
+    # A valid header followed by a damaged deflate stream
+    (tmp_path / "events-3.jsonl.gz").write_bytes(whole[:10] + b"\x00" * 40)
+    (tmp_path / "events-4.jsonl.gz").write_bytes(b"not gzip at all")
+    write_log(tmp_path / "events-5.jsonl.gz", [event("d", 4)])
+
+    queries = [e["query"] for e in read_events(str(tmp_path))]
+    assert queries[0] == "a"
+    assert queries[-1] == "d"
+
+
+def test_event_sink_is_abstract():
+    with pytest.raises(TypeError):
+        EventSink()
+
+
+def test_old_files_are_skipped_by_mtime(tmp_path):
+    path = tmp_path / "events-1.jsonl.gz"
+    write_log(path, [event("a", 1)])
+    os.utime(path, (10, 10))
+    assert list(read_events(str(tmp_path), since=100)) == []
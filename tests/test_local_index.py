@@ -0,0 +1,122 @@
+import asyncio
+import os
+
+import pytest
+
+import local_index
+from local_index import LocalIndex
+
+
+def doc(n, topic="llm"):
+    # Later documents repeat the topic more often, so they rank higher
+    return {
+        "title": f"{topic} news {n}",
+        "link": f"https://example.com/{topic}/{n}",
+        "snippet": " ".join([topic] * (n + 1) + ["filler"] * 10),
+        "displayed_link": "example.com",
+    }
+
+
+def links(docs):
+    return [d["link"] for d in docs]
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = LocalIndex(str(tmp_path), flush_every=1000, merge_factor=2)
+    index.open()
+    yield index
+    asyncio.run(index.close())
+
+
+def test_buffered_and_flushed_documents_are_searchable(index):
+    assert index.add([doc(n) for n in range(3)]) == 3
+    buffered = links(index.search("llm", k=10))
+    assert buffered == [doc(n)["link"] for n in (2, 1, 0)]
+
+    asyncio.run(index.flush())
+    assert len(index.segments) == 1
+    assert links(index.search("llm", k=10)) == buffered
+    assert index.search("nothing") == []
+
+
+def test_duplicates_are_not_added(index):
+    index.add([doc(0)])
+    asyncio.run(index.flush())
+    duplicate = dict(doc(0), link="http://www.example.com/llm/0/?utm_source=feed")
+    assert index.add([duplicate, doc(1), doc(1)]) == 1
+    assert index.duplicates == 2
+    assert len(index) == 2
+
+
+def test_flushes_merge_into_fewer_segments(index):
+    async def fill():
+        for batch in range(4):
+            index.add([doc(batch * 3 + n) for n in range(3)])
+            await index.flush()
+
+    asyncio.run(fill())
+    assert index.flushes == 4
+    assert index.merges >= 1
+    assert len(index.segments) < 4
+    assert len(index) == 12
+    assert sorted(links(index.search("llm", k=20))) == sorted(doc(n)["link"] for n in range(12))
+    # Merged-away segment files are removed
+    names = [name for name in os.listdir(index.directory) if name.startswith("seg-")]
+    assert sorted(names) == sorted(segment.name for segment in index.segments)
+
+
+def test_reopening_reads_the_segments_back(tmp_path):
+    first = LocalIndex(str(tmp_path))
+    first.open()
+    first.add([doc(n) for n in range(5)])
+    expected = links(first.search("llm", k=5))
+    # Closing flushes the buffer
+    asyncio.run(first.close())
+
+    reopened = LocalIndex(str(tmp_path))
+    reopened.open()
+    try:
+        assert len(reopened) == 5
+        assert links(reopened.search("llm", k=5)) == expected
+        assert reopened.contains(doc(3)["link"])
+        assert reopened.add([doc(3)]) == 0
+    finally:
+        asyncio.run(reopened.close())
+
+
+def test_offset_pages_through_the_ranking(index):
+    index.add([doc(n) for n in range(10)])
+    asyncio.run(index.flush())
+    index.add([doc(n, "llm") for n in range(10, 14)])
+    ranking = links(index.search("llm", k=14))
+    assert len(ranking) == 14
+    pages = [links(index.search("llm", k=4, offset=offset)) for offset in range(0, 16, 4)]
+    assert [len(page) for page in pages] == [4, 4, 4, 2]
+    assert sum(pages, []) == ranking
+
+
+def test_peer_shards_are_searched_without_duplicates(tmp_path, monkeypatch):
+    monkeypatch.setattr(local_index, "PEER_REFRESH_INTERVAL", 0.0)
+    first = LocalIndex(str(tmp_path))
+    second = LocalIndex(str(tmp_path))
+    first.open()
+    second.open()
+    try:
+        assert first.shard != second.shard
+        # Both shards index the same URLs before either sees the other's copy
+        first.add([doc(n) for n in range(8)])
+        second.add([doc(n) for n in range(4, 12)])
+        asyncio.run(first.flush())
+        asyncio.run(second.flush())
+
+        expected = {doc(n)["link"] for n in range(12)}
+        assert set(links(first.search("llm", k=20))) == expected
+        pages = [links(first.search("llm", k=3, offset=offset)) for offset in range(0, 12, 3)]
+        assert [len(page) for page in pages] == [3, 3, 3, 3]
+        seen = sum(pages, [])
+        assert len(set(seen)) == 12
+        assert set(seen) == expected
+    finally:
+        asyncio.run(first.close())
+        asyncio.run(second.close())
@@ -0,0 +1,94 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from metrics import Counter, Gauge, Histogram, MultiProcessMetrics, Registry, _Metric
+
+
+def make_registry():
+    registry = Registry()
+    searches = registry.register(Counter("searches_total", "Searches", ["endpoint"]))
+    in_flight = registry.register(Gauge("in_flight", "In flight"))
+    latency = registry.register(Histogram("latency_seconds", "Latency", buckets=(0.1, 1.0)))
+    return registry, searches, in_flight, latency
+
+
+def exited_pid() -> int:
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def test_metric_base_is_abstract():
+    with pytest.raises(TypeError):
+        _Metric("metric", "A metric")
+
+
+def test_render():
+    registry, searches, in_flight, latency = make_registry()
+    searches.inc(endpoint="search")
+    searches.inc(2, endpoint="search")
+    in_flight.set(3)
+    latency.observe(0.05)
+    latency.observe(0.5)
+    text = registry.render()
+    assert 'searches_total{endpoint="search"} 3' in text
+    assert "in_flight 3" in text
+    assert 'latency_seconds_bucket{le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 2' in text
+    assert "latency_seconds_count 2" in text
+    with pytest.raises(ValueError):
+        searches.inc(kind="search")
+
+
+def test_exited_workers_are_folded_into_a_tombstone(tmp_path):
+    registry, searches, in_flight, latency = make_registry()
+    metrics = MultiProcessMetrics(registry, directory=str(tmp_path))
+
+    # What an exited worker last wrote
+    dead, dead_searches, dead_gauge, dead_latency = make_registry()
+    dead_searches.inc(5, endpoint="search")
+    dead_gauge.set(7)
+    dead_latency.observe(0.5)
+    pid = exited_pid()
+    (tmp_path / f"{pid}.json").write_text(json.dumps(dead.state()))
+
+    searches.inc(endpoint="search")
+    in_flight.set(1)
+
+    first = metrics.render()
+    assert 'searches_total{endpoint="search"} 6' in first
+    # The exited worker's gauge no longer counts
+    assert "in_flight 1" in first
+    assert "latency_seconds_count 1" in first
+    assert not (tmp_path / f"{pid}.json").exists()
+    assert (tmp_path / MultiProcessMetrics.TOMBSTONE).exists()
+
+    # Folded once: scraping again does not count it twice
+    assert 'searches_total{endpoint="search"} 6' in metrics.render()
+    assert sorted(os.listdir(tmp_path)) == sorted(
+        [MultiProcessMetrics.TOMBSTONE, f"{os.getpid()}.json", "metrics.lock"]
+    )
+
+
+def test_reused_pid_file_is_folded_at_start(tmp_path):
+    registry, searches, _, _ = make_registry()
+    # Left by an earlier process with this process's pid
+    earlier, earlier_searches, _, _ = make_registry()
+    earlier_searches.inc(4, endpoint="search")
+    (tmp_path / f"{os.getpid()}.json").write_text(json.dumps(earlier.state()))
+
+    metrics = MultiProcessMetrics(registry, directory=str(tmp_path))
+
+    async def run():
+        await metrics.start()
+        searches.inc(endpoint="search")
+        text = metrics.render()
+        await metrics.close()
+        return text
+
+    assert 'searches_total{endpoint="search"} 5' in asyncio.run(run())
@@ -0,0 +1,92 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+from pagination import Paginator
+
+
+def fake_upstream(pages):
+    """
+    fetch_page over a fixed list of upstream pages, each a (results, more)
+    pair; results are links, returned as items with a `link`
+    """
+    calls = []
+
+    async def fetch_page(query, start):
+        calls.append(start)
+        index = start // 4
+        if index >= len(pages):
+            return [], 0, False
+        links, more = pages[index]
+        return [SimpleNamespace(link=link) for link in links], len(links), more
+
+    return fetch_page, calls
+
+
+def links(items):
+    return [item.link for item in items]
+
+
+def test_short_page_does_not_end_the_query():
+    # Upstream often returns fewer than it was asked for mid-way
+    fetch_page, calls = fake_upstream([
+        (["a", "b", "c"], True),
+        (["d", "e"], True),
+        (["f", "g", "h", "i"], False),
+    ])
+    paginator = Paginator(fetch_page, page_size=3, upstream_page_size=4, max_parallel_fetches=1)
+
+    async def pages():
+        return [await paginator.get_page("q", page) for page in (1, 2, 3)]
+
+    first, second, third = asyncio.run(pages())
+    assert links(first) == ["a", "b", "c"]
+    assert links(second) == ["d", "e", "f"]
+    assert links(third) == ["g", "h", "i"]
+    assert paginator.cursor("q").exhausted
+    assert calls == [0, 4, 8]
+
+
+def test_end_of_upstream_paging_ends_the_query():
+    fetch_page, calls = fake_upstream([(["a", "b", "c", "d"], False)])
+    paginator = Paginator(fetch_page, page_size=3, upstream_page_size=4, max_parallel_fetches=1)
+
+    async def pages():
+        return [await paginator.get_page("q", page) for page in (1, 2, 3)]
+
+    first, second, third = asyncio.run(pages())
+    assert links(first) == ["a", "b", "c"]
+    assert links(second) == ["d"]
+    assert third == []
+    assert calls == [0]
+
+
+def test_empty_page_ends_the_query():
+    fetch_page, calls = fake_upstream([(["a", "b"], True), ([], True)])
+    paginator = Paginator(fetch_page, page_size=3, upstream_page_size=4, max_parallel_fetches=1)
+
+    page = asyncio.run(paginator.get_page("q", 1))
+    assert links(page) == ["a", "b"]
+    assert paginator.cursor("q").exhausted
+    assert calls == [0, 4]
+
+
+def test_page_below_one_is_rejected():
+    fetch_page, _ = fake_upstream([])
+    paginator = Paginator(fetch_page)
+    with pytest.raises(ValueError):
+        asyncio.run(paginator.get_page("q", 0))
+
+
+@pytest.mark.parametrize("page", [0, -1])
+def test_search_page_below_one_is_a_validation_error(page):
+    import server
+
+    async def post():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/api/search", json={"query": "llm", "page": page})
+
+    assert asyncio.run(post()).status_code == 422
@@ -0,0 +1,123 @@
+import asyncio
+
+import pytest
+
+from providers import (
+    FederatedSearch,
+    ProviderError,
+    SearchProvider,
+    canonical_url,
+    reciprocal_rank_fusion,
+)
+
+
+class FakeProvider(SearchProvider):
+    def __init__(self, name, links, more=True, error=None, latency=0.0, timeout=1.0):
+        super().__init__(timeout)
+        self.name = name
+        self.links = links
+        self.more = more
+        self.error = error
+        self.latency = latency
+
+    async def search(self, query, start, num):
+        await asyncio.sleep(self.latency)
+        if self.error is not None:
+            raise self.error
+        results = [{"title": link, "link": link, "snippet": f"{self.name} {link}"}
+                   for link in self.links[start:start + num]]
+        return results, self.more
+
+
+def links(results):
+    return [result["link"] for result in results]
+
+
+@pytest.mark.parametrize("url, canonical", [
+    ("http://www.example.com/a/?utm_source=x&b=2&a=1#top", "https://example.com/a?a=1&b=2"),
+    ("https://m.example.com:443/post/amp", "https://example.com/post"),
+    ("https://example.com:8080/index.html", "https://example.com:8080"),
+    ("  https://example.com/x  ", "https://example.com/x"),
+])
+def test_canonical_url(url, canonical):
+    assert canonical_url(url) == canonical
+
+
+def test_only_known_trackers_are_dropped():
+    assert canonical_url("https://example.com/a?gclid=1&fbclid=2&_ga=3&utm_medium=x") \
+        == "https://example.com/a"
+    # Generic parameters can select different content
+    branches = {canonical_url(f"https://github.com/org/repo?ref={ref}") for ref in ("main", "dev")}
+    assert branches == {"https://github.com/org/repo?ref=main", "https://github.com/org/repo?ref=dev"}
+    assert canonical_url("https://example.com/feed?source=rss") != canonical_url("https://example.com/feed")
+
+
+@pytest.mark.parametrize("url", ["http://example.com:abc/x", "http://[::1/x", "http://example.com:99999/"])
+def test_canonical_url_keeps_unparseable_links(url):
+    assert canonical_url(f" {url} ") == url
+
+
+def test_search_provider_is_abstract():
+    with pytest.raises(TypeError):
+        SearchProvider()
+
+
+def test_fusion_ranks_agreement_first():
+    fused = reciprocal_rank_fusion([
+        [{"link": "https://a.example"}, {"link": "https://b.example"}],
+        [{"link": "https://c.example"}, {"link": "https://b.example"}],
+    ])
+    # b is on both lists; a and c tie and keep the order of the lists
+    assert links(fused) == ["https://b.example", "https://a.example", "https://c.example"]
+
+
+def test_fusion_dedupes_by_canonical_url():
+    fused = reciprocal_rank_fusion([
+        [{"link": "https://example.com/post", "snippet": ""}],
+        [{"link": "http://www.example.com/post/?utm_source=feed", "snippet": "Filled in"}],
+    ])
+    assert len(fused) == 1
+    # The higher-ranked copy is kept, with the snippet it was missing
+    assert fused[0]["link"] == "https://example.com/post"
+    assert fused[0]["snippet"] == "Filled in"
+
+
+def test_fusion_keeps_unparseable_links():
+    fused = reciprocal_rank_fusion([[{"link": "http://example.com:abc/x"}, {"link": "http://[::1/x"}]])
+    assert links(fused) == ["http://example.com:abc/x", "http://[::1/x"]
+
+
+def test_federated_search_merges_and_dedupes():
+    federation = FederatedSearch([
+        FakeProvider("one", ["https://a.example", "https://b.example"], more=False),
+        FakeProvider("two", ["https://www.b.example/", "https://c.example", "https://d.example"], more=True),
+    ])
+    fused, raw_count, more = asyncio.run(federation.search("llm", 0, 10))
+    # b, on both lists, comes first as the copy "two" ranked higher
+    assert links(fused) == ["https://www.b.example/", "https://a.example",
+                            "https://c.example", "https://d.example"]
+    assert raw_count == 3
+    assert more
+    assert federation.partial == 0
+
+
+def test_federated_search_leaves_out_a_failing_provider():
+    federation = FederatedSearch([
+        FakeProvider("up", ["https://a.example", "https://b.example"], more=False),
+        FakeProvider("down", [], error=ProviderError("down is down")),
+        FakeProvider("slow", ["https://c.example"], latency=1.0, timeout=0.05),
+    ])
+    fused, raw_count, more = asyncio.run(federation.search("llm", 0, 10))
+    assert links(fused) == ["https://a.example", "https://b.example"]
+    assert raw_count == 2
+    assert not more
+    assert federation.stats()["partial"] == 1
+
+
+def test_federated_search_fails_when_every_provider_does():
+    federation = FederatedSearch([
+        FakeProvider("one", [], error=ProviderError("one is down")),
+        FakeProvider("two", [], error=ProviderError("two is down")),
+    ])
+    with pytest.raises(ProviderError, match="one is down"):
+        asyncio.run(federation.search("llm", 0, 10))
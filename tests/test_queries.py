@@ -0,0 +1,80 @@
+import pytest
+
+from queries import QueryRewriter
+
+
+@pytest.fixture
+def rewriter():
+    return QueryRewriter(suffix="AI")
+
+
+@pytest.mark.parametrize("variant", [
+    "chatgpt prompt engineering",
+    "ChatGPT   Prompt Engineering",
+    "prompt engineering chatgpt",
+    "chat gpt prompt engineering",
+    "Chat-GPT prompt prompt engineering",
+])
+def test_variants_share_a_key(rewriter, variant):
+    assert rewriter.key(variant) == rewriter.key("chatgpt prompt engineering")
+
+
+def test_different_queries_keep_different_keys(rewriter):
+    assert rewriter.key("openai api pricing") != rewriter.key("openai api")
+    assert rewriter.key("llm fine tuning") != rewriter.key("fine tuning")
+
+
+def test_multi_word_synonyms(rewriter):
+    assert rewriter.key("large language models") == rewriter.key("LLMs") == rewriter.key("llm")
+    assert rewriter.key("artificial intelligence news") == rewriter.key("ai news")
+
+
+def test_punctuation_only_queries_keep_their_own_key(rewriter):
+    assert rewriter.key("???") != rewriter.key("!!!")
+
+
+def test_rewrites_are_memoized_within_a_bound():
+    rewriter = QueryRewriter(max_memo=2)
+    rewriter.rewrite("a")
+    rewriter.rewrite("b")
+    rewriter.rewrite("a")
+    rewriter.rewrite("c")
+    assert rewriter.stats()["memo_entries"] == 2
+    assert rewriter.hits == 1 and rewriter.misses == 3
+    rewriter.rewrite("b")
+    assert rewriter.misses == 4
+
+
+def test_language_names_keep_their_own_key(rewriter):
+    keys = {rewriter.key(f"{name} machine learning") for name in ("C++", "c#", "C", "F#")}
+    assert len(keys) == 4
+    assert rewriter.key("C++ machine learning") == rewriter.key("c++ ML")
+
+
+def test_non_ascii_words_stay_whole(rewriter):
+    assert rewriter.key("IA générative") == "générative ia"
+    assert rewriter.key("IA générative") != rewriter.key("ia g n rative")
+
+
+def test_phrases_and_exclusions_keep_their_own_key(rewriter):
+    query = '"neural networks" -tensorflow'
+    assert rewriter.key(query) == rewriter.key('-TensorFlow  "Neural   Networks"')
+    assert rewriter.key(query) != rewriter.key("neural networks tensorflow")
+    assert rewriter.key(query) != rewriter.key('"neural networks" tensorflow')
+    assert rewriter.key(query) != rewriter.key("networks neural -tensorflow")
+
+
+@pytest.mark.parametrize("query, upstream", [
+    ("C++ machine learning", "c++ machine learning"),
+    ("c#  Machine Learning", "c# machine learning"),
+    ("IA générative", "ia générative AI"),
+    ('"neural networks" -tensorflow', '"neural networks" -tensorflow'),
+    ("Chat GPT prompt", "chat gpt prompt"),
+    ("best hiking trails", "best hiking trails AI"),
+])
+def test_upstream_gets_the_users_words(rewriter, query, upstream):
+    assert rewriter.upstream_query(query) == upstream
+
+
+def test_excluded_ai_terms_do_not_drop_the_suffix(rewriter):
+    assert rewriter.upstream_query("robot vacuum -ai") == "robot vacuum -ai AI"
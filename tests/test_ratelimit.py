@@ -0,0 +1,138 @@
+import asyncio
+import multiprocessing
+
+import pytest
+
+from ratelimit import (
+    ClientRateLimiter,
+    FileBucketStore,
+    MemoryBucketStore,
+    QuotaExceededError,
+    QuotaScheduler,
+    RateLimitedError,
+)
+
+
+def test_trusted_proxy_forwards_the_client_address():
+    limiter = ClientRateLimiter()
+    assert limiter.client_key({"x-real-ip": "203.0.113.7"}, "127.0.0.1") == "ip:203.0.113.7"
+    assert limiter.client_key({}, "127.0.0.1") == "ip:127.0.0.1"
+    assert limiter.untrusted_forwards == 0
+
+
+def test_forwarding_headers_from_an_untrusted_peer_are_ignored(capsys):
+    limiter = ClientRateLimiter(trusted_proxies=["127.0.0.1"])
+    for client in ("203.0.113.7", "203.0.113.8"):
+        assert limiter.client_key({"x-real-ip": client}, "10.0.0.5") == "ip:10.0.0.5"
+    assert limiter.client_key({"x-forwarded-for": "203.0.113.9"}, "10.0.0.5") == "ip:10.0.0.5"
+    assert limiter.stats()["untrusted_forwards"] == 3
+    # Warned about once
+    assert capsys.readouterr().out.count("10.0.0.5") == 1
+
+
+def test_trusted_proxies_from_env(monkeypatch):
+    monkeypatch.setenv("RATE_LIMIT_TRUSTED_PROXIES", "10.0.0.5, 10.0.0.6")
+    limiter = ClientRateLimiter.from_env()
+    assert limiter.client_key({"x-real-ip": "203.0.113.7"}, "10.0.0.6") == "ip:203.0.113.7"
+    assert limiter.client_key({"x-real-ip": "203.0.113.7"}, "127.0.0.1") == "ip:127.0.0.1"
+
+
+def test_api_key_outranks_the_address():
+    limiter = ClientRateLimiter(api_keys=["secret"])
+    key = limiter.client_key({"x-api-key": "secret"}, "10.0.0.5")
+    assert key.startswith("key:") and "secret" not in key
+    assert limiter.client_key({"x-api-key": "guess"}, "10.0.0.5") == "ip:10.0.0.5"
+
+
+def test_clients_have_separate_buckets():
+    limiter = ClientRateLimiter(policies={"search": (1.0, 2.0)})
+
+    async def run():
+        for _ in range(2):
+            await limiter.check("search", {}, "10.0.0.5")
+        with pytest.raises(RateLimitedError):
+            await limiter.check("search", {}, "10.0.0.5")
+        await limiter.check("search", {}, "10.0.0.6")
+
+    asyncio.run(run())
+    assert limiter.stats()["limited"] == {"search": 1}
+
+
+def test_shared_buckets_are_one_bucket_across_instances(tmp_path):
+    first = FileBucketStore(str(tmp_path))
+    second = FileBucketStore(str(tmp_path))
+
+    async def run():
+        await first.start()
+        outcomes = []
+        for store in (first, second, first, second):
+            allowed, _ = await store.take("search:ip:10.0.0.5", rate=0.001, burst=3)
+            outcomes.append(allowed)
+        other, _ = await second.take("search:ip:10.0.0.6", rate=0.001, burst=3)
+        await first.close()
+        await second.close()
+        return outcomes, other
+
+    outcomes, other = asyncio.run(run())
+    assert outcomes == [True, True, True, False]
+    assert other
+
+
+def spend_in_worker(directory, attempts, results):
+    store = FileBucketStore(directory)
+    results.put(sum(store.spend("quota:upstream", 0.001, 20.0)[0] for _ in range(attempts)))
+
+
+def test_shared_buckets_hold_across_processes(tmp_path):
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    workers = [context.Process(target=spend_in_worker, args=(str(tmp_path), 15, results))
+               for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(10)
+    # 60 attempts against one burst of 20
+    assert sum(results.get(timeout=1) for _ in workers) == 20
+
+
+def test_shared_buckets_reuse_the_stalest_slot(tmp_path):
+    now = [0.0]
+    store = FileBucketStore(str(tmp_path), slots=2, probes=2, clock=lambda: now[0])
+    for key in ("a", "b", "c"):
+        now[0] += 1
+        assert store.spend(key, rate=1.0, burst=5.0, cost=5.0)[0]
+    assert store.evictions == 1
+    assert store.stats()["clients"] == 2
+
+
+def test_store_from_env(tmp_path, monkeypatch):
+    monkeypatch.setenv("WORKER_STATE_DIR", str(tmp_path))
+    assert isinstance(ClientRateLimiter.from_env().store, FileBucketStore)
+    assert isinstance(QuotaScheduler.from_env().shared, FileBucketStore)
+    monkeypatch.setenv("RATE_LIMIT_STORE", "memory")
+    assert isinstance(ClientRateLimiter.from_env().store, MemoryBucketStore)
+    monkeypatch.setenv("WORKER_STATE_DIR", "")
+    monkeypatch.delenv("RATE_LIMIT_STORE")
+    assert isinstance(ClientRateLimiter.from_env().store, MemoryBucketStore)
+    assert QuotaScheduler.from_env().shared is None
+
+
+def test_upstream_quota_is_shared_by_every_worker(tmp_path):
+    def scheduler():
+        return QuotaScheduler(rate=0.01, burst=3, max_wait={"interactive": 0.1, "background": 0.1},
+                              shared=FileBucketStore(str(tmp_path)))
+
+    first, second = scheduler(), scheduler()
+
+    async def run():
+        for quota in (first, second, first):
+            await quota.acquire("interactive")
+        with pytest.raises(QuotaExceededError):
+            await second.acquire("interactive")
+        await first.close()
+        await second.close()
+
+    asyncio.run(run())
+    assert first.counts["interactive"]["immediate"] == 2
+    assert second.counts["interactive"] == {"immediate": 1, "queued": 0, "shed": 1}
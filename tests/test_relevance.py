@@ -0,0 +1,95 @@
+import pytest
+
+from relevance import (
+    AI_DOMAINS,
+    AI_KEYWORDS,
+    CORE_AI_TERMS,
+    DomainMatcher,
+    KeywordMatcher,
+    is_ai_related,
+    score_batch,
+)
+
+
+def scan(text):
+    """
+    The substring checks the matcher replaces
+    """
+    keyword_hits = sum(keyword in text for keyword in dict.fromkeys(AI_KEYWORDS))
+    core_hits = sum(term in text for term in CORE_AI_TERMS)
+    return keyword_hits, core_hits
+
+
+@pytest.mark.parametrize("text", [
+    "openai releases a new chatgpt model",
+    "training a neural network with pytorch",
+    "large language model agents use retrieval augmented generation",
+    "a chatgpt-powered chatbot for support teams",
+    "the best running shoes of the season",
+    "organic gardening for beginners",
+    "deep  learning with two spaces",
+    "machine learning",
+    "",
+])
+def test_keyword_counts_match_substring_scan(text):
+    matcher = KeywordMatcher(AI_KEYWORDS, CORE_AI_TERMS)
+    assert matcher.count(text) == scan(text)
+
+
+def test_multi_word_keywords_span_tokens():
+    matcher = KeywordMatcher(["stable diffusion", "natural language processing"], [])
+    assert matcher.count("unstable diffusion models") == (1, 0)
+    assert matcher.count("natural language processingx") == (1, 0)
+    assert matcher.count("natural processing language") == (0, 0)
+
+
+def test_each_keyword_counts_once():
+    matcher = KeywordMatcher(["gpt"], ["chatgpt"])
+    assert matcher.count("chatgpt chatgpt gpt") == (1, 1)
+
+
+@pytest.mark.parametrize("link, expected", [
+    ("https://openai.com/blog", True),
+    ("https://platform.openai.com/docs", True),
+    ("https://notopenai.com/", False),
+    ("https://www.microsoft.com/ai/overview", True),
+    ("https://www.microsoft.com/windows", False),
+    ("https://towardsdatascience.com/post", True),
+    ("https://user:pw@huggingface.co:443/models", True),
+    ("https://example.com/?next=openai.com", False),
+    ("not a url", False),
+])
+def test_domains_match_on_the_hostname(link, expected):
+    assert DomainMatcher(AI_DOMAINS).matches(link) is expected
+
+
+def test_is_ai_related():
+    assert is_ai_related("Weekly roundup", "Nothing to see", "https://huggingface.co/blog")
+    assert is_ai_related("OpenAI API pricing", "Prices per token", "https://example.com")
+    assert is_ai_related("LLM tools", "A chatbot and an embedding store", "https://example.com")
+    assert not is_ai_related("Robotics", "A toy robot for kids", "https://example.com")
+    assert not is_ai_related("Running shoes", "Best of the season", "https://example.com")
+
+
+def test_score_batch_matches_the_per_item_checks():
+    items = [
+        ("OpenAI releases a new ChatGPT model", "Developers get a faster API.", "https://news.example.com/a"),
+        ("Ten easy weeknight dinners", "Quick meals for the family.", "https://food.example.com/b"),
+        ("Pricing", "Plans for teams.", "https://openai.com/pricing"),
+        ("Training a neural network", "With PyTorch and deep learning tricks.", "https://blog.example.com/c"),
+        ("OpenAI releases a new ChatGPT model", "Developers get a faster API.", "https://mirror.example.com/a"),
+        ("Organic gardening", "", "https://github.com/user/garden"),
+        ("", "", ""),
+    ]
+    relevant, keyword_hits = score_batch(items)
+    assert relevant.dtype == bool and relevant.shape == (len(items),)
+    assert relevant.tolist() == [is_ai_related(*item) for item in items]
+    matcher = KeywordMatcher(AI_KEYWORDS, CORE_AI_TERMS)
+    assert keyword_hits.tolist() == [
+        matcher.count(f"{title} {snippet}".lower())[0] for title, snippet, _ in items
+    ]
+
+
+def test_score_batch_of_nothing():
+    relevant, keyword_hits = score_batch([])
+    assert relevant.shape == keyword_hits.shape == (0,)
@@ -0,0 +1,94 @@
+import pytest
+
+from resilience import CircuitBreaker, CircuitOpenError, RetryBudget, backoff_delay
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_breaker_opens_after_consecutive_failures():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30, clock=clock)
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record_failure()
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    for _ in range(3):
+        breaker.before_call()
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now = 10
+    with pytest.raises(CircuitOpenError) as raised:
+        breaker.before_call()
+    assert raised.value.retry_after == pytest.approx(20)
+
+
+def test_half_open_lets_one_probe_through():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30, clock=clock)
+    breaker.before_call()
+    breaker.record_failure()
+
+    clock.now = 30
+    breaker.before_call()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    # A failed probe opens the circuit again
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now = 60
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.opened == 2
+
+
+def test_abandoned_probe_lets_the_next_one_through():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=1, clock=clock)
+    breaker.before_call()
+    breaker.record_failure()
+    clock.now = 1
+    breaker.before_call()
+    breaker.abandon()
+    breaker.before_call()
+
+
+def test_retry_budget_caps_retries_to_a_share_of_requests():
+    clock = Clock()
+    budget = RetryBudget(ratio=0.25, min_per_second=0, max_tokens=2, clock=clock)
+    assert budget.withdraw() and budget.withdraw()
+    assert not budget.withdraw()
+    # Four requests fund one retry
+    for _ in range(4):
+        budget.deposit()
+    assert budget.withdraw()
+    assert not budget.withdraw()
+    assert budget.exhausted == 2
+
+
+def test_retry_budget_refills_over_time():
+    clock = Clock()
+    budget = RetryBudget(ratio=0, min_per_second=1, max_tokens=5, clock=clock)
+    for _ in range(5):
+        budget.withdraw()
+    assert not budget.withdraw()
+    clock.now = 2
+    assert budget.withdraw() and budget.withdraw()
+    assert not budget.withdraw()
+
+
+def test_backoff_is_bounded():
+    for attempt in range(1, 10):
+        delay = backoff_delay(attempt, base=0.1, cap=2.0)
+        assert 0 <= delay <= min(2.0, 0.1 * 2 ** (attempt - 1))
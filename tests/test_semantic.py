@@ -0,0 +1,69 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from semantic import RelevanceStage, VectorCache, prototype_scorer
+
+# Hand-labelled results, written against AI_PROTOTYPES: a regression check
+# on wording the prototypes are meant to cover, not a measure of accuracy
+# on real traffic
+with open(os.path.join(os.path.dirname(__file__), "fixtures", "labelled_results.json"),
+          encoding="utf-8") as labelled_file:
+    LABELLED = json.load(labelled_file)
+
+
+def precision_recall(stage):
+    verdicts = stage.select(LABELLED)
+    labels = [item["ai"] for item in LABELLED]
+    true_positive = sum(v and l for v, l in zip(verdicts, labels))
+    return true_positive / max(1, sum(verdicts)), true_positive / max(1, sum(labels))
+
+
+@pytest.mark.parametrize("mode", ["semantic", "hybrid"])
+def test_labelled_results(mode):
+    precision, recall = precision_recall(RelevanceStage(mode))
+    assert precision >= 0.95
+    assert recall >= 0.95
+
+
+def test_semantic_stage_beats_the_keyword_rules():
+    keyword_precision, keyword_recall = precision_recall(RelevanceStage("keywords"))
+    precision, recall = precision_recall(RelevanceStage("hybrid"))
+    assert precision > keyword_precision
+    assert recall > keyword_recall
+
+
+def test_hybrid_accepts_ai_company_domains_but_not_general_hosting():
+    stage = RelevanceStage("hybrid")
+    verdicts = stage.select([
+        {"title": "Pricing", "snippet": "Plans for teams.", "link": "https://openai.com/pricing"},
+        {"title": "user/dotfiles", "snippet": "My vim config.", "link": "https://github.com/user/dotfiles"},
+    ])
+    assert verdicts == [True, False]
+    assert stage.stats()["accepted"]["domain"] == 1
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        RelevanceStage("vibes")
+
+
+def test_scores_are_cached_by_url():
+    scorer = prototype_scorer(cache_size=8)
+    page = [{"title": item["title"], "snippet": item["snippet"], "link": item["link"]}
+            for item in LABELLED[:4]]
+    first = scorer.score(page)
+    second = scorer.score(page)
+    assert np.allclose(first, second, atol=1e-3)
+    assert scorer.cache.stats()["hits"] == 4
+    assert scorer.cache.stats()["misses"] == 4
+
+
+def test_vector_cache_evicts_the_oldest():
+    cache = VectorCache(dim=2, capacity=2)
+    cache.put(["a", "b"], np.ones((2, 2)))
+    cache.put(["c"], np.zeros((1, 2)))
+    assert cache.find(["a", "b", "c"]) == [-1, 1, 0]
+    assert len(cache) == 2
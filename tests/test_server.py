@@ -0,0 +1,138 @@
+import asyncio
+import json
+
+from cache import ResultCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def response(server, link):
+    result = server.SearchResult(title=link, link=link, snippet="", displayed_link=link, position=1)
+    return server.SearchResponse(results=[result], total_results=1, search_time=0.1, query="llm")
+
+
+def test_stale_refresh_skips_the_result_store(monkeypatch):
+    import server
+
+    clock = Clock()
+    monkeypatch.setattr(server, "search_cache", ResultCache(ttl=10, stale_ttl=100, clock=clock))
+    stored = response(server, "https://stored.example")
+    fresh = response(server, "https://fresh.example")
+
+    async def stored_copy(query, page):
+        return stored.model_dump(), 100.0
+
+    async def upstream(query, page):
+        return fresh.results
+
+    monkeypatch.setattr(server.result_store, "get", stored_copy)
+    monkeypatch.setattr(server, "fetch_filtered_results", upstream)
+
+    request = server.SearchRequest(query="llm", page=1)
+    cache_key = server.search_cache_key(request.query, request.page)
+
+    async def run():
+        server.search_cache.set(cache_key, stored)
+        clock.now = 20
+        served = server.lookup_cached_response(request, cache_key)
+        while cache_key in server.search_flight:
+            await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        return served
+
+    served = asyncio.run(run())
+    assert served.results[0].link == "https://stored.example"
+    assert server.search_cache.get(cache_key).results[0].link == "https://fresh.example"
+
+
+def ndjson(body):
+    return [json.loads(line) for line in body.splitlines()]
+
+
+def test_stream_sends_results_in_order_then_a_summary(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    import server
+
+    links = [f"https://stream.example/{n}" for n in range(3)]
+
+    async def iter_page(query, page):
+        for link in links:
+            await asyncio.sleep(0)
+            yield response(server, link).results[0]
+
+    monkeypatch.setattr(server.paginator, "iter_page", iter_page)
+    client = TestClient(server.app)
+
+    streamed = client.post("/api/search/stream", json={"query": "streamed llm frames"})
+    assert streamed.headers["content-type"] == "application/x-ndjson"
+    frames = ndjson(streamed.text)
+    assert [frame["type"] for frame in frames] == ["result"] * 3 + ["summary"]
+    assert [frame["result"]["link"] for frame in frames[:3]] == links
+    assert [frame["result"]["position"] for frame in frames[:3]] == [1, 2, 3]
+    assert frames[-1]["total_results"] == 3
+    assert frames[-1]["query"] == "streamed llm frames"
+
+    # The streamed page was cached; the repeat is the same frames
+    monkeypatch.setattr(server.paginator, "iter_page", None)
+    repeat = ndjson(client.post("/api/search/stream", json={"query": "streamed llm frames"}).text)
+    assert [frame.get("result") for frame in repeat] == [frame.get("result") for frame in frames]
+
+
+def test_bulk_runs_each_rewritten_search_once(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    import server
+
+    calls = []
+
+    async def upstream(query, page):
+        calls.append(query)
+        return response(server, f"https://bulk.example/{len(calls)}").results
+
+    monkeypatch.setattr(server, "fetch_filtered_results", upstream)
+    client = TestClient(server.app)
+
+    searches = [{"query": "bulk vector search"}, {"query": "search vector bulk"},
+                {"query": "bulk rerankers"}]
+    frames = ndjson(client.post("/api/search/bulk", json={"searches": searches}).text)
+    results = sorted(frames[:-1], key=lambda frame: frame["indexes"])
+    assert [frame["indexes"] for frame in results] == [[0, 1], [2]]
+    assert all(frame["status"] == 200 and len(frame["results"]) == 1 for frame in results)
+    assert frames[-1] == {**frames[-1], "type": "summary", "searches": 3, "distinct": 2,
+                          "statuses": {"200": 2}}
+    assert len(calls) == 2
+
+
+def test_bulk_spends_one_token_per_distinct_search(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    import server
+    from ratelimit import ClientRateLimiter
+
+    async def upstream(query, page):
+        return response(server, "https://bulk.example/limited").results
+
+    monkeypatch.setattr(server, "fetch_filtered_results", upstream)
+    monkeypatch.setattr(server, "rate_limiter",
+                        ClientRateLimiter(policies={"search": (0.001, 1.0), "bulk": (0.001, 3.0)}))
+    client = TestClient(server.app)
+
+    def bulk(*queries):
+        return client.post("/api/search/bulk", json={"searches": [{"query": q} for q in queries]})
+
+    # Repeats of one search cost one token
+    assert bulk("limited one", "one limited", "limited one").status_code == 200
+    assert bulk("limited two", "limited three").status_code == 200
+    refused = bulk("limited four")
+    assert refused.status_code == 429
+    assert int(refused.headers["retry-after"]) > 0
+    # Bulk tokens are separate from the interactive search budget
+    assert client.post("/api/search", json={"query": "limited one"}).status_code == 200
+    assert server.rate_limiter.stats()["limited"] == {"bulk": 1}
@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "result"
+
+    async def run():
+        return await asyncio.gather(*(flight.do("k", work) for _ in range(5)))
+
+    assert asyncio.run(run()) == ["result"] * 5
+    assert len(calls) == 1
+    assert flight.stats() == {"in_flight": 0, "executions": 1, "shared": 4}
+
+
+def test_later_calls_start_fresh():
+    flight = SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        return len(calls)
+
+    async def run():
+        return await flight.do("k", work), await flight.do("k", work)
+
+    assert asyncio.run(run()) == (1, 2)
+
+
+def test_errors_reach_every_waiter():
+    flight = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    async def run():
+        return await asyncio.gather(*(flight.do("k", fail) for _ in range(3)),
+                                    return_exceptions=True)
+
+    outcomes = asyncio.run(run())
+    assert all(isinstance(outcome, RuntimeError) for outcome in outcomes)
+    assert "k" not in flight
+
+
+def test_one_waiter_cancelled_does_not_cancel_the_others():
+    flight = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def run():
+        first = asyncio.ensure_future(flight.do("k", work))
+        second = asyncio.ensure_future(flight.do("k", work))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(run()) == "result"
@@ -0,0 +1,99 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+import store
+from store import MongoResultStore
+
+RESPONSE = {
+    "results": [{"title": "OpenAI", "link": "https://openai.com", "snippet": "",
+                 "displayed_link": "openai.com", "position": 1}],
+    "total_results": 1,
+    "search_time": 0.1,
+    "query": "openai",
+}
+
+
+class MockMotorClient(AsyncMongoMockClient):
+    # mongomock-motor hands get_default_database to the synchronous client
+    def get_default_database(self, default=None):
+        return self.get_database()
+
+
+@pytest.fixture
+def mongomock_driver(monkeypatch):
+    # mongomock's in-memory server behind motor's client interface
+    monkeypatch.setattr(store, "motor_asyncio", SimpleNamespace(AsyncIOMotorClient=MockMotorClient))
+
+
+def test_round_trip(mongomock_driver):
+    result_store = MongoResultStore("mongodb://localhost/test_store", ttl=60)
+
+    async def run():
+        await result_store.start()
+        assert await result_store.get("openai", 1) is None
+        await result_store.set("OpenAI ", 1, RESPONSE)
+        return await result_store.get("openai", 1), await result_store.get("openai", 2)
+
+    stored, other_page = asyncio.run(run())
+    response, expires_in = stored
+    assert response == RESPONSE
+    assert 0 < expires_in <= 60
+    assert other_page is None
+    assert result_store.stats()["hits"] == 1
+    assert result_store.stats()["writes"] == 1
+
+
+def test_expired_responses_are_not_returned(mongomock_driver):
+    result_store = MongoResultStore("mongodb://localhost/test_store_ttl", ttl=0.05)
+
+    async def run():
+        await result_store.set("openai", 1, RESPONSE)
+        fresh = await result_store.get("openai", 1)
+        await asyncio.sleep(0.1)
+        return fresh, await result_store.get("openai", 1)
+
+    fresh, expired = asyncio.run(run())
+    assert fresh is not None
+    assert expired is None
+
+
+def test_ttl_follows_the_memory_cache_by_default(monkeypatch):
+    monkeypatch.delenv("SEARCH_STORE_TTL", raising=False)
+    monkeypatch.setenv("SEARCH_CACHE_TTL", "120")
+    assert MongoResultStore.from_env().ttl == 120
+    monkeypatch.setenv("SEARCH_STORE_TTL", "3600")
+    assert MongoResultStore.from_env().ttl == 3600
+
+
+def test_unreachable_mongo_is_skipped():
+    # Nothing listens on port 1
+    result_store = MongoResultStore("mongodb://127.0.0.1:1/test", timeout=0.2, retry_after=60)
+
+    async def run():
+        await result_store.start()
+        started = time.monotonic()
+        first = await result_store.get("openai", 1)
+        second = await result_store.get("openai", 1)
+        result_store.set_later("openai", 1, RESPONSE)
+        await result_store.close()
+        return first, second, time.monotonic() - started
+
+    first, second, elapsed = asyncio.run(run())
+    assert first is None and second is None
+    # Index setup failed and suspended the store, so neither read waited
+    # on the server timeout, and no write was queued
+    assert elapsed < 0.2
+    assert result_store.errors == 1
+    assert result_store.stats()["available"] is False
+    assert result_store.stats()["pending_writes"] == 0
+
+
+def test_disabled_without_url():
+    result_store = MongoResultStore(None)
+    assert asyncio.run(result_store.get("openai", 1)) is None
+    assert not result_store.enabled
+    assert result_store._client is None
@@ -0,0 +1,131 @@
+import gzip
+import json
+
+import pytest
+
+from queries import QueryRewriter
+from suggestions import SEED_SUGGESTIONS, SuggestionIndex, load_seed_queries
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def index_of(clock, queries, **kwargs):
+    index = SuggestionIndex(clock=clock, **kwargs)
+    index.build(queries)
+    return index
+
+
+def test_prefix_top_k_by_weight(clock):
+    index = index_of(clock, [
+        ("openai api", 5), ("openai pricing", 9), ("opencv tutorial", 1),
+        ("open source llm", 3), ("anthropic claude", 7),
+    ])
+    assert index.suggest("open", k=3) == ["openai pricing", "openai api", "open source llm"]
+    assert index.suggest("openai", k=5) == ["openai pricing", "openai api"]
+    assert index.suggest("zzz") == []
+
+
+def test_queries_starting_with_the_prefix_rank_first(clock):
+    index = index_of(clock, [("anthropic claude", 9), ("claude pricing", 1)])
+    # "claude" also starts a later word of the heavier query
+    assert index.suggest("claude", k=2) == ["claude pricing", "anthropic claude"]
+
+
+def test_recorded_queries_are_suggested_before_and_after_a_rebuild(clock):
+    index = index_of(clock, [("openai api", 2)], max_pending=2)
+    index.record("OpenAI Sora")
+    assert index.stats()["pending"] == 1
+    assert "OpenAI Sora" in index.suggest("openai sora")
+    for _ in range(3):
+        index.record("openai sora")
+    index.record("openai gpt store")
+    assert index.stats()["pending"] == 0
+    # Repeats raise the rank in place; the latest capitalization is shown
+    assert index.suggest("openai", k=3) == ["openai sora", "openai api", "openai gpt store"]
+
+
+def test_weights_decay_with_age(clock):
+    index = index_of(clock, [], half_life=100.0)
+    for _ in range(4):
+        index.record("llm benchmarks")
+    clock.now += 250  # 4 hits decay to about 0.7
+    index.record("llm agents")
+    assert index.suggest("llm", k=2) == ["llm agents", "llm benchmarks"]
+    # An older hit recorded late counts for what it is worth now
+    index.record("llm benchmarks", at=clock.now - 1000)
+    assert index.suggest("llm", k=2) == ["llm agents", "llm benchmarks"]
+
+
+def test_pruning_keeps_the_best_ranked(clock):
+    index = SuggestionIndex(max_entries=10, clock=clock)
+    for n in range(10):
+        for _ in range(n + 1):
+            index.record(f"query {n:02d}")
+    index.record("query new")
+    assert index.stats()["pruned"] == 2
+    assert len(index) == 9
+    assert "query 00" not in index and "query new" not in index
+    assert index.suggest("query", k=1) == ["query 09"]
+
+
+def test_fuzzy_matches_fill_in_after_exact_ones(clock):
+    index = index_of(clock, [("transformers tutorial", 5), ("translation models", 1)])
+    # A neighbouring-key typo, a swap and a missing letter
+    assert index.suggest("tramsformers") == ["transformers tutorial"]
+    assert index.suggest("tarnsformers") == ["transformers tutorial"]
+    assert index.suggest("trnsformers") == ["transformers tutorial"]
+    # Exact matches first, then near misses
+    assert index.suggest("transl", k=2) == ["translation models", "transformers tutorial"]
+    # Too short to guess at
+    assert index.suggest("tx") == []
+
+
+def test_spellings_of_one_search_share_an_entry(clock):
+    rewriter = QueryRewriter()
+    index = index_of(clock, [("machine learning", 1)], key=rewriter.key)
+    index.record("Learning Machine")
+    index.record("ML")
+    assert len(index) == 1
+    assert "learning machine" in index
+    assert index.suggest("mach") == ["machine learning"]
+    assert index.suggest("learn") == ["machine learning"]
+
+
+def test_seed_queries(tmp_path):
+    path = tmp_path / "seeds.tsv"
+    path.write_text("rag pipelines\t4\nvector databases\n\n", encoding="utf-8")
+    seeds = load_seed_queries(str(path))
+    assert seeds[:len(SEED_SUGGESTIONS)] == [(query, 1.0) for query in SEED_SUGGESTIONS]
+    assert seeds[len(SEED_SUGGESTIONS):] == [("rag pipelines", 4.0), ("vector databases", 1.0)]
+    assert load_seed_queries(str(tmp_path / "missing.tsv")) == [(q, 1.0) for q in SEED_SUGGESTIONS]
+
+
+def test_logged_searches_are_replayed(tmp_path):
+    import server
+
+    now = server.time.time()
+    events = [
+        {"type": "search", "query": "rag pipelines", "results": 10, "endpoint": "search", "at": now},
+        {"type": "search", "query": "rag pipelines", "results": 10, "endpoint": "stream", "at": now - 3600},
+        {"type": "search", "query": "no results here", "results": 0, "endpoint": "search", "at": now},
+        {"type": "search", "query": "batch job", "results": 10, "endpoint": "bulk", "at": now},
+        {"type": "click", "query": "rag pipelines", "link": "https://example.com", "at": now},
+    ]
+    with gzip.open(tmp_path / "events-1.jsonl.gz", "wt") as f:
+        f.writelines(json.dumps(event) + "\n" for event in events)
+
+    weights = dict(server.logged_suggestion_queries(str(tmp_path), half_life=3600.0))
+    assert list(weights) == ["rag pipelines"]
+    assert weights["rag pipelines"] == pytest.approx(1.5, abs=0.01)
+    assert server.logged_suggestion_queries(str(tmp_path / "missing"), 3600.0) == []
@@ -0,0 +1,108 @@
+import asyncio
+import random
+from collections import Counter
+
+from warming import CacheWarmer, CountMinSketch, TopK
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_sketch_never_undercounts():
+    sketch = CountMinSketch(width=64, depth=4, seed=1)
+    rng = random.Random(1)
+    keys = [f"query {rng.randrange(500)}" for _ in range(5000)]
+    for key in keys:
+        sketch.add(key)
+    exact = Counter(keys)
+    assert all(sketch.estimate(key) >= count for key, count in exact.items())
+    assert sketch.total == len(keys)
+    sketch.halve()
+    assert sketch.total == len(keys) // 2
+
+
+def test_top_k_keeps_the_highest_counts():
+    top = TopK(k=3)
+    for key, count in [("a", 5), ("b", 1), ("c", 3), ("d", 4), ("b", 2), ("e", 1)]:
+        top.offer(key, count)
+    assert top.items() == [("a", 5), ("d", 4), ("c", 3)]
+    top.halve()
+    assert top.items() == [("a", 2), ("d", 2), ("c", 1)]
+
+
+def test_sketch_top_k_finds_zipf_head():
+    warmer = CacheWarmer(lambda key: None, None, None, top=20, min_count=1)
+    rng = random.Random(7)
+    weights = [1 / (rank + 1) for rank in range(2000)]
+    keys = rng.choices(range(2000), weights, k=50_000)
+    for key in keys:
+        warmer.record(key)
+    true_top = {key for key, _ in Counter(keys).most_common(20)}
+    found = {key for key, _ in warmer.hottest()}
+    assert len(found & true_top) >= 18
+
+
+def make_warmer(clock, cache, stored=(), budget=60.0):
+    calls = Counter()
+
+    async def reload(key):
+        calls["reload"] += 1
+        if key in stored:
+            cache[key] = clock.now + 600
+
+    async def refresh(key):
+        calls["refresh"] += 1
+        cache[key] = clock.now + 600
+
+    def expires_in(key):
+        return None if key not in cache else cache[key] - clock.now
+
+    warmer = CacheWarmer(expires_in, reload, refresh, interval=30, lead=90, budget=budget,
+                         min_count=2, decay_interval=0, clock=clock)
+    return warmer, calls
+
+
+def test_warms_hot_entries_about_to_expire():
+    clock = Clock()
+    cache = {"hot": 60.0, "fresh": 600.0, "cold": 60.0, "stored": 60.0}
+    warmer, calls = make_warmer(clock, cache, stored={"stored"})
+    for key in ("hot", "hot", "fresh", "fresh", "stored", "stored", "cold"):
+        warmer.record(key)
+
+    assert asyncio.run(warmer.warm_once()) == 2
+    # The store's copy is used before going upstream; cold keys are skipped
+    assert warmer.counts["store"] == 1 and warmer.counts["upstream"] == 1
+    assert calls == {"reload": 2, "refresh": 1}
+    assert cache["hot"] == 600 and cache["cold"] == 60
+
+
+def test_upstream_refreshes_stay_within_budget():
+    clock = Clock()
+    cache = {f"key {i}": 10.0 for i in range(5)}
+    warmer, calls = make_warmer(clock, cache, budget=2)
+    for key in cache:
+        warmer.seed([(key, 3)])
+
+    asyncio.run(warmer.warm_once())
+    assert calls["refresh"] == 2
+    assert warmer.counts["over_budget"] == 3
+
+
+def test_failed_refresh_is_counted_and_skipped():
+    clock = Clock()
+
+    async def refresh(key):
+        raise RuntimeError("upstream down")
+
+    async def reload(key):
+        return None
+
+    warmer = CacheWarmer(lambda key: 10.0, reload, refresh, min_count=1, clock=clock)
+    warmer.record("k")
+    assert asyncio.run(warmer.warm_once()) == 0
+    assert warmer.counts["failed"] == 1